@@ -2,6 +2,8 @@ import os
 import re
 import numpy as np
 import matplotlib.pyplot as plt
+import eventlog
+from rendering import finish_figure
 
 def extract_delays(file_path):
     """
@@ -71,9 +73,12 @@ def process_all_files(directory):
     all_requests_numbers = set()
 
     for file_name in os.listdir(directory):
-        if file_name.endswith('.txt'):
+        if file_name.endswith('.txt') or eventlog.is_event_log(file_name):
             file_path = os.path.join(directory, file_name)
-            file_delays = extract_delays(file_path)
+            if eventlog.is_event_log(file_path):
+                file_delays = eventlog.extract_delays(file_path)
+            else:
+                file_delays = extract_delays(file_path)
 
             for algo, records in file_delays.items():
                 for (ss, rn, val) in records:
@@ -98,7 +103,8 @@ def plot_ieee_singlecolumn_subplots(
     avg_delays,
     all_system_sizes,
     requests_numbers=[30, 60, 90],
-    fig_title="Scheduling Results"
+    fig_title="Scheduling Results",
+    output_path=None
 ):
     """
     在同一个 Figure 中生成多个子图 (默认3行1列)，
@@ -125,6 +131,8 @@ def plot_ieee_singlecolumn_subplots(
         需要绘制的请求数列表
     fig_title : str
         整个图的标题，可选
+    output_path : str or list, optional
+        保存路径(可多个格式)；为 None 时用 plt.show() 显示
     """
 
     n_subplots = len(requests_numbers)
@@ -235,7 +243,7 @@ def plot_ieee_singlecolumn_subplots(
     # 若 suptitle 与子图标题有重叠，可再手动调大 top
     # plt.subplots_adjust(top=0.90)
 
-    plt.show()
+    finish_figure(output_path)
 
 
 def main():
@@ -0,0 +1,219 @@
+# analytics.py
+"""
+Cheap lower bounds and estimates for the merged schedules of a round, from the cached path masks.
+
+Two requests conflict when the node masks of the paths a merge reserves for them intersect
+(the union of the first and last path for new_merge_schedule, all K paths for fifo_merge), and
+requests that pairwise conflict need distinct timeslots. Any clique of the conflict graph
+therefore bounds the number of timeslots from below:
+
+    endpoint    most routed requests sharing an endpoint node, whatever their paths
+    node_load   most request masks containing one node (each node's requests form a clique)
+    clique      a greedily grown clique, seeded from the most loaded nodes
+
+The merges keep their timeslots contiguous from 1, so T timeslots cost at least T(T - 1) / 2
+delay. `estimate` is a first-fit colouring of the masks in service order, an upper bound for
+the best schedule on those paths. A round is settled when its lower bound equals its number of
+requests: every merge then keeps one request per timeslot, exactly like FIFO.
+
+With load-aware routing (Requests.congestion) the paths depend on the routing order, so only
+the endpoint bound is used.
+
+Under the edge conflict model the same bounds run on link masks, and an endpoint's requests
+need one of its links each. Under the swap model requests conflict through node memories
+rather than pairwise, so a node bounds the timeslots by its summed usage over its memories,
+and the endpoint bound by its requests over its memories.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from scheduling import Scheduling
+
+MERGE_SELECTIONS = {"RRRN Merge": "first_last", "FIFO Merge": "all"}
+
+
+def reserved_paths(scheduling: Scheduling, requests: List[Tuple[str, str, str]],
+                   selection: str = "first_last") -> List[List[List[str]]]:
+    """The paths a merge reserves per request ("first_last" or "all" K paths)."""
+    paths = scheduling.requests.find_all_shortest_paths([(src, dst) for _, src, dst in requests])
+    reserved = []
+    for _, src, dst in requests:
+        candidates = paths.get((src, dst)) or []
+        if selection == "first_last" and candidates:
+            candidates = [candidates[0], candidates[-1]]
+        reserved.append(candidates)
+    return reserved
+
+
+def request_masks(scheduling: Scheduling, requests: List[Tuple[str, str, str]],
+                  selection: str = "first_last") -> List[int]:
+    """Union masks of the paths a merge reserves per request."""
+    path_mask = scheduling.requests.path_mask
+    masks = []
+    for candidates in reserved_paths(scheduling, requests, selection):
+        mask = 0
+        for path in candidates:
+            mask |= path_mask(path)
+        masks.append(mask)
+    return masks
+
+
+def endpoint_bound(requests: List[Tuple[str, str, str]], capacities: Optional[Dict[str, int]] = None) -> int:
+    """Most requests sharing an endpoint, over how many of them the endpoint serves at once (default 1)."""
+    counts: Dict[str, int] = {}
+    for _, src, dst in requests:
+        counts[src] = counts.get(src, 0) + 1
+        counts[dst] = counts.get(dst, 0) + 1
+    if capacities is None:
+        return max(counts.values(), default=0)
+    return max((-(-count // capacities[node]) for node, count in counts.items()), default=0)
+
+
+def endpoint_capacities(scheduling: Scheduling) -> Optional[Dict[str, int]]:
+    """Requests an endpoint serves in one timeslot under the conflict model; None for one."""
+    if scheduling.conflict_model == "edge":
+        degrees = {node.name: 0 for node in scheduling.topology.nl}
+        for u, v in scheduling.conflicts().edge_index:
+            degrees[u] += 1
+            degrees[v] += 1
+        return {node: max(1, degree) for node, degree in degrees.items()}
+    if scheduling.conflict_model == "swap":
+        return {node.name: len(node.memories) for node in scheduling.topology.nl}
+    return None
+
+
+def node_loads(masks: List[int]) -> Dict[int, int]:
+    """Number of masks containing each node bit."""
+    loads: Dict[int, int] = {}
+    for mask in masks:
+        while mask:
+            low = mask & -mask
+            bit = low.bit_length() - 1
+            loads[bit] = loads.get(bit, 0) + 1
+            mask ^= low
+    return loads
+
+
+def conflict_graph(masks: List[int]) -> List[int]:
+    """Adjacency of the conflict graph as one bitset of request indices per request."""
+    adjacency = [0] * len(masks)
+    for i, mask in enumerate(masks):
+        for j in range(i + 1, len(masks)):
+            if mask & masks[j]:
+                adjacency[i] |= 1 << j
+                adjacency[j] |= 1 << i
+    return adjacency
+
+
+def greedy_clique(masks: List[int], adjacency: List[int], seeds: int = 8) -> int:
+    """
+    Size of the largest clique found by greedy growth from the requests through the `seeds` most
+    loaded nodes: candidates are the common neighbours of the members, and the candidate with the
+    most neighbours among the others joins next.
+    """
+    loads = node_loads(masks)
+    best = 1 if any(masks) else 0
+    for bit, _ in sorted(loads.items(), key=lambda item: -item[1])[:seeds]:
+        members = [i for i, mask in enumerate(masks) if mask >> bit & 1]
+        candidates = ~0
+        for i in members:
+            candidates &= adjacency[i]
+        candidates &= (1 << len(masks)) - 1
+        size = len(members)
+        while candidates:
+            pick, pick_degree = -1, -1
+            rest = candidates
+            while rest:
+                low = rest & -rest
+                i = low.bit_length() - 1
+                degree = bin(adjacency[i] & candidates).count("1")
+                if degree > pick_degree:
+                    pick, pick_degree = i, degree
+                rest ^= low
+            size += 1
+            candidates &= adjacency[pick]
+        best = max(best, size)
+    return best
+
+
+def capacity_bound(model, usages: List[int]) -> int:
+    """Most timeslots any resource needs to carry the summed usage within its capacity."""
+    totals = model.field_totals(sum(usages))
+    return max((-(-total // capacity) for total, capacity in zip(totals, model.capacities)), default=0)
+
+
+def first_fit_model_timeslots(model, usages: List[int]) -> int:
+    """first_fit_timeslots with the packed usages of a conflict model."""
+    occupied: List[int] = []
+    for usage in usages:
+        for t, used in enumerate(occupied):
+            if model.fits(used, usage):
+                occupied[t] += usage
+                break
+        else:
+            occupied.append(usage)
+    return len(occupied)
+
+
+def first_fit_timeslots(masks: List[int]) -> int:
+    """Timeslots of a first-fit colouring of the masks in the given order."""
+    occupied: List[int] = []
+    for mask in masks:
+        for t, used in enumerate(occupied):
+            if not used & mask:
+                occupied[t] |= mask
+                break
+        else:
+            occupied.append(mask)
+    return len(occupied)
+
+
+def delay_bound(timeslots: int) -> int:
+    return timeslots * (timeslots - 1) // 2
+
+
+def round_bounds(scheduling: Scheduling, requests: List[Tuple[str, str, str]],
+                 selection: str = "first_last") -> Dict[str, int]:
+    if scheduling.requests.congestion:
+        # Routed requests are those with any path; masks are not known before routing
+        routed = [request for request in requests if scheduling.requests.is_feasible(request[1], request[2])]
+        endpoint = node_load = clique = endpoint_bound(routed, endpoint_capacities(scheduling))
+        estimate = len(requests)
+    elif scheduling.conflict_model != "node":
+        model = scheduling.conflicts()
+        usages = [model.usage(paths) for paths in reserved_paths(scheduling, requests, selection)]
+        endpoint = endpoint_bound([request for request, usage in zip(requests, usages) if usage],
+                                  endpoint_capacities(scheduling))
+        if scheduling.conflict_model == "edge":
+            # Link usages are 0/1 fields, so they intersect like masks
+            node_load = max(node_loads(usages).values(), default=0)
+            clique = greedy_clique(usages, conflict_graph(usages))
+        else:
+            node_load = clique = capacity_bound(model, usages)
+        estimate = first_fit_model_timeslots(model, usages)
+    else:
+        masks = request_masks(scheduling, requests, selection)
+        # Requests without paths never conflict, so they do not count towards any bound
+        endpoint = endpoint_bound([request for request, mask in zip(requests, masks) if mask])
+        node_load = max(node_loads(masks).values(), default=0)
+        clique = greedy_clique(masks, conflict_graph(masks))
+        estimate = first_fit_timeslots(masks)
+    lower = max(endpoint, node_load, clique)
+    return {"requests": len(requests), "endpoint": endpoint, "node_load": node_load, "clique": clique,
+            "timeslots_lower": lower, "delay_lower": delay_bound(lower),
+            "timeslots_estimate": estimate, "settled": lower >= len(requests)}
+
+
+def bounds_by_merge(scheduling: Scheduling, all_requests: List[Dict[str, List[Tuple[str, str, str]]]]) \
+        -> Tuple[Dict[str, Dict[str, int]], List[Dict[str, Dict[str, int]]]]:
+    """
+    Bounds of RRRN Merge and FIFO Merge for every round and summed over the rounds, which is how
+    run_configuration totals their timeslots and delays.
+    """
+    per_round = [{name: round_bounds(scheduling, round_info["requests"], selection)
+                  for name, selection in MERGE_SELECTIONS.items()} for round_info in all_requests]
+    totals = {}
+    for name in MERGE_SELECTIONS:
+        totals[name] = {key: sum(bounds[name][key] for bounds in per_round)
+                        for key in ("requests", "timeslots_lower", "delay_lower", "timeslots_estimate")}
+        totals[name]["settled"] = all(bounds[name]["settled"] for bounds in per_round)
+    return totals, per_round
@@ -6,16 +6,18 @@ from typing import Dict, List, Optional, Tuple
 from qns.network.topology import Topology
 from qns.entity.memory.memory import QuantumMemory
 import math
-import networkx as nx
-import matplotlib.pyplot as plt
 
 
 class GridTopology(Topology):
 
     def __init__(self, nodes_number, nodes_apps: List[Application] = [],
                  qchannel_args: Dict = {}, cchannel_args: Dict = {},
-                 memory_args: Optional[List[Dict]] = {}):
+                 memory_args: Optional[List[Dict]] = {}, link_fidelity: Optional[float] = None):
         super().__init__(nodes_number, nodes_apps, qchannel_args, cchannel_args, memory_args)
+        # Werner fidelity of every link (see fidelity.py), unless qchannel_args sets one; without
+        # either, the links keep the QuantumChannel default of qns
+        if link_fidelity is not None:
+            self.qchannel_args = dict({"fidelity": link_fidelity}, **self.qchannel_args)
         size = int(math.sqrt(self.nodes_number))
         self.size = size
         assert (size ** 2 == self.nodes_number)
@@ -70,6 +72,10 @@ class GridTopology(Topology):
 
     def draw_graph(self):
         # Draw the graph of the topology
+        # Plotting dependencies are imported here so that headless workers never load them
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
         # Call the build method and store its return value
         nl, ll = self.build()
 
@@ -116,6 +122,8 @@ class GridTopology(Topology):
 
     def draw_memory_histogram(self):
         # Draw a histogram of the number of memories per node
+        import matplotlib.pyplot as plt
+
         # Build the topology
         if self.nodes_number <= 16:
             nodes, _ = self.build()
@@ -0,0 +1,311 @@
+# benchmark.py
+"""
+Benchmarks for the routing and scheduling hot paths.
+
+    python benchmark.py                                  # quick sweep
+    python benchmark.py --grids 4 8 16 32 64 --requests 10 100 1000 10000
+    python benchmark.py --save benchmark_baseline.json   # store a baseline
+    python benchmark.py --compare benchmark_baseline.json --threshold 0.25
+    python benchmark.py --verify                         # kernels.py against the Python code
+
+With --compare the process exits with status 1 when any case is slower than the
+baseline by more than the threshold, so it can gate performance work. --verify exits
+with status 1 when the "numba" backend gives a different result than the "python" one.
+"""
+import argparse
+import contextlib
+import copy
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import kernels
+from basicsystem import GridTopology
+from scheduling import Scheduling
+
+QUICK_GRIDS = [4, 8, 16]
+QUICK_REQUESTS = [10, 100]
+
+
+def measure(func: Callable, setup: Optional[Callable] = None, repeat: int = 3) -> Dict[str, float]:
+    """Run `func(setup())` `repeat` times and return min/median wall time in seconds."""
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else None
+        start = time.perf_counter()
+        if args is None:
+            func()
+        else:
+            func(args)
+        samples.append(time.perf_counter() - start)
+    return {"min": min(samples), "median": statistics.median(samples), "repeat": repeat}
+
+
+class BenchmarkContext:
+    """A grid and a single round of requests shared by the cases of one (grid, requests) point."""
+
+    def __init__(self, grid: int, num_requests: int, seed: int = 0):
+        random.seed(seed)
+        np.random.seed(seed)
+        self.grid = grid
+        self.num_requests = num_requests
+        self.scheduling = Scheduling(GridTopology(grid * grid))
+        self.requests = self.scheduling.requests
+        self.all_requests = self.requests.generate_requests_by_rounds(num_requests, 1)
+        self.pairs = [(src, dst) for _, src, dst in self.all_requests[0]['requests']]
+
+    def warm_paths(self):
+        self.requests.clear_path_cache()
+        paths = self.requests.find_all_shortest_paths(self.pairs)
+        self.high_weight_paths = self.requests.identify_high_weight_paths(self.all_requests[0]['requests'], paths)
+        self.pre_merge = self.scheduling.rrrn_schedule(copy.deepcopy(self.all_requests), 1, 1, 1)[1][0]
+        self.fifo = self.scheduling.fifo_schedule(self.all_requests)[0]
+
+
+def bench_yen(ctx: BenchmarkContext, repeat: int):
+    graph = ctx.requests.build_graph()
+    src, dst = "V1", f"V{ctx.grid * ctx.grid}"  # corner to corner, the longest search
+    return measure(lambda: ctx.requests.yen_k_shortest_paths(graph, src, dst, ctx.requests.K), repeat=repeat)
+
+
+def bench_find_all_shortest_paths(ctx: BenchmarkContext, repeat: int):
+    def setup():
+        ctx.requests.clear_path_cache()
+        return ctx.pairs
+    return measure(ctx.requests.find_all_shortest_paths, setup=setup, repeat=repeat)
+
+
+def bench_rrrn_schedule(ctx: BenchmarkContext, repeat: int):
+    # Paths are cached but merged schedules are not, so this measures selection and merge rather than routing
+    def setup():
+        ctx.scheduling.clear_schedule_cache()
+        return copy.deepcopy(ctx.all_requests)
+    return measure(lambda reqs: ctx.scheduling.rrrn_schedule(reqs, 1, 1, 1), setup=setup, repeat=repeat)
+
+
+def bench_rrrn_schedule_cached(ctx: BenchmarkContext, repeat: int):
+    # warm_paths already ran this round, so every call reuses its merged schedule
+    return measure(lambda reqs: ctx.scheduling.rrrn_schedule(reqs, 1, 1, 1),
+                   setup=lambda: copy.deepcopy(ctx.all_requests), repeat=repeat)
+
+
+def bench_new_merge_schedule(ctx: BenchmarkContext, repeat: int):
+    return measure(lambda: ctx.scheduling.new_merge_schedule(ctx.pre_merge, ctx.high_weight_paths), repeat=repeat)
+
+
+def bench_fifo_merge(ctx: BenchmarkContext, repeat: int):
+    return measure(lambda: ctx.scheduling.fifo_merge(list(ctx.fifo), ctx.all_requests), repeat=repeat)
+
+
+def bench_check_failures(ctx: BenchmarkContext, repeat: int):
+    merged = ctx.scheduling.new_merge_schedule(ctx.pre_merge, ctx.high_weight_paths)
+    num_timeslots = max(ts for _, ts in merged)
+    np.random.seed(1)
+    failure_nodes = ctx.scheduling.generate_failure_nodes(ctx.grid * ctx.grid, num_timeslots, 0.1)
+    schedules = {"FIFO": ctx.fifo, "RRRN": ctx.pre_merge, "RRRN Merge": merged}
+    return measure(lambda: ctx.scheduling.check_failures_across_schedules(schedules, ctx.high_weight_paths,
+                                                                          failure_nodes), repeat=repeat)
+
+
+CASES = {
+    "yen_k_shortest_paths": bench_yen,
+    "find_all_shortest_paths": bench_find_all_shortest_paths,
+    "rrrn_schedule": bench_rrrn_schedule,
+    "rrrn_schedule_cached": bench_rrrn_schedule_cached,
+    "new_merge_schedule": bench_new_merge_schedule,
+    "fifo_merge": bench_fifo_merge,
+    "check_failures_across_schedules": bench_check_failures,
+}
+
+
+def write_synthetic_logs(directory: str, num_files: int, lines_per_file: int):
+    # Text logs in the format the parsers expect
+    for f in range(num_files):
+        with open(os.path.join(directory, f"run{f}.txt"), 'w', encoding='utf-8') as file:
+            for i in range(lines_per_file):
+                rn = 30 * (i % 3 + 1)
+                file.write(f"System size: {16 * (i % 4 + 1)}\nrequests number: {rn}\n")
+                file.write(f"Total FIFO delay: {i}\nTotal FIFO Merge delay: {i // 2}\n")
+                file.write(f"Total RRRN after merge delay: {i // 3}\n")
+                file.write(f"Total timeslots including failed requests ({rn}rs)\n")
+                file.write(f"FIFO: {rn}\nRRRN: {rn}\nFIFO Merge: {i % 20}\nRRRN Merge: {i % 15}\n")
+
+
+def bench_log_parsers(repeat: int, num_files: int = 20, lines_per_file: int = 500) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_logs(directory, num_files, lines_per_file)
+        for module_name in ["2152", "delay1111", "data1111", "con2115"]:
+            module = importlib.import_module(module_name)
+            # Some parsers print debugging output per file; keep it out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[f"parser[{module_name}]"] = measure(lambda: module.process_all_files(directory),
+                                                            repeat=repeat)
+    return results
+
+
+def bench_cold_imports(repeat: int, modules: List[str] = ("basicsystem", "requests", "scheduling")) \
+        -> Dict[str, Dict[str, float]]:
+    # Each import runs in a fresh interpreter; the interpreter start-up itself is subtracted
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code: str):
+        subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+
+    startup = measure(lambda: run("pass"), repeat=repeat)
+    results = {}
+    for module in modules:
+        entry = measure(lambda: run(f"import {module}"), repeat=repeat)
+        results[f"cold_import[{module}]"] = {key: entry[key] - startup[key] if key != "repeat" else entry[key]
+                                            for key in entry}
+    return results
+
+
+def run_sweep(grids: List[int], request_counts: List[int], cases: List[str], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for grid in grids:
+        for num_requests in request_counts:
+            ctx = BenchmarkContext(grid, num_requests)
+            ctx.warm_paths()
+            for case in cases:
+                key = f"{case}[{grid}x{grid},{num_requests}]"
+                results[key] = CASES[case](ctx, repeat)
+                print(f"{key:<60}{results[key]['median'] * 1e3:>12.3f} ms", flush=True)
+    return results
+
+
+def verify_kernels(grids: List[int], request_counts: List[int], seed: int = 0) -> List[str]:
+    """
+    Run the "python" and "numba" backends on the same requests and list every result that differs.
+
+    Without numba the kernels run interpreted, which checks the same code the compiler would see.
+    """
+    mismatches = []
+    enabled, kernels.enabled = kernels.enabled, True
+    try:
+        for grid in grids:
+            for num_requests in request_counts:
+                random.seed(seed)
+                reference = Scheduling(GridTopology(grid * grid))
+                accelerated = Scheduling(GridTopology(grid * grid), backend="numba")
+                all_requests = reference.requests.generate_requests_by_rounds(num_requests, 1)
+                round_requests = all_requests[0]['requests']
+                pairs = [(src, dst) for _, src, dst in round_requests]
+                point = f"[{grid}x{grid},{num_requests}]"
+
+                for spur_search in ("astar", "dijkstra"):
+                    for scheduling in (reference, accelerated):
+                        scheduling.requests.spur_search = spur_search
+                        scheduling.requests.clear_path_cache()
+                    if reference.requests.find_all_shortest_paths(pairs) != \
+                            accelerated.requests.find_all_shortest_paths(pairs):
+                        mismatches.append(f"yen_k_shortest_paths[{spur_search}]{point}")
+
+                for b in (0.0, 0.5, 3.0, -0.5, -2.0, float('inf'), float('-inf')):
+                    if reference.rrrn_order(round_requests, b) != accelerated.rrrn_order(round_requests, b):
+                        mismatches.append(f"rrrn_order[b={b}]{point}")
+                # rrrn_order takes a closed form for 0 <= b < inf, so the kernel is compared to the loop directly
+                nl = reference.topology.nl
+                distances = {request_id: reference.requests.calculate_manhattan_distance(nl[int(src[1:]) - 1],
+                                                                                         nl[int(dst[1:]) - 1])
+                             for request_id, src, dst in round_requests}
+                distance_array = np.array([distances[request[0]] for request in round_requests], dtype=float)
+                for b in (0.5, 3.0, -0.5):
+                    order = kernels.rrrn_select_order(distance_array, b)
+                    if [round_requests[i] for i in order] != \
+                            reference.rrrn_selection_loop(round_requests, distances, b):
+                        mismatches.append(f"rrrn_select_order[b={b}]{point}")
+
+                paths = reference.requests.find_all_shortest_paths(pairs)
+                high_weight_paths = reference.requests.identify_high_weight_paths(round_requests, paths)
+                pre_merge = reference.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)[1][0]
+                if reference.new_merge_schedule(pre_merge, high_weight_paths) != \
+                        accelerated.new_merge_schedule(pre_merge, high_weight_paths):
+                    mismatches.append(f"new_merge_schedule{point}")
+
+                fifo = reference.fifo_schedule(all_requests)[0]
+                if reference.fifo_merge(list(fifo), all_requests) != accelerated.fifo_merge(list(fifo), all_requests):
+                    mismatches.append(f"fifo_merge{point}")
+                print(f"verified {point}", flush=True)
+    finally:
+        kernels.enabled = enabled
+    return mismatches
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Return the cases whose median regressed by more than `threshold` (relative) against the baseline."""
+    regressions = []
+    for key, entry in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["median"]
+        after = entry["median"]
+        if before > 0 and (after - before) / before > threshold:
+            regressions.append(f"{key}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms (+{(after / before - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark routing and scheduling hot paths")
+    parser.add_argument("--grids", type=int, nargs="+", default=QUICK_GRIDS, help="grid side lengths")
+    parser.add_argument("--requests", type=int, nargs="+", default=QUICK_REQUESTS, help="requests per round")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-parsers", action="store_true", help="skip the log parser benchmarks")
+    parser.add_argument("--no-imports", action="store_true", help="skip the cold import benchmarks")
+    parser.add_argument("--save", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--verify", action="store_true",
+                        help="check the numba kernels against the Python implementations instead of timing")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        mismatches = verify_kernels(args.grids, args.requests)
+        for line in mismatches:
+            print(f"  mismatch: {line}")
+        print(f"numba {'available' if kernels.NUMBA_AVAILABLE else 'not installed, kernels ran interpreted'}; "
+              f"{len(mismatches)} mismatches")
+        return 1 if mismatches else 0
+
+    results = run_sweep(args.grids, args.requests, args.cases, args.repeat)
+    extra = {}
+    if not args.no_parsers:
+        extra.update(bench_log_parsers(args.repeat))
+    if not args.no_imports:
+        extra.update(bench_cold_imports(args.repeat))
+    for key, entry in extra.items():
+        results[key] = entry
+        print(f"{key:<60}{entry['median'] * 1e3:>12.3f} ms", flush=True)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "results": results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@ import re
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
+import eventlog
+from rendering import finish_figure
 
 def extract_timeslots(file_path):
     """Extracts the total timeslots for each scheduling algorithm from a given file."""
@@ -37,9 +39,12 @@ def process_all_files(directory):
     aggregated_timeslots = {"FIFO": {}, "FIFO Merge": {}, "RRRN": {}, "RRRN Merge": {}}
 
     for filename in os.listdir(directory):
-        if filename.endswith(".txt"):
+        if filename.endswith(".txt") or eventlog.is_event_log(filename):
             file_path = os.path.join(directory, filename)
-            timeslots = extract_timeslots(file_path)
+            if eventlog.is_event_log(file_path):
+                timeslots = eventlog.extract_timeslots(file_path)
+            else:
+                timeslots = extract_timeslots(file_path)
 
             for key in timeslots:
                 for rs_value, slot_value in timeslots[key]:
@@ -55,7 +60,7 @@ def process_all_files(directory):
             avg_timeslots[key][rs_value] = np.mean(aggregated_timeslots[key][rs_value])
     return avg_timeslots
 
-def plot_ieee_singlecolumn_bar_chart(avg_timeslots, fig_title="Timeslots Consumption"):
+def plot_ieee_singlecolumn_bar_chart(avg_timeslots, fig_title="Timeslots Consumption", output_path=None):
     """
     绘制单张柱状图:
       - X轴: 并发请求数量(rs_values)
@@ -143,8 +148,8 @@ def plot_ieee_singlecolumn_bar_chart(avg_timeslots, fig_title="Timeslots Consump
     # -----------------------------
     # 5) 显示或保存图
     # -----------------------------
-    # plt.savefig("Timeslots_IEEE_Single.pdf", bbox_inches="tight")  # 若需导出PDF
-    plt.show()
+    # 传入 output_path (如 "Timeslots_IEEE_Single.pdf") 则保存而不显示
+    finish_figure(output_path)
 
 def main():
     directory = r"D:\Code\912"  # 指定txt文件所在的目录
@@ -0,0 +1,119 @@
+# conflicts.py
+"""
+Conflict models for merging requests into timeslots.
+
+    node   no two requests in a timeslot share a node (the original model)
+    edge   no two requests in a timeslot share a link; crossing at a node is allowed
+    swap   requests share a node as long as its memories suffice: a path takes one memory at
+           each end node and two at every node where it swaps
+
+Every model counts the usage of its resources (nodes or links) per request, packed into one
+integer with a fixed-width field per resource. The occupancy of a timeslot is the sum of the
+usage of its requests, and a request fits when no field exceeds its capacity after adding it:
+each field carries a bias so that it reaches its top bit exactly when it is over capacity, so
+the check is one addition and one AND over all resources at once. For node and edge every
+capacity is 1, which is the same as checking the node or link masks for overlap.
+
+A request reserves every path it is merged with (both high weight paths, or all K in
+fifo_merge), so its usage is the per-resource maximum over those paths.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Tuple
+
+from basicsystem import GridTopology
+
+CONFLICT_MODELS = ("node", "edge", "swap")
+
+
+class ConflictModel(ABC):
+    def __init__(self, name: str, capacities: List[int], max_usage: int):
+        self.name = name
+        self.capacities = capacities
+        # Wide enough that occupancy plus usage plus bias never carries into the next field
+        self.width = (max(capacities, default=1) + 2 * max_usage).bit_length() + 1
+        top = 1 << (self.width - 1)
+        self._high = 0
+        self._bias = 0
+        for i, capacity in enumerate(capacities):
+            self._high |= top << (self.width * i)
+            self._bias |= (top - 1 - capacity) << (self.width * i)
+        self._path_cache: Dict[Tuple[str, ...], Dict[int, int]] = {}
+        self._usage_cache: Dict[Tuple[Tuple[str, ...], ...], int] = {}
+
+    @abstractmethod
+    def path_fields(self, path: List[str]) -> Dict[int, int]:
+        """Resource index -> units a path uses of it."""
+
+    def _fields(self, path: List[str]) -> Dict[int, int]:
+        key = tuple(path)
+        fields = self._path_cache.get(key)
+        if fields is None:
+            fields = self._path_cache[key] = self.path_fields(path)
+        return fields
+
+    def usage(self, paths: Sequence[List[str]]) -> int:
+        """Packed usage of a request reserving all of `paths`; empty paths reserve nothing."""
+        key = tuple(tuple(path) for path in paths if path)
+        packed = self._usage_cache.get(key)
+        if packed is None:
+            combined: Dict[int, int] = {}
+            for path in key:
+                for field, units in self._fields(list(path)).items():
+                    if units > combined.get(field, 0):
+                        combined[field] = units
+            packed = 0
+            for field, units in combined.items():
+                packed |= units << (self.width * field)
+            self._usage_cache[key] = packed
+        return packed
+
+    def fits(self, occupancy: int, usage: int) -> bool:
+        return not (occupancy + usage + self._bias) & self._high
+
+    def field_totals(self, packed: int) -> List[int]:
+        """Unpack a usage or occupancy into one count per resource."""
+        mask = (1 << self.width) - 1
+        return [(packed >> (self.width * i)) & mask for i in range(len(self.capacities))]
+
+
+class NodeConflicts(ConflictModel):
+    def __init__(self, num_nodes: int):
+        super().__init__("node", [1] * num_nodes, 1)
+
+    def path_fields(self, path: List[str]) -> Dict[int, int]:
+        return {int(node[1:]) - 1: 1 for node in path}
+
+
+class EdgeConflicts(ConflictModel):
+    def __init__(self, graph):
+        self.edge_index: Dict[Tuple[str, str], int] = {}
+        for u, v in sorted((u, v) if u < v else (v, u) for u, v in graph.edges()):
+            self.edge_index[(u, v)] = len(self.edge_index)
+        super().__init__("edge", [1] * len(self.edge_index), 1)
+
+    def path_fields(self, path: List[str]) -> Dict[int, int]:
+        return {self.edge_index[(u, v) if u < v else (v, u)]: 1 for u, v in zip(path[:-1], path[1:])}
+
+
+class SwapConflicts(ConflictModel):
+    def __init__(self, topology: GridTopology):
+        super().__init__("swap", [len(node.memories) for node in topology.nl], 2)
+
+    def path_fields(self, path: List[str]) -> Dict[int, int]:
+        fields = {int(node[1:]) - 1: 2 for node in path[1:-1]}
+        for node in (path[0], path[-1]):
+            fields[int(node[1:]) - 1] = 1
+        return fields
+
+
+def build_conflict_model(name: str, requests) -> ConflictModel:
+    """The conflict model `name` for the topology and routing graph of a Requests instance."""
+    if name == "node":
+        return NodeConflicts(requests.topology.nodes_number)
+    if name == "edge":
+        if requests._graph is None:
+            requests._graph = requests.build_graph()
+        return EdgeConflicts(requests._graph)
+    if name == "swap":
+        return SwapConflicts(requests.topology)
+    raise ValueError(f"Unknown conflict model {name!r}, expected one of {', '.join(CONFLICT_MODELS)}")
@@ -2,6 +2,8 @@ import os
 import re
 import numpy as np
 import matplotlib.pyplot as plt
+import eventlog
+from rendering import finish_figure
 
 def extract_timeslots(file_path):
     """Extracts the total timeslots for each scheduling algorithm from a given file."""
@@ -39,9 +41,12 @@ def process_all_files(directory):
     aggregated_timeslots = {"FIFO": {}, "FIFO Merge": {}, "RRRN": {}, "RRRN Merge": {}}
 
     for filename in os.listdir(directory):
-        if filename.endswith(".txt"):
+        if filename.endswith(".txt") or eventlog.is_event_log(filename):
             file_path = os.path.join(directory, filename)
-            timeslots = extract_timeslots(file_path)
+            if eventlog.is_event_log(file_path):
+                timeslots = eventlog.extract_timeslots(file_path)
+            else:
+                timeslots = extract_timeslots(file_path)
 
             for key in timeslots:
                 for rs_value, slot_value in timeslots[key]:
@@ -58,7 +63,7 @@ def process_all_files(directory):
     print(f"Averaged timeslots: {avg_timeslots}")  # 调试输出
     return avg_timeslots
 
-def plot_combined_avg_timeslots(avg_timeslots):
+def plot_combined_avg_timeslots(avg_timeslots, output_path=None):
     """Plots a combined bar chart of the average total timeslots for each scheduling algorithm."""
     rs_values = sorted(list(avg_timeslots["FIFO"].keys()))
 
@@ -87,7 +92,7 @@ def plot_combined_avg_timeslots(avg_timeslots):
     plt.legend(fontsize=16)
 
     plt.tight_layout()  # 调整图表布局以防止重叠
-    plt.show()
+    finish_figure(output_path)
 
 if __name__ == "__main__":
     directory = "D:\\Code\\912"  # 指定txt文件所在的目录路径
@@ -3,6 +3,8 @@ import re
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib  # Import matplotlib to access colormaps
+import eventlog
+from rendering import finish_figure
 
 
 def extract_delays(file_path):
@@ -54,9 +56,12 @@ def process_all_files(directory):
     all_requests_numbers = set()
 
     for filename in os.listdir(directory):
-        if filename.endswith(".txt"):
+        if filename.endswith(".txt") or eventlog.is_event_log(filename):
             file_path = os.path.join(directory, filename)
-            delays = extract_delays(file_path)
+            if eventlog.is_event_log(file_path):
+                delays = eventlog.extract_delays(file_path)
+            else:
+                delays = extract_delays(file_path)
 
             for key in delays:
                 for system_size, requests_number, delay_value in delays[key]:
@@ -78,7 +83,8 @@ def process_all_files(directory):
     return avg_delays, sorted(all_system_sizes), sorted(all_requests_numbers)
 
 
-def plot_combined_relative_delays_by_system_size(avg_delays, all_system_sizes, all_requests_numbers, base_algo='FIFO'):
+def plot_combined_relative_delays_by_system_size(avg_delays, all_system_sizes, all_requests_numbers, base_algo='FIFO',
+                                                 output_path=None):
     """
     Plots relative delays for FIFO Merge and RRRN Merge compared to base_algo, varying system size,
     with multiple lines for different requests numbers.
@@ -128,7 +134,7 @@ def plot_combined_relative_delays_by_system_size(avg_delays, all_system_sizes, a
     plt.ylim(0.2, 0.7)  # 设置统一的 Y 轴范围
     plt.yticks(np.arange(0.2, 0.75, 0.1))  # 设置 Y 轴的刻度值
     plt.tight_layout()  # 调整布局以适应单列宽度
-    plt.show()
+    finish_figure(output_path)
 
 
 if __name__ == "__main__":
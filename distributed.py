@@ -0,0 +1,337 @@
+# distributed.py
+"""
+Distributed execution of experiment sweeps over worker processes on several hosts.
+
+    python distributed.py driver --listen 0.0.0.0:50000 --authkey secret --system-sizes 16 36 64 ...
+    python distributed.py worker --connect driver-host:50000 --authkey secret      # on every host
+
+The driver serves a broker through a multiprocessing manager; workers pull chunks of
+configurations from it and push results back. LocalBroker is the same broker used in-process,
+so the protocol can be exercised without any network (see run_local).
+
+Every worker has its own queue and steals from the longest other queue once it runs dry.
+Chunks held by a worker for too long are handed out again; a configuration reported twice is
+only counted once. Each configuration is seeded from its index in the sweep, so its results
+do not depend on which worker runs it or when.
+
+With --share-paths the driver routes every node pair of each system size once and publishes
+the path caches through the broker; workers fetch them once per system size. Once every result
+is in, the driver closes the broker, and workers return when they see that or lose the
+connection to it.
+"""
+import argparse
+import collections
+import os
+import random
+import socket
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import eventlog
+from basicsystem import GridTopology
+from experiment import config_key, log_results, run_configuration, sweep_configurations
+from scheduling import Scheduling
+
+# A task is a chunk of configurations: {"key": str, "configs": [config, ...]}
+Task = Dict
+
+
+class LocalBroker:
+    """In-process task broker with per-worker queues, work stealing and result deduplication."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backlog: Deque[Task] = collections.deque()
+        self._queues: Dict[str, Deque[Task]] = {}
+        self._in_flight: Dict[str, Tuple[Task, str, float]] = {}
+        self._results: Dict[str, Dict] = {}
+        self._shared: Dict[str, object] = {}
+        self._closed = False
+        self.duplicates = 0
+        self.steals = 0
+
+    def register(self, worker_id: str):
+        # Workers that join late start on the shared backlog, then steal
+        with self._lock:
+            self._queues.setdefault(worker_id, collections.deque())
+
+    def submit(self, tasks: List[Task]):
+        with self._lock:
+            for task in tasks:
+                if self._queues:
+                    min(self._queues.values(), key=len).append(task)
+                else:
+                    self._backlog.append(task)
+
+    def get_task(self, worker_id: str) -> Optional[Task]:
+        with self._lock:
+            if self._closed:
+                return None
+            queue = self._queues.setdefault(worker_id, collections.deque())
+            if queue:
+                task = queue.popleft()
+            elif self._backlog:
+                task = self._backlog.popleft()
+            else:
+                victim = max(self._queues.values(), key=len)
+                if not victim:
+                    return None
+                task = victim.pop()  # Steal from the opposite end to the owner
+                self.steals += 1
+            self._in_flight[task["key"]] = (task, worker_id, time.monotonic())
+            return task
+
+    def put_result(self, worker_id: str, task_key: str, results: Dict[str, Dict]) -> int:
+        """Store the results of a chunk; returns how many configurations were new."""
+        with self._lock:
+            self._in_flight.pop(task_key, None)
+            new = 0
+            for key, result in results.items():
+                if key in self._results:
+                    self.duplicates += 1
+                else:
+                    self._results[key] = result
+                    new += 1
+            return new
+
+    def requeue_stale(self, timeout: float) -> int:
+        """Hand out again the chunks that have been in flight for longer than `timeout` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, (_, _, started) in self._in_flight.items() if now - started > timeout]
+            for key in stale:
+                task, _, _ = self._in_flight.pop(key)
+                self._backlog.append(task)
+            return len(stale)
+
+    def results(self, keys: Optional[List[str]] = None) -> Dict[str, Dict]:
+        with self._lock:
+            if keys is None:
+                return dict(self._results)
+            return {key: self._results[key] for key in keys if key in self._results}
+
+    def result_count(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+    def put_shared(self, name: str, value):
+        with self._lock:
+            self._shared[name] = value
+
+    def get_shared(self, name: str):
+        with self._lock:
+            return self._shared.get(name)
+
+    def close(self):
+        """Stop handing out tasks; workers polling the broker return."""
+        with self._lock:
+            self._closed = True
+
+    def closed(self) -> bool:
+        with self._lock:
+            return self._closed
+
+    def status(self) -> Dict[str, int]:
+        with self._lock:
+            return {"queued": len(self._backlog) + sum(len(q) for q in self._queues.values()),
+                    "in_flight": len(self._in_flight), "results": len(self._results),
+                    "duplicates": self.duplicates, "steals": self.steals, "workers": len(self._queues)}
+
+
+class Worker:
+    """Runs chunks of configurations, keeping one warm Scheduling per system size for its whole life."""
+
+    def __init__(self, broker, worker_id: str):
+        self.broker = broker
+        self.worker_id = worker_id
+        self._schedulers: Dict[int, Scheduling] = {}
+
+    def scheduler(self, system_size: int) -> Scheduling:
+        if system_size not in self._schedulers:
+            scheduling = Scheduling(GridTopology(system_size))
+            # Shared path caches are fetched once per worker and system size, never per task
+            paths = self.broker.get_shared(f"paths:{system_size}")
+            if paths:
+                scheduling.requests.load_path_cache(paths)
+            self._schedulers[system_size] = scheduling
+        return self._schedulers[system_size]
+
+    def run_task(self, task: Task) -> Dict[str, Dict]:
+        results = {}
+        for config in task["configs"]:
+            random.seed(config["seed"])
+            np.random.seed(config["seed"])
+            result = run_configuration(config, self.scheduler(config["system_size"]))
+            results[config_key(config)] = dict(result, config=config)
+        return results
+
+    def run(self, idle_timeout: float = 0.0, poll_interval: float = 0.5):
+        """
+        Process tasks until the broker has had nothing to hand out for `idle_timeout` seconds, is
+        closed, or goes away (the driver shuts it down once it has every result).
+        """
+        try:
+            self._run(idle_timeout, poll_interval)
+        except (EOFError, ConnectionError):
+            pass
+
+    def _run(self, idle_timeout: float, poll_interval: float):
+        self.broker.register(self.worker_id)
+        idle_since = None
+        while True:
+            task = self.broker.get_task(self.worker_id)
+            if task is None:
+                if self.broker.closed():
+                    return
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            idle_since = None
+            self.broker.put_result(self.worker_id, task["key"], self.run_task(task))
+
+
+def make_tasks(configs: List[Dict], chunk_size: int, seed: int = 0) -> List[Task]:
+    seeded = [dict(config, seed=seed + index) for index, config in enumerate(configs)]
+    return [{"key": f"chunk{start // chunk_size}", "configs": seeded[start:start + chunk_size]}
+            for start in range(0, len(seeded), chunk_size)]
+
+
+def publish_path_caches(broker, system_sizes: List[int]):
+    """Route every node pair of each system size once and share the K paths with the workers."""
+    for system_size in system_sizes:
+        requests = Scheduling(GridTopology(system_size)).requests
+        names = [node.name for node in requests.topology.nl]
+        requests.find_all_shortest_paths([(src, dst) for src in names for dst in names if src != dst])
+        broker.put_shared(f"paths:{system_size}", requests.export_path_cache())
+
+
+def collect(broker, configs: List[Dict], logger: Optional[eventlog.EventLogger] = None,
+            stale_timeout: float = 600.0, poll_interval: float = 1.0) -> Dict[str, Dict]:
+    """Wait until every configuration has a result, re-dispatching stragglers, and log the metrics once."""
+    keys = [config_key(config) for config in configs]
+    while broker.result_count() < len(set(keys)):
+        broker.requeue_stale(stale_timeout)
+        time.sleep(poll_interval)
+    results = broker.results(keys)
+    logger = logger if logger is not None else eventlog.get_logger()
+    for config in configs:
+        log_results(logger, config, results[config_key(config)])
+    logger.flush()
+    return results
+
+
+def run_local(configs: List[Dict], num_workers: int = 2, chunk_size: int = 1, seed: int = 0,
+              shared_paths: Optional[Dict[int, Dict]] = None) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    """
+    Run a sweep through a LocalBroker with `num_workers` workers interleaved in this process.
+
+    This exercises the task protocol, stealing and deduplication without processes or sockets.
+    """
+    broker = LocalBroker()
+    for system_size, paths in (shared_paths or {}).items():
+        broker.put_shared(f"paths:{system_size}", paths)
+    broker.submit(make_tasks(configs, chunk_size, seed))
+    workers = [Worker(broker, f"local-{i}") for i in range(num_workers)]
+    for worker in workers:
+        broker.register(worker.worker_id)
+    active = list(workers)
+    while active:
+        for worker in list(active):
+            task = broker.get_task(worker.worker_id)
+            if task is None:
+                active.remove(worker)
+                continue
+            broker.put_result(worker.worker_id, task["key"], worker.run_task(task))
+    return collect(broker, configs, poll_interval=0.0), broker.status()
+
+
+_server_broker: Optional[LocalBroker] = None
+
+
+def _get_server_broker() -> LocalBroker:
+    global _server_broker
+    if _server_broker is None:
+        _server_broker = LocalBroker()
+    return _server_broker
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+BrokerManager.register("get_broker", callable=_get_server_broker)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+def start_broker(address: Tuple[str, int], authkey: bytes) -> Tuple[BrokerManager, LocalBroker]:
+    """Serve a broker in a manager process and return the manager and a proxy to the broker."""
+    manager = BrokerManager(address=address, authkey=authkey)
+    manager.start()
+    return manager, manager.get_broker()
+
+
+def connect_broker(address: Tuple[str, int], authkey: bytes) -> LocalBroker:
+    manager = BrokerManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_broker()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Distributed scheduling sweeps")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    driver = subparsers.add_parser("driver", help="serve the broker, dispatch a sweep and collect it")
+    driver.add_argument("--listen", default="0.0.0.0:50000")
+    driver.add_argument("--authkey", required=True)
+    driver.add_argument("--system-sizes", type=int, nargs="+", default=[16, 36, 64])
+    driver.add_argument("--requests", type=int, nargs="+", default=[30, 60, 90])
+    driver.add_argument("--repetitions", type=int, default=1)
+    driver.add_argument("--rounds", type=int, default=1)
+    driver.add_argument("--chunk-size", type=int, default=4)
+    driver.add_argument("--seed", type=int, default=0)
+    driver.add_argument("--stale-timeout", type=float, default=600.0)
+    driver.add_argument("--log", help="JSON lines event log for the analysis scripts")
+    driver.add_argument("--share-paths", action="store_true",
+                        help="route all node pairs once per system size and ship the paths to the workers")
+
+    worker = subparsers.add_parser("worker", help="pull and run configuration chunks")
+    worker.add_argument("--connect", required=True)
+    worker.add_argument("--authkey", required=True)
+    worker.add_argument("--worker-id", default=None)
+    worker.add_argument("--idle-timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    if args.role == "worker":
+        broker = connect_broker(parse_address(args.connect), args.authkey.encode())
+        Worker(broker, args.worker_id or f"{socket.gethostname()}-{os.getpid()}").run(args.idle_timeout)
+        return
+
+    if args.log:
+        eventlog.configure(args.log)
+    configs = sweep_configurations(args.system_sizes, args.requests, (None,), args.repetitions, args.rounds)
+    manager, broker = start_broker(parse_address(args.listen), args.authkey.encode())
+    try:
+        if args.share_paths:
+            # Before any task is submitted, so no worker builds a Scheduling without them
+            publish_path_caches(broker, args.system_sizes)
+        broker.submit(make_tasks(configs, args.chunk_size, args.seed))
+        results = collect(broker, configs, stale_timeout=args.stale_timeout)
+        print(f"Collected {len(results)} configurations: {broker.status()}")
+        broker.close()
+    finally:
+        manager.shutdown()
+        eventlog.get_logger().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# eventlog.py
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+# Levels follow the numeric convention of the standard logging module
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# Metric names read back by the analysis scripts (2152.py, delay1111.py, data1111.py, con2115.py)
+TOTAL_DELAY = "total_delay"
+TOTAL_TIMESLOTS = "total_timeslots"
+
+
+class EventLogger:
+    """
+    Leveled event/metrics logger writing JSON lines in batches.
+
+    Records are kept in memory and serialised on flush, so callers must not mutate the
+    values they pass in afterwards. When the level is OFF (the default) every call returns
+    after a single integer comparison; hot paths should still guard expensive argument
+    construction with `enabled_for`.
+    """
+
+    def __init__(self, path: Optional[str] = None, level: int = OFF, buffer_size: int = 1024,
+                 stream: Optional[TextIO] = None):
+        self.level = OFF
+        self.buffer_size = buffer_size
+        self.path = None
+        self._stream = None
+        self._owns_stream = False
+        self._buffer: List[Tuple[float, int, str, Dict]] = []
+        self.configure(path=path, level=level, stream=stream)
+
+    def configure(self, path: Optional[str] = None, level: int = INFO, stream: Optional[TextIO] = None):
+        # Re-target the logger in place so that objects holding a reference see the change
+        self.close()
+        if path is not None:
+            self._stream = open(path, 'a', encoding='utf-8')
+            self._owns_stream = True
+        elif stream is not None:
+            self._stream = stream
+            self._owns_stream = False
+        self.path = path
+        self.level = level if self._stream is not None else OFF
+
+    def enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, event: str, **fields):
+        if level < self.level:
+            return
+        self._buffer.append((time.time(), level, event, fields))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def debug(self, event: str, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        if INFO >= self.level:
+            self.log(INFO, event, **fields)
+
+    def warning(self, event: str, **fields):
+        if WARNING >= self.level:
+            self.log(WARNING, event, **fields)
+
+    def metric(self, name: str, value, **tags):
+        # Metrics are results rather than diagnostics, so they are logged at INFO
+        if INFO >= self.level:
+            self.log(INFO, "metric", name=name, value=value, **tags)
+
+    def flush(self):
+        if not self._buffer or self._stream is None:
+            self._buffer.clear()
+            return
+        lines = []
+        for ts, level, event, fields in self._buffer:
+            record = {"ts": ts, "level": LEVEL_NAMES.get(level, level), "event": event}
+            record.update(fields)
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        self._buffer.clear()
+        self._stream.write("\n".join(lines) + "\n")
+        self._stream.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_stream and self._stream is not None:
+            self._stream.close()
+        self._stream = None
+        self._owns_stream = False
+        self.level = OFF
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_default_logger = EventLogger()
+
+
+def get_logger() -> EventLogger:
+    return _default_logger
+
+
+def configure(path: Optional[str] = None, level: int = INFO, stream: Optional[TextIO] = None) -> EventLogger:
+    """Point the process-wide logger at a file or stream; level OFF disables it again."""
+    _default_logger.configure(path=path, level=level, stream=stream)
+    return _default_logger
+
+
+def read_events(file_path: str, event: Optional[str] = None) -> Iterator[Dict]:
+    """Yield the records of a JSON lines event log, optionally only those of one event type."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if event is None or record.get("event") == event:
+                yield record
+
+
+def read_metrics(file_path: str, name: str) -> Iterator[Dict]:
+    for record in read_events(file_path, "metric"):
+        if record.get("name") == name:
+            yield record
+
+
+def extract_delays(file_path: str, algorithms: Tuple[str, ...] = ("FIFO", "FIFO Merge", "RRRN Merge")) \
+        -> Dict[str, List[Tuple[int, int, int]]]:
+    """Event log counterpart of the text parsers: {algorithm: [(system_size, requests_number, delay), ...]}."""
+    delays = {algo: [] for algo in algorithms}
+    for record in read_metrics(file_path, TOTAL_DELAY):
+        algo = record.get("algorithm")
+        if algo in delays:
+            delays[algo].append((int(record["system_size"]), int(record["requests_number"]), int(record["value"])))
+    return delays
+
+
+def extract_timeslots(file_path: str, algorithms: Tuple[str, ...] = ("FIFO", "FIFO Merge", "RRRN", "RRRN Merge")) \
+        -> Dict[str, List[Tuple[int, int]]]:
+    """Event log counterpart of the text parsers: {algorithm: [(requests_number, timeslots), ...]}."""
+    timeslots = {algo: [] for algo in algorithms}
+    for record in read_metrics(file_path, TOTAL_TIMESLOTS):
+        algo = record.get("algorithm")
+        if algo in timeslots:
+            timeslots[algo].append((int(record["requests_number"]), int(record["value"])))
+    return timeslots
+
+
+def is_event_log(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1] == ".jsonl"
@@ -0,0 +1,252 @@
+# execution.py
+"""
+Discrete-event execution of computed schedules on the qns simulator.
+
+    python execution.py --system-size 64 --requests 60 --workers 4
+
+Every request of timeslot t is served in [(t - 1) * slot_duration, t * slot_duration): each
+link of its path is attempted every `attempt_interval` until it succeeds with probability
+`generation_probability`, the resulting Werner pair (fidelity of the QuantumChannel) is
+written to a free QuantumMemory at both ends, and once all links are up the intermediate
+nodes swap and the end-to-end pair is read out of the memories, decohering for the time it
+was stored. A request that is not delivered by the end of its timeslot fails and frees its
+memories.
+
+Because nothing outlives its timeslot, groups of consecutive timeslots are independent and are
+simulated in parallel worker processes, each with its own Simulator. Link attempts are drawn
+as one geometric sample per link rather than one event per attempt, and only the memories on
+scheduled paths are driven, so the cost of a run follows the number of scheduled requests.
+"""
+import argparse
+import copy
+import math
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from qns.entity.memory.memory import QuantumMemory
+from qns.models.epr import WernerStateEntanglement
+from qns.simulator.event import func_to_event
+from qns.simulator.simulator import Simulator
+
+from basicsystem import GridTopology
+from instrumentation import timed
+
+# (request_id, timeslot, path)
+ScheduledRequest = Tuple[str, int, List[str]]
+
+DEFAULT_PARAMETERS = {
+    "slot_duration": 1e-3,           # seconds per timeslot
+    "attempt_interval": 1e-5,        # seconds between link generation attempts
+    "generation_probability": 0.2,   # success probability of one attempt
+    "swap_delay": 1e-6,              # seconds for the swaps and their classical signalling
+    "accuracy": 1000000000,          # simulator time slots per second
+}
+
+
+def _install(entity, simulator: Simulator):
+    # qns entities install once; the memories are reused by every group a worker simulates
+    entity._is_installed = False
+    entity.install(simulator)
+
+
+class _RequestRun:
+    def __init__(self, request_id: str, timeslot: int, path: List[str]):
+        self.request_id = request_id
+        self.timeslot = timeslot
+        self.path = path
+        self.links: List[Optional[WernerStateEntanglement]] = [None] * max(len(path) - 1, 0)
+        self.held: List[Tuple[QuantumMemory, WernerStateEntanglement]] = []
+        self.ready = 0
+        self.done = False
+        self.record = {"request_id": request_id, "timeslot": timeslot, "hops": len(self.links),
+                       "delivered": False, "time": None, "fidelity": None}
+
+
+class GroupSimulation:
+    """Runs one group of timeslots in a fresh Simulator over the topology's memories."""
+
+    def __init__(self, topology: GridTopology, parameters: Dict, seed: int):
+        self.topology = topology
+        self.parameters = parameters
+        self.rng = random.Random(seed)
+        self.nodes = {node.name: node for node in topology.nl}
+        self.channels = {}
+        for link in topology.ll:
+            u, v = (f"V{index}" for index in link.name[1:].split(","))
+            self.channels[(u, v)] = self.channels[(v, u)] = link
+        self.simulator: Optional[Simulator] = None
+
+    def _free_memory(self, node: str) -> Optional[QuantumMemory]:
+        for memory in self.nodes[node].memories:
+            if memory.count == 0:
+                return memory
+        return None
+
+    def _link_up(self, run: _RequestRun, index: int):
+        if run.done:
+            return
+        u, v = run.path[index], run.path[index + 1]
+        memory_u, memory_v = self._free_memory(u), self._free_memory(v)
+        if memory_u is None or memory_v is None:
+            return  # No free memory: the link is lost and the request fails at its deadline
+        epr = WernerStateEntanglement(fidelity=self.channels[(u, v)].fidelity)
+        memory_u.write(epr)
+        memory_v.write(epr)
+        run.held.extend([(memory_u, epr), (memory_v, epr)])
+        run.links[index] = epr
+        run.ready += 1
+        if run.ready == len(run.links):
+            t = self.simulator.tc + self.simulator.time(sec=self.parameters["swap_delay"])
+            self.simulator.add_event(func_to_event(t, self._swap, run=run))
+
+    def _release(self, run: _RequestRun):
+        # Read every held half out of its memory, which applies the storage error model and frees it
+        for memory, epr in run.held:
+            memory.read(epr)
+        run.held.clear()
+
+    def _swap(self, run: _RequestRun):
+        if run.done:
+            return
+        self._release(run)
+        pair = run.links[0]
+        for epr in run.links[1:]:
+            pair = pair.swapping(epr)
+        run.done = True
+        run.record.update(delivered=True, time=self.simulator.tc.sec, fidelity=float(pair.fidelity))
+
+    def _deadline(self, run: _RequestRun):
+        if not run.done:
+            run.done = True
+            self._release(run)
+
+    def run(self, requests: List[ScheduledRequest]) -> List[Dict]:
+        params = self.parameters
+        slot = params["slot_duration"]
+        first = min(timeslot for _, timeslot, _ in requests)
+        last = max(timeslot for _, timeslot, _ in requests)
+        self.simulator = Simulator((first - 1) * slot, last * slot + params["swap_delay"], accuracy=params["accuracy"])
+        for request_id, timeslot, path in requests:
+            for node in path:
+                for memory in self.nodes[node].memories:
+                    _install(memory, self.simulator)
+
+        runs = []
+        log_failure = math.log(1 - params["generation_probability"])
+        for request_id, timeslot, path in requests:
+            run = _RequestRun(request_id, timeslot, path)
+            runs.append(run)
+            start, end = (timeslot - 1) * slot, timeslot * slot
+            if len(path) < 2:
+                continue
+            for index in range(len(path) - 1):
+                # Attempts until the first success: one geometric sample instead of one event per attempt
+                attempts = 1 + int(math.log(1 - self.rng.random()) / log_failure) if log_failure < 0 else 1
+                u, v = path[index], path[index + 1]
+                t = start + attempts * params["attempt_interval"] + self.channels[(u, v)].delay_model.calculate()
+                if t < end:
+                    self.simulator.add_event(func_to_event(self.simulator.time(sec=t), self._link_up,
+                                                           run=run, index=index))
+            self.simulator.add_event(func_to_event(self.simulator.time(sec=end), self._deadline, run=run))
+        self.simulator.run()
+        return [run.record for run in runs]
+
+
+_worker_topology: Optional[GridTopology] = None
+
+
+def _init_worker(nodes_number: int, qchannel_args: Dict, memory_args: Dict):
+    # The qns topology is built once per worker process, not once per group
+    global _worker_topology
+    _worker_topology = GridTopology(nodes_number, qchannel_args=qchannel_args, memory_args=memory_args)
+    _worker_topology.build()
+
+
+def _run_group(requests: List[ScheduledRequest], parameters: Dict, seed: int) -> List[Dict]:
+    return GroupSimulation(_worker_topology, parameters, seed).run(requests)
+
+
+def summarize(records: List[Dict], slot_duration: float) -> Dict[str, float]:
+    """Throughput in delivered EPR pairs per second and end-to-end latency from the start of the round."""
+    delivered = [record for record in records if record["delivered"]]
+    span = max((record["timeslot"] for record in records), default=0) * slot_duration
+    latencies = sorted(record["time"] for record in delivered)
+
+    def percentile(q: float) -> Optional[float]:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+    return {"requests": len(records), "delivered": len(delivered), "failed": len(records) - len(delivered),
+            "throughput": len(delivered) / span if span else 0.0,
+            "latency_mean": statistics.fmean(latencies) if latencies else None,
+            "latency_p50": percentile(0.5), "latency_p99": percentile(0.99),
+            "fidelity_mean": statistics.fmean(r["fidelity"] for r in delivered) if delivered else None}
+
+
+class ScheduleExecutor:
+    def __init__(self, topology: GridTopology, workers: Optional[int] = None, group_size: int = 8,
+                 seed: int = 0, **parameters):
+        self.topology = topology
+        self.workers = workers
+        self.group_size = group_size  # Consecutive timeslots simulated by one task
+        self.seed = seed
+        self.parameters = dict(DEFAULT_PARAMETERS, **parameters)
+        self.records: List[Dict] = []
+
+    def groups(self, schedule: List[Tuple[str, int]], paths: Dict[str, List[str]]) -> List[List[ScheduledRequest]]:
+        by_group: Dict[int, List[ScheduledRequest]] = {}
+        for request_id, timeslot in schedule:
+            by_group.setdefault((timeslot - 1) // self.group_size, []).append(
+                (request_id, timeslot, list(paths.get(request_id) or [])))
+        return [by_group[key] for key in sorted(by_group)]
+
+    @timed("execute_schedule")
+    def execute(self, schedule: List[Tuple[str, int]], paths: Dict[str, List[str]]) -> Dict[str, float]:
+        """
+        Simulate a schedule and return its measured metrics (see summarize).
+
+        `paths` maps request IDs to the path each request uses, e.g. the first of its high weight
+        paths or Scheduling.chosen_paths. Per-request records are kept in self.records. Each group
+        is seeded from its first timeslot, so results do not depend on the number of workers.
+        """
+        groups = self.groups(schedule, paths)
+        seeds = [self.seed * 1000003 + group[0][1] for group in groups]
+        init_args = (self.topology.nodes_number, self.topology.qchannel_args, self.topology.memory_args)
+        if self.workers == 0:
+            _init_worker(*init_args)
+            results = [_run_group(group, self.parameters, seed) for group, seed in zip(groups, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=init_args) as pool:
+                results = list(pool.map(_run_group, groups, [self.parameters] * len(groups), seeds))
+        self.records = [record for group in results for record in group]
+        return summarize(self.records, self.parameters["slot_duration"])
+
+
+def main(argv: Optional[List[str]] = None):
+    from scheduling import Scheduling
+
+    parser = argparse.ArgumentParser(description="Execute FIFO Merge and RRRN Merge schedules on the qns simulator")
+    parser.add_argument("--system-size", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 simulates in-process)")
+    parser.add_argument("--group-size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    scheduling = Scheduling(GridTopology(args.system_size))
+    all_requests = scheduling.requests.generate_requests_by_rounds(args.requests, 1)
+    round_requests = all_requests[0]['requests']
+    paths = scheduling.requests.find_all_shortest_paths([(src, dst) for _, src, dst in round_requests])
+    first_paths = {request_id: paths[(src, dst)][0] if paths[(src, dst)] else []
+                   for request_id, src, dst in round_requests}
+    schedules = {"FIFO Merge": scheduling.fifo_merge(scheduling.fifo_schedule(all_requests)[0], all_requests),
+                 "RRRN Merge": scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)[0][0]}
+    executor = ScheduleExecutor(scheduling.topology, workers=args.workers, group_size=args.group_size, seed=args.seed)
+    for name, schedule in schedules.items():
+        print(f"{name}: {executor.execute(schedule, first_paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# experiment.py
+"""
+Parameter sweep driver around Scheduling/Requests with checkpoint and resume.
+
+    python experiment.py --system-sizes 16 36 64 --requests 30 60 90 --repetitions 10 \
+        --checkpoint sweep.ckpt --log sweep.jsonl
+
+After every configuration the completed results and the state of both random generators are
+written to the checkpoint atomically. Restarting with the same arguments skips the finished
+configurations and continues from the last one with the same random state, so an interrupted
+sweep produces exactly the results of an uninterrupted one.
+
+--profile turns on the timers and counters of instrumentation.py for the sweep: their running
+totals are logged after every configuration, and the final report is printed and saved.
+"""
+import argparse
+import copy
+import os
+import pickle
+import random
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import analytics
+import eventlog
+from basicsystem import GridTopology
+from conflicts import CONFLICT_MODELS
+from instrumentation import profiler
+from scheduling import Scheduling
+from traces import Trace
+
+CHECKPOINT_VERSION = 1
+
+
+def sweep_configurations(system_sizes: Sequence[int], requests_numbers: Sequence[int],
+                         fidelities: Sequence[Optional[float]] = (None,), repetitions: int = 1,
+                         rounds: int = 1, coefficients: Tuple[float, float, float] = (1, 1, 1)) -> List[Dict]:
+    """
+    All configurations of a sweep, in the order they are run.
+
+    `fidelities` are fidelity targets; None means no fidelity constraint.
+    """
+    configs = []
+    for system_size in system_sizes:
+        for requests_number in requests_numbers:
+            for fidelity in fidelities:
+                for repetition in range(repetitions):
+                    configs.append({"system_size": system_size, "requests_number": requests_number,
+                                    "fidelity": fidelity, "repetition": repetition, "rounds": rounds,
+                                    "coefficients": tuple(coefficients)})
+    return configs
+
+
+def config_key(config: Dict) -> str:
+    return (f"ss={config['system_size']},rn={config['requests_number']},fid={config['fidelity']},"
+            f"rep={config['repetition']},rounds={config['rounds']},coef={config['coefficients']}")
+
+
+def run_configuration(config: Dict, scheduling: Scheduling, all_requests: Optional[List[Dict]] = None,
+                      skip_settled: bool = False) -> Dict:
+    """
+    Run FIFO, FIFO Merge, RRRN and RRRN Merge on freshly generated requests, or on `all_requests`
+    (e.g. rounds replayed from a trace, see traces.py).
+
+    With a fidelity target, requests whose endpoints cannot reach it on any path are rejected
+    before scheduling and the remaining ones are routed on paths that meet it.
+
+    Returns total delay and total timeslots per algorithm, summed over the rounds, the number of
+    rejected requests. With skip_settled, the lower bounds of both merges are computed as well (see
+    analytics.py, returned under "bounds"), and a merge is not run on rounds whose bounds already
+    fix its result to one request per timeslot. The bounds cost a pairwise conflict graph per
+    round, so other runs skip them.
+    """
+    k, c, a = config["coefficients"]
+    requests = scheduling.requests
+    requests.fidelity_threshold = config["fidelity"]
+    if all_requests is None:
+        all_requests = requests.generate_requests_by_rounds(config["requests_number"], config["rounds"])
+    rejected = 0
+    for round_info in all_requests if config["fidelity"] is not None else ():
+        admitted = [request for request in round_info["requests"] if requests.is_feasible(request[1], request[2])]
+        rejected += len(round_info["requests"]) - len(admitted)
+        round_info["requests"] = admitted
+    delays = {"FIFO": 0, "FIFO Merge": 0, "RRRN Merge": 0}
+    timeslots = {"FIFO": 0, "FIFO Merge": 0, "RRRN": 0, "RRRN Merge": 0}
+    bounds, round_bounds = analytics.bounds_by_merge(scheduling, all_requests) if skip_settled \
+        else (None, [None] * len(all_requests))
+
+    fifo_schedules = scheduling.fifo_schedule(all_requests)
+    # Settled rounds keep one request per timeslot in every merge, so their merges are not run
+    rrrn_rounds = [i for i, round_bound in enumerate(round_bounds)
+                   if not (skip_settled and round_bound["RRRN Merge"]["settled"])]
+    rrrn_schedules, pre_merge_schedules = list(fifo_schedules), list(fifo_schedules)
+    if rrrn_rounds:
+        scheduled, pre_merge = scheduling.rrrn_schedule(copy.deepcopy([all_requests[i] for i in rrrn_rounds]), k, c, a)
+        for i, schedule, pre in zip(rrrn_rounds, scheduled, pre_merge):
+            rrrn_schedules[i], pre_merge_schedules[i] = schedule, pre
+    for round_info, fifo, rrrn, pre_merge, round_bound in zip(all_requests, fifo_schedules, rrrn_schedules,
+                                                              pre_merge_schedules, round_bounds):
+        if skip_settled and round_bound["FIFO Merge"]["settled"]:
+            fifo_merged = fifo
+        else:
+            fifo_merged = scheduling.fifo_merge(list(fifo), [round_info])
+        for name, schedule in (("FIFO", fifo), ("FIFO Merge", fifo_merged), ("RRRN", pre_merge),
+                               ("RRRN Merge", rrrn)):
+            timeslots[name] += max((ts for _, ts in schedule), default=0)
+            if name in delays:
+                delays[name] += scheduling.calculate_total_delay(schedule)
+    results = {"delays": delays, "timeslots": timeslots, "rejected": rejected}
+    if bounds is not None:
+        results["bounds"] = bounds
+    return results
+
+
+def log_results(logger: eventlog.EventLogger, config: Dict, results: Dict):
+    # The metrics the analysis scripts read (see eventlog.extract_delays/extract_timeslots)
+    tags = {"system_size": config["system_size"], "requests_number": config["requests_number"],
+            "fidelity": config["fidelity"], "repetition": config["repetition"]}
+    for algorithm, value in results["delays"].items():
+        logger.metric(eventlog.TOTAL_DELAY, value, algorithm=algorithm, **tags)
+    for algorithm, value in results["timeslots"].items():
+        logger.metric(eventlog.TOTAL_TIMESLOTS, value, algorithm=algorithm, **tags)
+
+
+def save_checkpoint(path: str, state: Dict):
+    """Write the checkpoint to a temporary file in the same directory and atomically replace the old one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".ckpt-", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        state = pickle.load(file)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}: {state.get('version')}")
+    return state
+
+
+def load_results(path: str) -> Dict[str, Dict]:
+    """Results of the completed configurations of a checkpoint, keyed by config_key."""
+    state = load_checkpoint(path)
+    return state["results"] if state else {}
+
+
+class Experiment:
+    def __init__(self, configs: List[Dict], checkpoint_path: Optional[str] = None, seed: int = 0,
+                 logger: Optional[eventlog.EventLogger] = None, trace_path: Optional[str] = None,
+                 skip_settled: bool = False, conflict_model: str = "node", link_fidelity: Optional[float] = None,
+                 spur_search: str = "astar"):
+        self.configs = configs
+        self.checkpoint_path = checkpoint_path
+        self.seed = seed
+        self.logger = logger if logger is not None else eventlog.get_logger()
+        self.trace_path = trace_path  # Replay rounds from this trace instead of generating them
+        self.skip_settled = skip_settled  # Skip merges whose result the lower bounds already fix
+        self.conflict_model = conflict_model  # See conflicts.py
+        self.link_fidelity = link_fidelity  # None keeps the qns channel default
+        self.spur_search = spur_search  # See Requests.yen_k_shortest_paths
+        self.results: Dict[str, Dict] = {}
+        self._schedulers: Dict[int, Scheduling] = {}
+        self._trace: Optional[Trace] = None
+
+    def scheduler(self, system_size: int) -> Scheduling:
+        # One Scheduling per system size, so topology and path caches stay warm across configurations
+        if system_size not in self._schedulers:
+            topology = GridTopology(system_size, link_fidelity=self.link_fidelity)
+            self._schedulers[system_size] = Scheduling(topology, logger=self.logger)
+            self._schedulers[system_size].conflict_model = self.conflict_model
+            self._schedulers[system_size].requests.spur_search = self.spur_search
+        return self._schedulers[system_size]
+
+    def trace_rounds(self, config: Dict) -> Optional[List[Dict]]:
+        """The rounds of `config` in the trace: repetition r replays rounds [r * rounds, (r + 1) * rounds)."""
+        if self.trace_path is None:
+            return None
+        if self._trace is None:
+            self._trace = Trace(self.trace_path, self.scheduler(config["system_size"]).topology)
+        elif self._trace.nodes_number != config["system_size"]:
+            raise ValueError(f"{self.trace_path} was recorded on GridTopology({self._trace.nodes_number})")
+        start = config["repetition"] * config["rounds"]
+        if start + config["rounds"] > len(self._trace):
+            raise ValueError(f"{self.trace_path} has {len(self._trace)} rounds, {start + config['rounds']} needed")
+        return self._trace.all_requests(start, start + config["rounds"])
+
+    def _restore(self) -> bool:
+        state = load_checkpoint(self.checkpoint_path) if self.checkpoint_path else None
+        if state is None:
+            return False
+        self.results = state["results"]
+        random.setstate(state["random_state"])
+        np.random.set_state(state["numpy_state"])
+        return True
+
+    def _checkpoint(self):
+        self.logger.flush()  # Keep the event log in step with what the checkpoint says is done
+        save_checkpoint(self.checkpoint_path, {"version": CHECKPOINT_VERSION, "results": self.results,
+                                               "random_state": random.getstate(),
+                                               "numpy_state": np.random.get_state()})
+
+    def run(self) -> Dict[str, Dict]:
+        if not self._restore():
+            random.seed(self.seed)
+            np.random.seed(self.seed)
+        for config in self.configs:
+            key = config_key(config)
+            if key in self.results:
+                continue
+            results = run_configuration(config, self.scheduler(config["system_size"]), self.trace_rounds(config),
+                                        self.skip_settled)
+            log_results(self.logger, config, results)
+            if profiler.enabled:
+                # Running totals of the sweep so far, so the last record covers the whole run
+                profiler.log_report(self.logger, configuration=key)
+            self.results[key] = dict(results, config=config)
+            if self.checkpoint_path:
+                self._checkpoint()
+        self.logger.flush()
+        return self.results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a scheduling parameter sweep with checkpoints")
+    parser.add_argument("--system-sizes", type=int, nargs="+", default=[16, 36, 64])
+    parser.add_argument("--requests", type=int, nargs="+", default=[30, 60, 90])
+    parser.add_argument("--fidelities", type=float, nargs="*", default=[])
+    parser.add_argument("--link-fidelity", type=float, default=None,
+                        help="Werner fidelity of every link (default: the qns channel default, 0.8)")
+    parser.add_argument("--repetitions", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--coefficients", type=float, nargs=3, default=[1, 1, 1], metavar=("K", "C", "A"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checkpoint", help="checkpoint file; an existing one is resumed")
+    parser.add_argument("--log", help="JSON lines event log for the analysis scripts")
+    parser.add_argument("--trace", help="replay the rounds of this request trace (see traces.py) instead of "
+                                        "generating them; its topology must match the system size")
+    parser.add_argument("--skip-settled", action="store_true",
+                        help="do not run merges on rounds whose lower bounds already fix the result")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="time routing, scheduling and failure checks and count searches, conflict checks and "
+                             "cache hits; the report is printed, written to FILE and logged per configuration")
+    parser.add_argument("--conflict-model", choices=CONFLICT_MODELS, default="node",
+                        help="what keeps two requests out of one merged timeslot: a shared node, a shared link, "
+                             "or running out of node memories (swap)")
+    parser.add_argument("--spur-search", choices=["astar", "dijkstra"], default="astar",
+                        help="spur searches of Yen's K paths; astar (the default) may settle on other paths of equal "
+                             "length than dijkstra, the original search, which reproduces results from before A*")
+    args = parser.parse_args(argv)
+
+    if args.log:
+        eventlog.configure(args.log)
+    if args.profile:
+        profiler.enable()
+    configs = sweep_configurations(args.system_sizes, args.requests, args.fidelities or [None], args.repetitions,
+                                   args.rounds, tuple(args.coefficients))
+    results = Experiment(configs, args.checkpoint, args.seed, trace_path=args.trace,
+                         skip_settled=args.skip_settled, conflict_model=args.conflict_model,
+                         link_fidelity=args.link_fidelity, spur_search=args.spur_search).run()
+    for key in (config_key(config) for config in configs):
+        line = f"{key}: delays {results[key]['delays']} timeslots {results[key]['timeslots']}"
+        if "bounds" in results[key]:
+            lower = {name: bound["timeslots_lower"] for name, bound in results[key]["bounds"].items()}
+            line += f" lower bounds {lower}"
+        print(line)
+    if args.profile:
+        profiler.export(args.profile)
+        print(profiler.format_report())
+    eventlog.get_logger().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# failures.py
+"""
+Failure analysis of scheduled requests without brute-force sampling.
+
+    python failures.py --system-size 64 --requests 60 --node-probability 1e-4 --cluster-probability 1e-5
+
+As in check_requests_failures, a request fails in its timeslot when every one of its candidate
+paths contains a failed node. An empty path (no redundant route was found) contains no node, so
+a request with one never fails, while a request without any candidate path always does. With
+A_i the event that path i is hit and U_T the node union of a set T of paths, inclusion-exclusion
+gives
+
+    P(all paths hit) = sum over non-empty T of (-1)^(|T| + 1) * P(some node of U_T fails)
+
+which is exact for any failure model that can tell how likely a node set is to be hit. Paths
+whose nodes include all nodes of another path are dropped first (they are hit whenever it is),
+and the terms are written as failure rather than survival probabilities, so small probabilities
+do not vanish in cancellation.
+
+ShockModel covers independent and correlated failures (a shock fails a node together with its
+grid neighbours). Its ImportanceSampler estimates the same probabilities by sampling the shocks
+that can touch a request from a proposal with inflated probabilities and weighting every
+sample by its likelihood ratio, for checks against the exact values and for failure events
+too large for inclusion-exclusion.
+"""
+import argparse
+import copy
+import math
+import random
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from basicsystem import GridTopology
+
+# Inclusion-exclusion runs over 2^K path subsets
+MAX_EXACT_PATHS = 20
+
+
+def _bits(mask: int) -> List[int]:
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+
+class ShockModel:
+    """
+    Failures caused by independent shocks: shock s fires with probability probabilities[s] and
+    fails every node in shock_masks[s] (bit i stands for node V(i+1), as in Requests.path_mask).
+    """
+
+    def __init__(self, num_nodes: int, shock_masks: List[int], probabilities: Sequence[float]):
+        if len(shock_masks) != len(probabilities):
+            raise ValueError("Every shock needs a probability")
+        self.num_nodes = num_nodes
+        self.shock_masks = list(shock_masks)
+        self.probabilities = np.asarray(probabilities, dtype=float)
+        self._log_up = np.log1p(-self.probabilities)
+        self._shocks_of: List[List[int]] = [[] for _ in range(num_nodes)]
+        for s, mask in enumerate(self.shock_masks):
+            for bit in _bits(mask):
+                self._shocks_of[bit].append(s)
+
+    @classmethod
+    def independent(cls, num_nodes: int, probability: Union[float, Sequence[float]]) -> "ShockModel":
+        """Every node fails on its own with `probability` (one value, or one per node)."""
+        probabilities = [probability] * num_nodes if np.isscalar(probability) else list(probability)
+        return cls(num_nodes, [1 << i for i in range(num_nodes)], probabilities)
+
+    @classmethod
+    def clustered(cls, topology: GridTopology, node_probability: float, cluster_probability: float) -> "ShockModel":
+        """Independent node failures plus, per node, a shock failing it and its grid neighbours."""
+        size, num_nodes = topology.size, topology.nodes_number
+        masks, probabilities = [1 << i for i in range(num_nodes)], [node_probability] * num_nodes
+        for i in range(num_nodes):
+            row, col = divmod(i, size)
+            mask = 1 << i
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= r < size and 0 <= c < size:
+                    mask |= 1 << (r * size + c)
+            masks.append(mask)
+            probabilities.append(cluster_probability)
+        return cls(num_nodes, masks, probabilities)
+
+    def shocks_hitting(self, mask: int) -> List[int]:
+        shocks = set()
+        for bit in _bits(mask):
+            shocks.update(self._shocks_of[bit])
+        return sorted(shocks)
+
+    def down_probability(self, mask: int) -> float:
+        """Probability that at least one node of `mask` fails."""
+        return -math.expm1(float(self._log_up[self.shocks_hitting(mask)].sum()))
+
+
+class FixedCountFailures:
+    """
+    The model of Scheduling.generate_failure_nodes: a timeslot fails with `timeslot_probability`,
+    and then exactly `failed_nodes` nodes chosen uniformly at random fail in it.
+    """
+
+    def __init__(self, num_nodes: int, failed_nodes: int, timeslot_probability: float):
+        self.num_nodes = num_nodes
+        self.failed_nodes = failed_nodes
+        self.timeslot_probability = timeslot_probability
+
+    @classmethod
+    def from_generator(cls, num_nodes: int, num_timeslots: int, failure_probability: float) -> "FixedCountFailures":
+        # Same rounding as generate_failure_nodes
+        failed_timeslots = max(1, int(num_timeslots * failure_probability))
+        return cls(num_nodes, max(1, int(num_nodes * failure_probability)), failed_timeslots / num_timeslots)
+
+    def down_probability(self, mask: int) -> float:
+        nodes = bin(mask).count("1")
+        missed = math.comb(self.num_nodes - nodes, self.failed_nodes) / math.comb(self.num_nodes, self.failed_nodes)
+        return self.timeslot_probability * (1 - missed)
+
+
+FailureModel = Union[ShockModel, FixedCountFailures]
+
+
+def reduce_masks(masks: List[int]) -> List[int]:
+    """
+    Distinct masks without those containing another one (hitting that one hits them too). An
+    empty mask is contained in every other one, so it is all that is left if there is one.
+    """
+    distinct = sorted(set(masks), key=lambda mask: bin(mask).count("1"))
+    kept: List[int] = []
+    for mask in distinct:
+        if not any(other & mask == other for other in kept):
+            kept.append(mask)
+    return kept
+
+
+def all_paths_fail_probability(model: FailureModel, masks: List[int]) -> float:
+    """Exact probability that every path (given as node mask) contains a failed node; 1 without paths."""
+    masks = reduce_masks(masks)
+    if not masks:
+        return 1.0
+    if not masks[0]:
+        return 0.0  # An empty path is never hit
+    if len(masks) > MAX_EXACT_PATHS:
+        raise ValueError(f"Inclusion-exclusion over {len(masks)} paths is too expensive; use ImportanceSampler")
+    unions = [0] * (1 << len(masks))
+    down: Dict[int, float] = {}
+    total = 0.0
+    for subset in range(1, 1 << len(masks)):
+        low = subset & -subset
+        union = unions[subset] = unions[subset ^ low] | masks[low.bit_length() - 1]
+        probability = down.get(union)
+        if probability is None:
+            probability = down[union] = model.down_probability(union)
+        total += probability if bin(subset).count("1") % 2 else -probability
+    return min(1.0, max(0.0, total))
+
+
+def request_masks(path_mask, paths: Dict[str, Sequence[List[str]]]) -> Dict[str, List[int]]:
+    """Node masks of the candidate paths of each request (e.g. high_weight_paths); empty paths are 0."""
+    return {request_id: [path_mask(path) for path in request_paths]
+            for request_id, request_paths in paths.items()}
+
+
+def request_failure_probabilities(path_mask, paths: Dict[str, Sequence[List[str]]],
+                                  model: FailureModel) -> Dict[str, float]:
+    """Exact failure probability of every request in its timeslot; `path_mask` is Requests.path_mask."""
+    return {request_id: all_paths_fail_probability(model, masks)
+            for request_id, masks in request_masks(path_mask, paths).items()}
+
+
+def expected_failed_requests(probabilities: Dict[str, float], schedule: List[Tuple[str, int]]) -> Dict[int, float]:
+    """Expected number of failed requests per timeslot of a schedule."""
+    expected: Dict[int, float] = {}
+    for request_id, timeslot in schedule:
+        expected[timeslot] = expected.get(timeslot, 0.0) + probabilities[request_id]
+    return expected
+
+
+class ImportanceSampler:
+    """
+    Likelihood-ratio estimates of request failure probabilities under a ShockModel.
+
+    Only the shocks that touch a request's paths are sampled. Their probabilities are scaled up
+    (capped at `max_probability`) so that `target_shocks` of them fire per trial on average,
+    which makes failures common; every trial is weighted by prod (p / q)^x ((1 - p) / (1 - q))^(1 - x)
+    over the sampled shocks, so the estimate stays unbiased. target_shocks=None samples from
+    the model itself (plain Monte Carlo), for comparison.
+    """
+
+    def __init__(self, model: ShockModel, target_shocks: Optional[float] = 1.5, max_probability: float = 0.5,
+                 seed: int = 0, batch: int = 65536):
+        self.model = model
+        self.target_shocks = target_shocks
+        self.max_probability = max_probability
+        self.rng = np.random.default_rng(seed)
+        self.batch = batch
+
+    def proposal(self, probabilities: np.ndarray) -> np.ndarray:
+        if self.target_shocks is None or probabilities.sum() >= self.target_shocks:
+            return probabilities
+        scaled = probabilities * (self.target_shocks / probabilities.sum())
+        return np.clip(scaled, probabilities, np.maximum(probabilities, self.max_probability))
+
+    def estimate_request(self, masks: List[int], trials: int) -> Tuple[float, float]:
+        """(estimate, standard error) of the probability that every path in `masks` is hit."""
+        masks = reduce_masks(masks)
+        if not masks:
+            return 1.0, 0.0
+        if not masks[0]:
+            return 0.0, 0.0
+        union = 0
+        for mask in masks:
+            union |= mask
+        shocks = self.model.shocks_hitting(union)
+        p = self.model.probabilities[shocks]
+        q = self.proposal(p)
+        hits = np.array([[bool(self.model.shock_masks[s] & mask) for mask in masks] for s in shocks], dtype=np.int32)
+        log_fired = np.log(p) - np.log(q)
+        log_idle = np.log1p(-p) - np.log1p(-q)
+        total = total_sq = 0.0
+        done = 0
+        while done < trials:
+            n = min(self.batch, trials - done)
+            fired = self.rng.random((n, len(shocks))) < q
+            failed = ((fired @ hits) > 0).all(axis=1)
+            weights = np.where(failed, np.exp(np.where(fired, log_fired, log_idle).sum(axis=1)), 0.0)
+            total += weights.sum()
+            total_sq += (weights * weights).sum()
+            done += n
+        mean = total / trials
+        variance = max(total_sq / trials - mean * mean, 0.0)
+        return mean, math.sqrt(variance / trials)
+
+    def estimate(self, path_mask, paths: Dict[str, Sequence[List[str]]],
+                 trials: int) -> Dict[str, Tuple[float, float]]:
+        return {request_id: self.estimate_request(masks, trials)
+                for request_id, masks in request_masks(path_mask, paths).items()}
+
+
+def main(argv: Optional[List[str]] = None):
+    from scheduling import Scheduling
+
+    parser = argparse.ArgumentParser(description="Exact and importance-sampled request failure probabilities")
+    parser.add_argument("--system-size", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--node-probability", type=float, default=1e-4)
+    parser.add_argument("--cluster-probability", type=float, default=1e-5)
+    parser.add_argument("--trials", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    scheduling = Scheduling(GridTopology(args.system_size))
+    all_requests = scheduling.requests.generate_requests_by_rounds(args.requests, 1)
+    schedule = scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)[0][0]
+    round_requests = all_requests[0]["requests"]
+    paths = scheduling.requests.find_all_shortest_paths([(src, dst) for _, src, dst in round_requests])
+    high_weight_paths = scheduling.requests.identify_high_weight_paths(round_requests, paths)
+
+    model = ShockModel.clustered(scheduling.topology, args.node_probability, args.cluster_probability)
+    path_mask = scheduling.requests.path_mask
+    exact = request_failure_probabilities(path_mask, high_weight_paths, model)
+    expected = expected_failed_requests(exact, schedule)
+    print(f"Expected failed requests per round: {sum(expected.values()):.3e} "
+          f"(worst timeslot {max(expected.values()):.3e})")
+    for name, target in (("importance sampling", 1.5), ("plain Monte Carlo", None)):
+        sampler = ImportanceSampler(model, target_shocks=target, seed=args.seed)
+        estimates = sampler.estimate(path_mask, high_weight_paths, args.trials)
+        errors = [abs(estimates[r][0] - exact[r]) / exact[r] for r in exact if exact[r] > 0]
+        # Trials a request needs for a 10% relative standard error; plain sampling has variance p(1 - p)
+        variances = {r: args.trials * estimates[r][1] ** 2 if target else exact[r] * (1 - exact[r]) for r in exact}
+        needed = [variances[r] / (0.1 * exact[r]) ** 2 for r in exact if exact[r] > 0]
+        print(f"{name}: {args.trials} trials per request, mean relative error {np.mean(errors):.3f}, "
+              f"median trials for 10% error {np.median(needed):.3g}")
+
+
+if __name__ == "__main__":
+    main()
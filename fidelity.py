@@ -0,0 +1,165 @@
+# fidelity.py
+"""
+Fidelity of entanglement distributed over a path of Werner-state links.
+
+Swapping two Werner links with parameters w1 and w2 (w = (4F - 1) / 3) leaves a Werner state
+with parameter w1 * w2, so a path has F = (1 + 3 * prod(w)) / 4. Fidelity therefore only
+drops with every hop, which gives every threshold a maximum number of hops.
+"""
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from routing import Graph
+
+
+def werner_parameter(fidelity: float) -> float:
+    return (4 * fidelity - 1) / 3
+
+
+def swap_fidelity(fidelity1: float, fidelity2: float) -> float:
+    """Fidelity after swapping two Werner links."""
+    return (1 + 3 * werner_parameter(fidelity1) * werner_parameter(fidelity2)) / 4
+
+
+def chain_fidelity(link_fidelities: Iterable[float]) -> float:
+    w = 1.0
+    for fidelity in link_fidelities:
+        w *= werner_parameter(fidelity)
+    return (1 + 3 * w) / 4
+
+
+def max_hops(link_fidelity: float, threshold: float) -> float:
+    """Largest number of identical links whose swapped fidelity still meets the threshold (may be inf)."""
+    w, target = werner_parameter(link_fidelity), werner_parameter(threshold)
+    if target <= 0 or w >= 1:
+        return math.inf
+    if w <= 0 or target > 1:
+        return 0
+    return int(math.floor(math.log(target) / math.log(w) + 1e-9))
+
+
+class FidelityTable:
+    """
+    Per-pair feasibility and max-hop tables of a topology, for fidelity thresholds.
+
+    The best fidelity between two nodes comes from a Dijkstra on -log(w) per link; a pair is
+    feasible for a threshold when that fidelity meets it. The max-hop bound of a threshold uses the
+    best link of the network, so no path longer than it can be feasible. Both are computed once
+    and shared by every sweep point with the same threshold.
+
+    The hop bound of a pair is tighter: with c_min the -log(w) of the best link, a path of h hops
+    costs at least h * c_min plus the pair's shortest distance under the reduced costs
+    -log(w) - c_min, and that must stay within -log(w) of the threshold. On a bipartite network
+    (the grid) every path of a pair also has the parity of its hop distance.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self._best_w: Dict[str, Dict[str, float]] = {}
+        self._reduced: Dict[str, Dict[str, float]] = {}
+        self._tables: Dict[float, Dict[Tuple[str, str], float]] = {}
+        w_values = [werner_parameter(data.get('fidelity', 1.0)) for _, _, data in graph.edges(data=True)]
+        self.best_link_w = max(w_values, default=1.0)
+        self.min_link_cost = -math.log(self.best_link_w) if self.best_link_w > 0 else math.inf
+        self._colours = self._two_colouring()
+
+    def link_fidelity(self, u: str, v: str) -> float:
+        return self.graph[u][v].get('fidelity', 1.0)
+
+    def path_fidelity(self, path: List[str]) -> float:
+        return chain_fidelity(self.link_fidelity(u, v) for u, v in zip(path[:-1], path[1:]))
+
+    def max_hops(self, threshold: float) -> float:
+        return max_hops((3 * self.best_link_w + 1) / 4, threshold)
+
+    def _best_from(self, source: str) -> Dict[str, float]:
+        # Best Werner parameter to every node: shortest path on -log(w)
+        best = self._best_w.get(source)
+        if best is None:
+            cost = {source: 0.0}
+            pq = [(0.0, source)]
+            while pq:
+                d, u = heapq.heappop(pq)
+                if d > cost[u]:
+                    continue
+                for v in self.graph.neighbors(u):
+                    w = werner_parameter(self.link_fidelity(u, v))
+                    if w <= 0:
+                        continue
+                    nd = d - math.log(w)
+                    if nd < cost.get(v, math.inf):
+                        cost[v] = nd
+                        heapq.heappush(pq, (nd, v))
+            best = self._best_w[source] = {node: math.exp(-c) for node, c in cost.items()}
+        return best
+
+    def best_fidelity(self, src: str, dst: str) -> float:
+        w = self._best_from(src).get(dst)
+        return 0.0 if w is None else (1 + 3 * w) / 4
+
+    def _reduced_from(self, source: str) -> Dict[str, float]:
+        # Shortest distances on -log(w) - min_link_cost, which is never negative
+        reduced = self._reduced.get(source)
+        if reduced is None:
+            reduced = self._reduced[source] = {source: 0.0}
+            pq = [(0.0, source)]
+            while pq:
+                d, u = heapq.heappop(pq)
+                if d > reduced[u]:
+                    continue
+                for v in self.graph.neighbors(u):
+                    w = werner_parameter(self.link_fidelity(u, v))
+                    if w <= 0:
+                        continue
+                    nd = d + max(0.0, -math.log(w) - self.min_link_cost)
+                    if nd < reduced.get(v, math.inf):
+                        reduced[v] = nd
+                        heapq.heappush(pq, (nd, v))
+        return reduced
+
+    def _two_colouring(self) -> Optional[Dict[str, int]]:
+        # Colour of every node by BFS parity, or None if the graph has an odd cycle
+        colours: Dict[str, int] = {}
+        for start in self.graph.nodes():
+            if start in colours:
+                continue
+            colours[start] = 0
+            frontier = [start]
+            while frontier:
+                u = frontier.pop()
+                for v in self.graph.neighbors(u):
+                    if v not in colours:
+                        colours[v] = colours[u] ^ 1
+                        frontier.append(v)
+                    elif colours[v] == colours[u]:
+                        return None
+        return colours
+
+    def _pair_hops(self, src: str, dst: str, threshold: float) -> float:
+        bound = self.max_hops(threshold)
+        if math.isinf(bound):
+            return bound
+        target = werner_parameter(threshold)
+        slack = -math.log(target) - self._reduced_from(src).get(dst, math.inf)
+        bound = min(bound, int(math.floor(slack / self.min_link_cost + 1e-9)))
+        if self._colours is not None and (bound - (self._colours[src] ^ self._colours[dst])) % 2:
+            bound -= 1
+        return bound
+
+    def pair_max_hops(self, src: str, dst: str, threshold: float) -> Optional[float]:
+        """Most hops a path of the pair can have and still meet the threshold, or None if none can."""
+        table = self._tables.setdefault(threshold, {})
+        bound = table.get((src, dst))
+        if bound is None:
+            bound = self._pair_hops(src, dst, threshold) if self.best_fidelity(src, dst) >= threshold else -1
+            table[(src, dst)] = bound
+        return None if bound < 0 else bound
+
+    def precompute(self, thresholds: Iterable[float]):
+        nodes = self.graph.nodes()
+        for threshold in thresholds:
+            for src in nodes:
+                for dst in nodes:
+                    if src != dst:
+                        self.pair_max_hops(src, dst, threshold)
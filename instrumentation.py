@@ -0,0 +1,119 @@
+# instrumentation.py
+import functools
+import json
+import time
+from typing import Callable, Dict, Optional
+
+from eventlog import EventLogger
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Timers and counters for the scheduling pipeline.
+
+    Disabled by default: `timer` then hands back a shared no-op context manager and the
+    `timed` wrappers call straight through, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        entry = self.timings.get(name)
+        if entry is None:
+            entry = self.timings[name] = {"calls": 0, "total": 0.0, "max": 0.0}
+        entry["calls"] += 1
+        entry["total"] += seconds
+        if seconds > entry["max"]:
+            entry["max"] = seconds
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> Dict:
+        timings = {}
+        for name, entry in sorted(self.timings.items(), key=lambda item: -item[1]["total"]):
+            timings[name] = dict(entry, mean=entry["total"] / entry["calls"])
+        return {"timings": timings, "counters": dict(sorted(self.counters.items()))}
+
+    def export(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def log_report(self, logger: EventLogger, **tags):
+        logger.info("profile", report=self.report(), **tags)
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"{'section':<36}{'calls':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}"]
+        for name, entry in report["timings"].items():
+            lines.append(f"{name:<36}{entry['calls']:>10}{entry['total']:>12.4f}"
+                         f"{entry['mean'] * 1e3:>12.4f}{entry['max'] * 1e3:>12.4f}")
+        for name, value in report["counters"].items():
+            lines.append(f"{name:<36}{value:>10}")
+        return "\n".join(lines)
+
+
+profiler = Profiler()
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator recording the wall time of every call under `name` (default: the qualified name)."""
+    def decorator(func: Callable) -> Callable:
+        section = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add_time(section, time.perf_counter() - start)
+        return wrapper
+    return decorator
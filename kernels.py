@@ -0,0 +1,250 @@
+# kernels.py
+"""
+Array kernels for the routing and scheduling inner loops, compiled with numba when available.
+
+The kernels take integer/float arrays instead of dicts of node names and reproduce the
+pure-Python implementations exactly, tie-breaking included: node names enter only through
+their rank in string order, which is how the Python heaps compare them. Without numba the
+decorator is a no-op, so the kernels still run (slowly) and can be checked against the
+reference implementations with `python benchmark.py --verify`; the "numba" backend itself
+falls back to the pure-Python code paths (see use_kernels). tests/test_kernels.py compares the
+compiled kernels with the pure-Python code and is skipped without numba.
+"""
+import heapq
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Whether the "numba" backend runs the kernels; set it to True to run them interpreted (e.g. to verify them)
+enabled = NUMBA_AVAILABLE
+
+
+def use_kernels(backend: str) -> bool:
+    return backend == "numba" and enabled
+
+
+class KernelGraph:
+    """CSR arrays of a routing.Graph for the search kernels, with a per-edge enabled flag for Yen."""
+
+    def __init__(self, graph, size: int):
+        self.names: List[str] = list(graph.nodes())
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        rank = {name: r for r, name in enumerate(sorted(self.names))}
+        self.rank = np.array([rank[name] for name in self.names], dtype=np.int64)
+        self.row = np.array([(int(name[1:]) - 1) // size for name in self.names], dtype=np.int64)
+        self.col = np.array([(int(name[1:]) - 1) % size for name in self.names], dtype=np.int64)
+        indptr, indices, weights = [0], [], []
+        self._slots: Dict[Tuple[int, int], int] = {}
+        for u in self.names:
+            for v in graph.neighbors(u):
+                self._slots[(self.index[u], self.index[v])] = len(indices)
+                indices.append(self.index[v])
+                weights.append(graph[u][v].get('weight', 1))
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+        self.enabled = np.ones(len(indices), dtype=np.uint8)
+
+    def set_enabled(self, u: str, v: str, enabled: bool):
+        i, j = self.index[u], self.index[v]
+        for slot in (self._slots.get((i, j)), self._slots.get((j, i))):
+            if slot is not None:
+                self.enabled[slot] = enabled
+
+    def to_names(self, path: np.ndarray) -> List[str]:
+        return [self.names[i] for i in path]
+
+
+@njit(cache=True)
+def _trace(parent, source, target):
+    length = 1
+    node = target
+    while node != source:
+        node = parent[node]
+        length += 1
+    path = np.empty(length, dtype=np.int64)
+    node = target
+    for k in range(length - 1, -1, -1):
+        path[k] = node
+        node = parent[node]
+    return path
+
+
+@njit(cache=True)
+def dijkstra_path(indptr, indices, weights, enabled, rank, source, target):
+    """Same path as the Dijkstra in Requests.yen_k_shortest_paths; empty if target is unreachable."""
+    n = indptr.shape[0] - 1
+    dist = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    dist[source] = 0.0
+    pq = [(0.0, rank[source], source)]
+    while len(pq) > 0:
+        d, _, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        if u == target:
+            return _trace(parent, source, target)
+        for e in range(indptr[u], indptr[u + 1]):
+            if not enabled[e]:
+                continue
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(pq, (nd, rank[v], v))
+    return np.empty(0, dtype=np.int64)
+
+
+@njit(cache=True)
+def astar_path(indptr, indices, weights, enabled, rank, row, col, source, target):
+    """Same path as routing.astar_path with the Manhattan heuristic; empty if target is unreachable."""
+    if source == target:
+        path = np.empty(1, dtype=np.int64)
+        path[0] = source
+        return path
+    n = indptr.shape[0] - 1
+    g = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    closed = np.zeros(n, dtype=np.uint8)
+    g[source] = 0.0
+    h0 = float(abs(row[source] - row[target]) + abs(col[source] - col[target]))
+    pq = [(h0, -0.0, rank[source], source)]
+    while len(pq) > 0:
+        _, neg_g, _, u = heapq.heappop(pq)
+        if closed[u]:
+            continue
+        if u == target:
+            return _trace(parent, source, target)
+        closed[u] = 1
+        gu = -neg_g
+        for e in range(indptr[u], indptr[u + 1]):
+            if not enabled[e]:
+                continue
+            v = indices[e]
+            if closed[v]:
+                continue
+            nd = gu + weights[e]
+            if nd < g[v]:
+                g[v] = nd
+                parent[v] = u
+                h = float(abs(row[v] - row[target]) + abs(col[v] - col[target]))
+                heapq.heappush(pq, (nd + h, -nd, rank[v], v))
+    return np.empty(0, dtype=np.int64)
+
+
+@njit(cache=True)
+def rrrn_select_order(distances, b):
+    """Indices in the order of Scheduling.rrrn_selection_loop, for any b != 0."""
+    n = distances.shape[0]
+    waiting = np.zeros(n)
+    remaining = np.ones(n, dtype=np.uint8)
+    order = np.empty(n, dtype=np.int64)
+    for step in range(n):
+        max_priority = -np.inf
+        selected = -1
+        for i in range(n):
+            if remaining[i]:
+                priority = waiting[i] / (b * distances[i])
+                if priority > max_priority:
+                    max_priority = priority
+                    selected = i
+        for i in range(n):
+            if remaining[i]:
+                waiting[i] += 1
+        order[step] = selected
+        remaining[selected] = 0
+    return order
+
+
+def node_words(masks: List[int], num_nodes: int) -> np.ndarray:
+    """Node bitmasks (Requests.path_mask) as rows of uint64 words."""
+    width = max(1, (num_nodes + 63) // 64)
+    words = np.zeros((len(masks), width), dtype=np.uint64)
+    for r, mask in enumerate(masks):
+        words[r] = np.frombuffer(mask.to_bytes(width * 8, 'little'), dtype='<u8')
+    return words
+
+
+@njit(cache=True)
+def _overlaps(a, b):
+    for w in range(a.shape[0]):
+        if a[w] & b[w]:
+            return True
+    return False
+
+
+@njit(cache=True)
+def merge_timeslots(words, timeslots):
+    """
+    The timeslots new_merge_schedule assigns before compaction.
+
+    `words` holds the union of the paths of every request, and `timeslots` must be nondecreasing
+    (as in the RRRN pre-merge schedules). A request then leaves its own timeslot only when it is
+    processed, and the requests processed after it only look at earlier timeslots, so the
+    occupancy of every timeslot that is still read only grows and can be kept as an OR of words.
+    """
+    n = timeslots.shape[0]
+    merged = timeslots.copy()
+    max_timeslot = 0
+    for i in range(n):
+        max_timeslot = max(max_timeslot, timeslots[i])
+    occupied = np.zeros((max_timeslot + 1, words.shape[1]), dtype=np.uint64)
+    members = np.zeros(max_timeslot + 1, dtype=np.int64)
+    for i in range(n):
+        members[timeslots[i]] += 1
+        for w in range(words.shape[1]):
+            occupied[timeslots[i], w] |= words[i, w]
+    for i in range(n - 1, -1, -1):
+        timeslot_a = merged[i]
+        for t in range(1, timeslot_a):
+            if members[t] == 0:
+                continue
+            if not _overlaps(words[i], occupied[t]):
+                members[timeslot_a] -= 1
+                members[t] += 1
+                for w in range(words.shape[1]):
+                    occupied[t, w] |= words[i, w]
+                merged[i] = t
+                break
+    return merged
+
+
+@njit(cache=True)
+def fifo_merge_timeslots(words, first_lengths):
+    """The timeslots of fifo_merge: greedy passes with the path-length priority rule."""
+    n = words.shape[0]
+    timeslots = np.zeros(n, dtype=np.int64)
+    remaining = np.arange(n)
+    occupied = np.zeros(words.shape[1], dtype=np.uint64)
+    timeslot = 1
+    while remaining.shape[0] > 0:
+        occupied[:] = 0
+        shortest = -1
+        left = np.empty(remaining.shape[0], dtype=np.int64)
+        num_left = 0
+        for r in remaining:
+            if (shortest >= 0 and first_lengths[r] > shortest * 1.2) or _overlaps(words[r], occupied):
+                left[num_left] = r
+                num_left += 1
+                continue
+            for w in range(words.shape[1]):
+                occupied[w] |= words[r, w]
+            shortest = first_lengths[r] if shortest < 0 else min(shortest, first_lengths[r])
+            timeslots[r] = timeslot
+        remaining = left[:num_left]
+        timeslot += 1
+    return timeslots
@@ -0,0 +1,173 @@
+# partitioning.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from basicsystem import GridTopology
+from instrumentation import profiler, timed
+from scheduling import Scheduling
+
+# (row_min, row_max, col_min, col_max) of the nodes a request may use
+BoundingBox = Tuple[int, int, int, int]
+
+
+def path_bounding_box(paths: List[List[str]], size: int) -> Optional[BoundingBox]:
+    rows, cols = [], []
+    for path in paths:
+        for node in path:
+            row, col = divmod(int(node[1:]) - 1, size)
+            rows.append(row)
+            cols.append(col)
+    if not rows:
+        return None
+    return min(rows), max(rows), min(cols), max(cols)
+
+
+def overlapping_components(boxes: List[Optional[BoundingBox]]) -> List[List[int]]:
+    """
+    Group box indices into components of transitively overlapping boxes.
+
+    A sweep over the column intervals keeps the boxes whose interval is still open, so only
+    boxes that overlap in columns are compared on rows. Boxes that are None (requests without
+    paths) form components of their own.
+    """
+    parent = list(range(len(boxes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    indexed = sorted((box[2], box[3], box[0], box[1], i) for i, box in enumerate(boxes) if box is not None)
+    active: List[Tuple[int, int, int, int]] = []  # (col_max, row_min, row_max, index)
+    for col_min, col_max, row_min, row_max, i in indexed:
+        active = [entry for entry in active if entry[0] >= col_min]
+        for _, other_row_min, other_row_max, j in active:
+            if row_min <= other_row_max and other_row_min <= row_max:
+                parent[find(i)] = find(j)
+        active.append((col_max, row_min, row_max, i))
+
+    components: Dict[int, List[int]] = {}
+    for i in range(len(boxes)):
+        components.setdefault(find(i), []).append(i)
+    return list(components.values())
+
+
+_worker_scheduling: Optional[Scheduling] = None
+
+
+def _init_worker(nodes_number: int, backend: str):
+    # The topology is built once per worker process, not once per component
+    global _worker_scheduling
+    _worker_scheduling = Scheduling(GridTopology(nodes_number), backend=backend)
+
+
+def _merge_components(scheduling: Scheduling, chunk: List[Tuple[List[Tuple[str, int]], Dict]],
+                      path_selection: str) -> List[Tuple[List[Tuple[str, int]], Optional[Dict]]]:
+    results = []
+    for schedule, paths in chunk:
+        if path_selection == "k_paths":
+            results.append(scheduling.k_path_merge_schedule(schedule, paths))
+        else:
+            results.append((scheduling.new_merge_schedule(schedule, paths), None))
+    return results
+
+
+def _merge_chunk(chunk: List[Tuple[List[Tuple[str, int]], Dict]], path_selection: str, conflict_model: str):
+    # The conflict model is passed with every chunk, as it may change after the workers started
+    _worker_scheduling.conflict_model = conflict_model
+    return _merge_components(_worker_scheduling, chunk, path_selection)
+
+
+class PartitionedScheduler:
+    """
+    RRRN with merge scheduled independently per spatial component of the requests.
+
+    Requests whose path bounding boxes do not overlap cannot share a node, so they can never
+    conflict. The requests of a round are grouped into components of overlapping boxes, each
+    component keeps its part of the global RRRN order and is merged in a worker process, and
+    timeslot t of the round is the union of timeslot t of every component.
+    """
+
+    def __init__(self, scheduling: Scheduling, workers: Optional[int] = None, path_selection: str = "first_last",
+                 chunks_per_worker: int = 4):
+        self.scheduling = scheduling
+        self.requests = scheduling.requests
+        self.path_selection = path_selection
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.chunks_per_worker = chunks_per_worker
+        self._executor = None
+        if workers != 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(scheduling.topology.nodes_number,
+                                                           scheduling.requests.backend))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def components(self, requests: List[Tuple[str, str, str]], paths: Dict[str, List[List[str]]]) \
+            -> List[List[Tuple[str, str, str]]]:
+        boxes = [path_bounding_box(paths[request[0]], self.requests.size) for request in requests]
+        return [[requests[i] for i in sorted(component)] for component in overlapping_components(boxes)]
+
+    def _chunks(self, tasks: List[Tuple[List[Tuple[str, int]], Dict]]) -> List[List[Tuple[List[Tuple[str, int]], Dict]]]:
+        # Balance the components over a few chunks per worker so that small components share one task
+        num_chunks = max(1, min(len(tasks), max(self.workers, 1) * self.chunks_per_worker))
+        chunks = [[] for _ in range(num_chunks)]
+        loads = [0] * num_chunks
+        order = sorted(range(len(tasks)), key=lambda i: -len(tasks[i][0]))
+        for i in order:
+            target = loads.index(min(loads))
+            chunks[target].append(i)
+            loads[target] += len(tasks[i][0]) ** 2  # Merging is quadratic in the component size
+        return [[tasks[i] for i in chunk] for chunk in chunks if chunk]
+
+    @timed("partitioned_rrrn_schedule")
+    def rrrn_schedule(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]], k: float, c: float, a: float) \
+            -> Tuple[List[List[Tuple[str, int]]], List[List[Tuple[str, int]]]]:
+        """Same inputs and outputs as Scheduling.rrrn_schedule."""
+        b = k + c * a
+        all_schedules = []
+        all_pre_merge_schedules = []
+        for round_info in all_requests:
+            order = self.scheduling.rrrn_order(self.scheduling.admit(round_info['requests']), b)
+            all_pre_merge_schedules.append([(request[0], timeslot) for timeslot, request in enumerate(order, start=1)])
+            round_paths = self.requests.find_all_shortest_paths([(request[1], request[2]) for request in order])
+            if self.path_selection == "k_paths":
+                paths = self.requests.identify_candidate_paths(order, round_paths)
+            else:
+                paths = self.requests.identify_high_weight_paths(order, round_paths)
+
+            tasks = []
+            position = {request[0]: index for index, request in enumerate(order)}
+            for component in self.components(order, paths):
+                component.sort(key=lambda request: position[request[0]])
+                schedule = [(request[0], timeslot) for timeslot, request in enumerate(component, start=1)]
+                tasks.append((schedule, {request[0]: paths[request[0]] for request in component}))
+            profiler.count("partition_components", len(tasks))
+
+            chunks = self._chunks(tasks)
+            if self._executor is None:
+                merged_chunks = [_merge_components(self.scheduling, chunk, self.path_selection) for chunk in chunks]
+            else:
+                merged_chunks = list(self._executor.map(_merge_chunk, chunks, [self.path_selection] * len(chunks),
+                                                        [self.scheduling.conflict_model] * len(chunks)))
+
+            schedule = []
+            for merged_chunk in merged_chunks:
+                for merged, chosen_paths in merged_chunk:
+                    schedule.extend(merged)
+                    if chosen_paths:
+                        self.scheduling.chosen_paths.update(chosen_paths)
+            schedule.sort(key=lambda entry: (entry[1], position[entry[0]]))
+            all_schedules.append(schedule)
+        return all_schedules, all_pre_merge_schedules
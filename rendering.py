@@ -0,0 +1,129 @@
+# rendering.py
+"""
+Headless batch rendering of the result figures.
+
+    python rendering.py <results directory> <output directory> [--workers N] [--formats png pdf]
+
+The results directory is parsed once (text logs and .jsonl event logs, through the analysis
+scripts' process_all_files), and the figures are rendered in worker processes on the Agg
+backend. Workers import the figure templates once and receive only the aggregated data, so
+no window is ever opened and rendering scales with the number of cores.
+"""
+import argparse
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Figure templates: name -> (module, function). Every template takes `output_path`.
+TEMPLATES = {
+    "delay_subplots": ("2152", "plot_ieee_singlecolumn_subplots"),
+    "relative_delays": ("delay1111", "plot_combined_relative_delays_by_system_size"),
+    "timeslots_bar": ("con2115", "plot_ieee_singlecolumn_bar_chart"),
+    "timeslots_combined": ("data1111", "plot_combined_avg_timeslots"),
+    "fidelity_timeslots": ("data2", "plot_fidelity_timeslots"),
+    "first_round_schedule": ("scheduling", "Scheduling.plot_first_round_schedule"),
+}
+
+# (template, keyword arguments, output path without extension)
+RenderJob = Tuple[str, Dict, str]
+
+
+def finish_figure(output_path: Union[None, str, Sequence[str]] = None, dpi: int = 300):
+    """Show the current figure interactively, or save it to one or more paths and close it."""
+    import matplotlib.pyplot as plt
+
+    if output_path is None:
+        plt.show()
+        return
+    paths = [output_path] if isinstance(output_path, str) else list(output_path)
+    for path in paths:
+        plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    plt.close()
+
+
+def use_headless_backend():
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+
+def _resolve(template: str):
+    module_name, attribute = TEMPLATES[template]
+    target = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        target = getattr(target, name)
+    return target
+
+
+def _init_worker():
+    use_headless_backend()
+    # Import every template module up front so that jobs only pay for drawing
+    for template in TEMPLATES:
+        _resolve(template)
+
+
+def render_job(job: RenderJob, formats: Sequence[str] = ("png", "pdf")) -> List[str]:
+    template, kwargs, output_base = job
+    output_paths = [f"{output_base}.{fmt}" for fmt in formats]
+    _resolve(template)(**kwargs, output_path=output_paths)
+    return output_paths
+
+
+def render_all(jobs: List[RenderJob], formats: Sequence[str] = ("png", "pdf"),
+               workers: Optional[int] = None) -> List[str]:
+    """Render the jobs in `workers` processes (in this process when workers == 0) and return the files written."""
+    outputs = []
+    if workers == 0:
+        _init_worker()
+        for job in jobs:
+            outputs.extend(render_job(job, formats))
+        return outputs
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for paths in executor.map(render_job, jobs, [formats] * len(jobs)):
+            outputs.extend(paths)
+    return outputs
+
+
+def jobs_from_results(directory: str, output_dir: str) -> List[RenderJob]:
+    """Aggregate the logs in `directory` once and describe one job per figure."""
+    delays_module = importlib.import_module("2152")
+    timeslots_module = importlib.import_module("con2115")
+    avg_delays, all_system_sizes, all_requests_numbers = delays_module.process_all_files(directory)
+    avg_timeslots = timeslots_module.process_all_files(directory)
+
+    jobs = []
+    if all_system_sizes:
+        jobs.append(("delay_subplots", {"avg_delays": avg_delays, "all_system_sizes": all_system_sizes,
+                                        "requests_numbers": all_requests_numbers},
+                     os.path.join(output_dir, "delays")))
+        for rn in all_requests_numbers:
+            jobs.append(("delay_subplots", {"avg_delays": avg_delays, "all_system_sizes": all_system_sizes,
+                                            "requests_numbers": [rn], "fig_title": f"Requests = {rn}"},
+                         os.path.join(output_dir, f"delays_{rn}rs")))
+        jobs.append(("relative_delays", {"avg_delays": avg_delays, "all_system_sizes": all_system_sizes,
+                                         "all_requests_numbers": all_requests_numbers},
+                     os.path.join(output_dir, "relative_delays")))
+    if all(avg_timeslots[algo] for algo in avg_timeslots):
+        jobs.append(("timeslots_bar", {"avg_timeslots": avg_timeslots}, os.path.join(output_dir, "timeslots")))
+        jobs.append(("timeslots_combined", {"avg_timeslots": avg_timeslots},
+                     os.path.join(output_dir, "timeslots_combined")))
+    return jobs
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Render result figures without a display")
+    parser.add_argument("directory", help="directory with .txt/.jsonl result logs")
+    parser.add_argument("output_dir", help="directory for the rendered figures")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 renders in-process)")
+    parser.add_argument("--formats", nargs="+", default=["png", "pdf"])
+    args = parser.parse_args(argv)
+
+    use_headless_backend()
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = jobs_from_results(args.directory, args.output_dir)
+    for path in render_all(jobs, args.formats, args.workers):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,42 @@
 # requests.py
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from basicsystem import GridTopology
-import networkx as nx
 import heapq
+import kernels
+from fidelity import FidelityTable
+from instrumentation import profiler, timed
+from routing import CSRGraph, Graph, ShortestPathTree, astar_path
 
 class Requests:
-    def __init__(self, topology: GridTopology):
+    def __init__(self, topology: GridTopology, spur_search: str = "astar", backend: str = "python"):
+        # spur_search: "astar" (Manhattan-guided, stops at the target) or "dijkstra" (full expansion)
+        # backend: "python", "scipy" to compute the first path of all requests in one batch csgraph call,
+        # or "numba" to run the spur searches and merge loops as compiled kernels (see kernels.py)
         self.topology = topology
+        self.spur_search = spur_search
+        self.backend = backend
+        self._csr = None
+        self._kernel_graph = None
         self.topology.build()
         self.size = topology.size
+        self._graph = None
+        self._path_cache: Dict[Tuple[str, str], List[List[str]]] = {}
+        self.path_cache_generation = 0  # Bumped whenever cached paths are loaded or dropped
+        self._trees: Dict[str, ShortestPathTree] = {}
+        self._mask_cache: Dict[Tuple[str, ...], int] = {}
+        # Minimum end-to-end fidelity of the paths handed to the schedulers; None disables the constraint
+        self.fidelity_threshold: Optional[float] = None
+        self._fidelity_table = None
+        self._fidelity_cache: Dict[Tuple[str, str, float], List[List[str]]] = {}
+        # Extra weight per unit of load for load-aware routing; 0 keeps every route on unit weights
+        self.congestion = 0.0
+        self.node_load: Dict[str, int] = {}
+        self.link_load: Dict[Tuple[str, str], int] = {}
+        self._load_graph = None
+        self._load_trees: Dict[str, Tuple[ShortestPathTree, int]] = {}  # source -> (tree, weight log position)
+        self._weight_log: List[Tuple[str, str, float]] = []  # (u, v, old weight) of every reweighted edge
+        self.K = 10  # Increase K to find more paths
 
     def generate_random_requests(self, num_requests: int) -> List[Tuple[str, str]]:
         nodes = self.topology.nl
@@ -19,73 +46,173 @@ class Requests:
             requests.append((node1.name, node2.name))
         return requests
 
-    def yen_k_shortest_paths(self, graph: nx.Graph, source: str, target: str, K: int) -> List[List[str]]:
-        def dijkstra(graph: nx.Graph, source: str) -> Dict[str, Tuple[float, List[str]]]:
-            dist = {node: (float('inf'), []) for node in graph.nodes()}
-            dist[source] = (0, [source])
+    @timed("yen_k_shortest_paths")
+    def yen_k_shortest_paths(self, graph: Graph, source: str, target: str, K: int,
+                             first_path: List[str] = None, max_hops: float = float('inf'),
+                             spur_memo: Optional[Dict] = None) -> List[List[str]]:
+        """
+        `spur_memo` shares spur searches between the requests of a round (see find_all_shortest_paths).
+        A spur search only depends on the spur node and the edges removed for it, so a full Dijkstra
+        tree is memoized under (spur node, removed edges) and serves every target; the searches that
+        stop at their target (A*, kernels) are memoized with the target added to the key.
+        """
+        def dijkstra(graph: Graph, source: str) -> Dict[str, Optional[str]]:
+            # Shortest-path tree from source as parent pointers
+            if profiler.enabled:
+                profiler.count("dijkstra_invocations")
+            dist = {source: 0}
+            parent = {source: None}
             pq = [(0, source)]
             while pq:
                 (d, u) = heapq.heappop(pq)
-                if d > dist[u][0]:
+                if d > dist[u]:
                     continue
                 for v in graph.neighbors(u):
                     weight = graph[u][v].get('weight', 1)
-                    if dist[u][0] + weight < dist[v][0]:
-                        dist[v] = (dist[u][0] + weight, dist[u][1] + [v])
-                        heapq.heappush(pq, (dist[v][0], v))
-            return dist
+                    if d + weight < dist.get(v, float('inf')):
+                        dist[v] = d + weight
+                        parent[v] = u
+                        heapq.heappush(pq, (dist[v], v))
+            return parent
 
-        def remove_edge(graph: nx.Graph, u: str, v: str):
+        def tree_path(parent: Dict[str, Optional[str]], start: str) -> List[str]:
+            if target not in parent:
+                return []
+            path = [target]
+            while path[-1] != start:
+                path.append(parent[path[-1]])
+            path.reverse()
+            return path
+
+        kernel_graph = self._kernel_graph_for(graph) if kernels.use_kernels(self.backend) else None
+
+        def remove_edge(graph: Graph, u: str, v: str):
             if graph.has_edge(u, v):
                 graph.remove_edge(u, v)
+            if kernel_graph is not None:
+                kernel_graph.set_enabled(u, v, False)
 
-        def restore_edge(graph: nx.Graph, u: str, v: str, weight: float):
-            graph.add_edge(u, v, weight=weight)
+        def restore_edge(graph: Graph, u: str, v: str, data: Dict):
+            # Put back every attribute (weight, fidelity), not just a unit weight
+            graph.add_edge(u, v, **data)
+            if kernel_graph is not None:
+                kernel_graph.set_enabled(u, v, True)
 
-        def path_weight(graph: nx.Graph, path: List[str]) -> float:
+        def path_weight(graph: Graph, path: List[str]) -> float:
             return sum(graph[u][v].get('weight', 1) for u, v in zip(path[:-1], path[1:]))
 
-        dist = dijkstra(graph, source)
-        if target not in dist or dist[target][0] == float('inf'):
+        if kernel_graph is not None:
+            kg, t = kernel_graph, kernel_graph.index[target]
+            if self.spur_search == "astar":
+                def shortest_path(graph: Graph, start: str) -> List[str]:
+                    return kg.to_names(kernels.astar_path(kg.indptr, kg.indices, kg.weights, kg.enabled, kg.rank,
+                                                          kg.row, kg.col, kg.index[start], t))
+            else:
+                def shortest_path(graph: Graph, start: str) -> List[str]:
+                    return kg.to_names(kernels.dijkstra_path(kg.indptr, kg.indices, kg.weights, kg.enabled, kg.rank,
+                                                             kg.index[start], t))
+        elif self.spur_search == "astar":
+            heuristic = self.manhattan_heuristic(target)
+
+            def shortest_path(graph: Graph, start: str) -> List[str]:
+                return astar_path(graph, start, target, heuristic)
+        else:
+            def shortest_path(graph: Graph, start: str) -> List[str]:
+                return tree_path(dijkstra(graph, start), start)
+
+        full_trees = kernel_graph is None and self.spur_search != "astar"
+
+        def spur_path(start: str, removed: frozenset) -> List[str]:
+            if spur_memo is None:
+                return shortest_path(graph, start)
+            key = (start, removed) if full_trees else (start, target, removed)
+            result = spur_memo.get(key)
+            if result is None:
+                profiler.count("spur_memo_misses")
+                result = spur_memo[key] = dijkstra(graph, start) if full_trees else shortest_path(graph, start)
+            else:
+                profiler.count("spur_memo_hits")
+            return tree_path(result, start) if full_trees else result
+
+        if first_path is None:
+            # Trees from the source are shared by every request of the round that starts there
+            first_path = spur_path(source, frozenset())
+        if not first_path or len(first_path) - 1 > max_hops:
             return []
 
-        A = [dist[target][1]]
+        # Candidates are a heap of (weight, insertion number, path): the insertion number breaks ties
+        # in the order a stable sort of a candidate list would, and in_B replaces scanning the list
+        A = [first_path]
         B = []
+        in_B = set()
+        pushed = 0
+        # Prefix trie of the accepted paths: node -> {next node: subtrie}
+        trie: Dict[str, Dict] = {}
+
+        def add_to_trie(path: List[str]):
+            node = trie.setdefault(path[0], {})
+            for v in path[1:]:
+                node = node.setdefault(v, {})
+
+        add_to_trie(first_path)
 
         for k in range(1, K):
+            prefix = trie[A[-1][0]]
             for i in range(len(A[-1]) - 1):
                 spur_node = A[-1][i]
                 root_path = A[-1][:i + 1]
+                if i > 0:
+                    prefix = prefix[root_path[-1]]
 
+                # The next hops of every accepted path sharing root_path are the children of its trie node
                 removed_edges = []
-                for path in A:
-                    if len(path) > i + 1 and path[:i + 1] == root_path:
-                        u = path[i]
-                        v = path[i + 1]
-                        remove_edge(graph, u, v)
-                        removed_edges.append((u, v, 1))
-
-                spur_path_dist = dijkstra(graph, spur_node)
-                if target in spur_path_dist and spur_path_dist[target][0] < float('inf'):
-                    total_path = root_path[:-1] + spur_path_dist[target][1]
-                    if total_path not in B:
-                        B.append(total_path)
-
-                for u, v, weight in removed_edges:
-                    restore_edge(graph, u, v, weight)
+                removed_key = set()
+                for v in prefix:
+                    u = spur_node
+                    if graph.has_edge(u, v):
+                        removed_edges.append((u, v, dict(graph[u][v])))
+                    remove_edge(graph, u, v)
+                    removed_key.add((u, v) if u < v else (v, u))
+
+                path_from_spur = spur_path(spur_node, frozenset(removed_key))
+
+                for u, v, data in removed_edges:
+                    restore_edge(graph, u, v, data)
+
+                if path_from_spur:
+                    total_path = root_path[:-1] + path_from_spur
+                    key = tuple(total_path)
+                    if key not in in_B:
+                        in_B.add(key)
+                        heapq.heappush(B, (path_weight(graph, total_path), pushed, total_path))
+                        pushed += 1
 
             if not B:
                 break
 
-            B.sort(key=lambda x: path_weight(graph, x))
-            A.append(B.pop(0))
+            # Paths come out by nondecreasing weight, i.e. hop count on the unit-weight grid
+            if len(B[0][2]) - 1 > max_hops:
+                break
+            _, _, path = heapq.heappop(B)
+            in_B.discard(tuple(path))
+            A.append(path)
+            add_to_trie(path)
 
         return A
 
-    def find_all_shortest_paths(self, requests: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[List[str]]]:
+    def _kernel_graph_for(self, graph: Graph) -> "kernels.KernelGraph":
+        # The arrays of the shared routing graph are built once; other graphs get their own
+        if graph is not self._graph:
+            return kernels.KernelGraph(graph, self.size)
+        if self._kernel_graph is None:
+            self._kernel_graph = kernels.KernelGraph(graph, self.size)
+        return self._kernel_graph
+
+    @timed("graph_construction")
+    def build_graph(self) -> Graph:
         nodes = self.topology.nl
         links = self.topology.ll
-        G = nx.Graph()
+        G = Graph()
 
         for node in nodes:
             G.add_node(node.name)
@@ -95,16 +222,219 @@ class Requests:
                 if link in node.qchannels:
                     for other_node in nodes:
                         if other_node != node and link in other_node.qchannels:
-                            G.add_edge(node.name, other_node.name, weight=1)
+                            G.add_edge(node.name, other_node.name, weight=1, fidelity=link.fidelity)
                             break
+        return G
+
+    @timed("find_all_shortest_paths")
+    def find_all_shortest_paths(self, requests: List[Tuple[str, str]],
+                                fidelity_threshold: Optional[float] = None) -> Dict[Tuple[str, str], List[List[str]]]:
+        # The graph and the K paths of each (src, dst) pair are built once and reused across calls
+        if fidelity_threshold is None:
+            fidelity_threshold = self.fidelity_threshold
+        if fidelity_threshold is not None:
+            return self._find_fidelity_paths(requests, fidelity_threshold)
+        if self._graph is None:
+            self._graph = self.build_graph()
+        G = self._graph
+        if self.congestion:
+            return self._find_load_aware_paths(requests)
+
+        first_paths = {}
+        if self.backend == "scipy":
+            if self._csr is None:
+                self._csr = CSRGraph(G)
+            missing = list({pair for pair in requests if pair not in self._path_cache})
+            first_paths = self._csr.batch_shortest_paths(missing)
 
         all_shortest_paths = {}
-        K = 10  # Increase K to find more paths
+        spur_memo = {}  # Spur searches shared by the requests of this call, see yen_k_shortest_paths
         for (src, dst) in requests:
-            k_shortest_paths = self.yen_k_shortest_paths(G, src, dst, K)
+            k_shortest_paths = self._path_cache.get((src, dst))
+            if k_shortest_paths is None:
+                profiler.count("path_cache_misses")
+                k_shortest_paths = self.yen_k_shortest_paths(G, src, dst, self.K, first_paths.get((src, dst)),
+                                                             spur_memo=spur_memo)
+                self._path_cache[(src, dst)] = k_shortest_paths
+            else:
+                profiler.count("path_cache_hits")
             all_shortest_paths[(src, dst)] = k_shortest_paths
         return all_shortest_paths
 
+    def _find_load_aware_paths(self, requests: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[List[str]]]:
+        """
+        K paths whose first path is the cheapest under the current loads, assigned in request order.
+
+        The first path of each pair is replaced by the shortest path on the load-weighted graph,
+        the other paths are the cached unit-weight Yen paths. The first and last path of every
+        request (the paths new_merge_schedule reserves) then add to the loads, so later requests
+        avoid the corridors already in use. Loads accumulate until reset_loads.
+        """
+        yen_paths = {}
+        spur_memo = {}
+        for pair in dict.fromkeys(requests):
+            paths = self._path_cache.get(pair)
+            if paths is None:
+                paths = self._path_cache[pair] = self.yen_k_shortest_paths(self._graph, pair[0], pair[1], self.K,
+                                                                          spur_memo=spur_memo)
+            yen_paths[pair] = paths
+
+        all_paths = {}
+        for pair in requests:
+            paths = all_paths.get(pair)
+            if paths is None:
+                first = self._load_aware_path(*pair) if yen_paths[pair] else []
+                others = [path for path in yen_paths[pair] if path != first][:self.K - 1]
+                # The redundant (last) path is the alternative that is cheapest under the current loads
+                others.sort(key=self._load_cost, reverse=True)
+                paths = all_paths[pair] = [first] + others if first else []
+            if paths:
+                self.assign_load(paths[0])
+                if len(paths) > 1:
+                    self.assign_load(paths[-1])
+        return all_paths
+
+    def _load_aware_path(self, src: str, dst: str) -> List[str]:
+        if self._load_graph is None:
+            self._load_graph = self.build_graph()
+        entry = self._load_trees.get(src)
+        if entry is None:
+            tree = ShortestPathTree(self._load_graph, src)
+        else:
+            tree, position = entry
+            if position < len(self._weight_log):
+                # Repair only what changed since this tree was last used, oldest weight first per edge
+                changed = {}
+                for u, v, old in self._weight_log[position:]:
+                    changed.setdefault((u, v), old)
+                tree.reweight((u, v, old) for (u, v), old in changed.items())
+        self._load_trees[src] = (tree, len(self._weight_log))
+        return tree.path_to(dst)
+
+    def _load_cost(self, path: List[str]) -> float:
+        return sum(self._load_graph[u][v].get('weight', 1) for u, v in zip(path[:-1], path[1:]))
+
+    def _load_weight(self, u: str, v: str) -> float:
+        link = (u, v) if u < v else (v, u)
+        return 1 + self.congestion * (self.link_load.get(link, 0) + (self.node_load.get(u, 0) + self.node_load.get(v, 0)) / 2)
+
+    def _set_load_weight(self, u: str, v: str, weight: float):
+        data = self._load_graph[u][v]
+        if data.get('weight', 1) != weight:
+            self._weight_log.append(((u, v) if u < v else (v, u)) + (data.get('weight', 1),))
+            data['weight'] = weight
+
+    def assign_load(self, path: List[str]):
+        """Count a path in the node and link loads and reweight the edges around it."""
+        if self._load_graph is None:
+            self._load_graph = self.build_graph()
+        for node in path:
+            self.node_load[node] = self.node_load.get(node, 0) + 1
+        for u, v in zip(path[:-1], path[1:]):
+            link = (u, v) if u < v else (v, u)
+            self.link_load[link] = self.link_load.get(link, 0) + 1
+        touched = {((u, v) if u < v else (v, u)) for u in path for v in self._load_graph.neighbors(u)}
+        for u, v in touched:
+            self._set_load_weight(u, v, self._load_weight(u, v))
+
+    def reset_loads(self):
+        """Clear the loads (e.g. at the start of a round), restoring unit weights on the loaded edges."""
+        if self._load_graph is not None:
+            for u, v, data in list(self._load_graph.edges(data=True)):
+                if data.get('weight', 1) != 1:
+                    self._set_load_weight(u, v, 1)
+        self.node_load.clear()
+        self.link_load.clear()
+        if len(self._weight_log) > 100000:
+            self._weight_log.clear()
+            self._load_trees.clear()
+
+    def fidelity_table(self) -> FidelityTable:
+        if self._fidelity_table is None:
+            if self._graph is None:
+                self._graph = self.build_graph()
+            self._fidelity_table = FidelityTable(self._graph)
+        return self._fidelity_table
+
+    def is_feasible(self, src: str, dst: str, fidelity_threshold: Optional[float] = None) -> bool:
+        """Whether the pair has a path meeting the threshold among its K paths (always, without one)."""
+        if fidelity_threshold is None:
+            fidelity_threshold = self.fidelity_threshold
+        if fidelity_threshold is None:
+            return True
+        # Same test as routing uses, so an admitted request always has paths; the result stays cached
+        return bool(self._find_fidelity_paths([(src, dst)], fidelity_threshold)[(src, dst)])
+
+    def _find_fidelity_paths(self, requests: List[Tuple[str, str]],
+                             fidelity_threshold: float) -> Dict[Tuple[str, str], List[List[str]]]:
+        """
+        The K paths of each pair that meet the fidelity threshold; infeasible pairs get no paths.
+
+        Pairs that the max-hop table rules out are never searched, and Yen stops at the hop bound,
+        so a sweep over thresholds only computes the paths each threshold can use.
+        """
+        table = self.fidelity_table()
+        all_paths = {}
+        spur_memo = {}
+        for (src, dst) in requests:
+            key = (src, dst, fidelity_threshold)
+            paths = self._fidelity_cache.get(key)
+            if paths is None:
+                profiler.count("fidelity_cache_misses")
+                bound = table.pair_max_hops(src, dst, fidelity_threshold)
+                if bound is None:
+                    candidates = []
+                elif (src, dst) in self._path_cache:
+                    candidates = self._path_cache[(src, dst)]
+                else:
+                    candidates = self.yen_k_shortest_paths(self._graph, src, dst, self.K, max_hops=bound,
+                                                           spur_memo=spur_memo)
+                paths = [path for path in candidates if table.path_fidelity(path) >= fidelity_threshold]
+                self._fidelity_cache[key] = paths
+            else:
+                profiler.count("fidelity_cache_hits")
+            all_paths[(src, dst)] = paths
+        return all_paths
+
+    def export_path_cache(self) -> Dict[Tuple[str, str], List[List[str]]]:
+        return dict(self._path_cache)
+
+    def load_path_cache(self, paths: Dict[Tuple[str, str], List[List[str]]]):
+        # Seed the cache with K paths computed elsewhere (e.g. shipped to a worker process)
+        self._path_cache.update(paths)
+        self.path_cache_generation += 1
+
+    def clear_path_cache(self):
+        self.path_cache_generation += 1
+        self._graph = None
+        self._csr = None
+        self._kernel_graph = None
+        self._path_cache.clear()
+        self._trees.clear()
+        self._fidelity_table = None
+        self._fidelity_cache.clear()
+        self._load_graph = None
+        self._load_trees.clear()
+        self._weight_log.clear()
+        self.node_load.clear()
+        self.link_load.clear()
+
+    def reroute(self, src: str, dst: str, failed_nodes: List[str]) -> List[str]:
+        """
+        Shortest path from src to dst avoiding failed_nodes.
+
+        One shortest-path tree is kept per source and repaired incrementally as the failed
+        set changes between calls, so consecutive failure sets only cost their difference.
+        """
+        if self._graph is None:
+            self._graph = self.build_graph()
+        tree = self._trees.get(src)
+        if tree is None:
+            tree = self._trees[src] = ShortestPathTree(self._graph, src, failed_nodes)
+        else:
+            tree.set_blocked(failed_nodes)
+        return tree.path_to(dst)
+
     def identify_high_weight_paths(self, requests: List[Tuple[str, str, str]], paths: Dict[Tuple[str, str], List[List[str]]]) -> Dict[str, Tuple[List[str], List[str]]]:
         high_weight_paths = {}
         for request_id, src, dst in requests:
@@ -118,6 +448,21 @@ class Requests:
                 high_weight_paths[request_id] = ([], [])
         return high_weight_paths
 
+    def identify_candidate_paths(self, requests: List[Tuple[str, str, str]], paths: Dict[Tuple[str, str], List[List[str]]]) -> Dict[str, List[List[str]]]:
+        # Keep all K paths of each request, shortest first, instead of only the first and the last
+        return {request_id: list(paths.get((src, dst), [])) for request_id, src, dst in requests}
+
+    def path_mask(self, path: List[str]) -> int:
+        """Bitmask of the nodes on a path, bit i standing for node V(i+1). Masks are cached per path."""
+        key = tuple(path)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = 0
+            for node in path:
+                mask |= 1 << (int(node[1:]) - 1)
+            self._mask_cache[key] = mask
+        return mask
+
     def display_high_weight_paths(self, high_weight_paths: Dict[str, Tuple[List[str], List[str]]]):
         print("High weight paths for each request:")
         for request_id, (first_path, last_path) in high_weight_paths.items():
@@ -140,6 +485,16 @@ class Requests:
             })
         return all_requests
 
+    def manhattan_heuristic(self, target: str):
+        # Consistent A* heuristic on the grid as long as every edge weight is at least 1
+        row_t, col_t = divmod(int(target[1:]) - 1, self.size)
+        size = self.size
+
+        def heuristic(node: str) -> int:
+            row, col = divmod(int(node[1:]) - 1, size)
+            return abs(row - row_t) + abs(col - col_t)
+        return heuristic
+
     def calculate_manhattan_distance(self, node1, node2):
         index1 = int(node1.name[1:]) - 1
         index2 = int(node2.name[1:]) - 1
@@ -0,0 +1,331 @@
+# routing.py
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from instrumentation import profiler
+
+
+class Graph:
+    """
+    Minimal undirected graph exposing the subset of the networkx.Graph API used for routing.
+
+    Adjacency is a dict of dicts of edge attributes, as in networkx, so the routing functions
+    accept either; using this one keeps networkx out of the import path of compute workers.
+    """
+
+    def __init__(self):
+        self._adj: Dict[str, Dict[str, Dict]] = {}
+
+    def add_node(self, node: str):
+        self._adj.setdefault(node, {})
+
+    def add_edge(self, u: str, v: str, **attr):
+        data = self._adj.setdefault(u, {}).get(v)
+        if data is None:
+            data = {}
+            self._adj[u][v] = data
+            self._adj.setdefault(v, {})[u] = data
+        data.update(attr)
+
+    def remove_edge(self, u: str, v: str):
+        del self._adj[u][v]
+        if u != v:
+            del self._adj[v][u]
+
+    def has_edge(self, u: str, v: str) -> bool:
+        return u in self._adj and v in self._adj[u]
+
+    def neighbors(self, node: str) -> Iterator[str]:
+        return iter(self._adj[node])
+
+    def nodes(self) -> List[str]:
+        return list(self._adj)
+
+    def edges(self, data: bool = False) -> Iterator:
+        seen = set()
+        for u, neighbours in self._adj.items():
+            for v, attr in neighbours.items():
+                if v in seen:
+                    continue
+                yield (u, v, attr) if data else (u, v)
+            seen.add(u)
+
+    def number_of_nodes(self) -> int:
+        return len(self._adj)
+
+    def __getitem__(self, node: str) -> Dict[str, Dict]:
+        return self._adj[node]
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._adj
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._adj)
+
+    def __len__(self) -> int:
+        return len(self._adj)
+
+
+class ShortestPathTree:
+    """
+    Single-source shortest-path tree over a graph that can be repaired in place.
+
+    Blocking nodes (failures) only invalidates the subtrees hanging below them, and only
+    those nodes are searched again; unblocking seeds a search from the restored nodes.
+    Weight changes are repaired the same way (see reweight). The work done is therefore
+    proportional to the part of the tree that changed rather than to the size of the network.
+    """
+
+    def __init__(self, graph: Graph, source: str, blocked: Iterable[str] = ()):
+        self.graph = graph
+        self.source = source
+        self.blocked: Set[str] = set(blocked)
+        self.dist: Dict[str, float] = {}
+        self.parent: Dict[str, Optional[str]] = {}
+        self.children: Dict[str, Set[str]] = {}
+        if source not in self.blocked:
+            self.dist[source] = 0
+            self.parent[source] = None
+            self._propagate([source])
+
+    def distance(self, node: str) -> float:
+        return self.dist.get(node, float('inf'))
+
+    def path_to(self, target: str) -> List[str]:
+        if target not in self.dist:
+            return []
+        path = [target]
+        while path[-1] != self.source:
+            path.append(self.parent[path[-1]])
+        path.reverse()
+        return path
+
+    def set_blocked(self, nodes: Iterable[str]):
+        """Make `nodes` the blocked set, repairing only the difference to the current one."""
+        nodes = set(nodes)
+        restored = self.blocked - nodes
+        failed = nodes - self.blocked
+        if failed:
+            self.block(failed)
+        if restored:
+            self.unblock(restored)
+
+    def block(self, nodes: Iterable[str]):
+        nodes = [node for node in nodes if node not in self.blocked]
+        self.blocked.update(nodes)
+        affected = self._subtree([node for node in nodes if node in self.dist])
+        self._repair(affected)
+
+    def unblock(self, nodes: Iterable[str]):
+        seeds = []
+        for node in nodes:
+            if node not in self.blocked:
+                continue
+            self.blocked.discard(node)
+            if node == self.source:
+                self.dist[node] = 0
+                self.parent[node] = None
+                seeds.append(node)
+            elif self._attach(node):
+                seeds.append(node)
+        self._propagate(seeds)
+
+    def reweight(self, edges: Iterable[Tuple[str, str, float]]):
+        """
+        Repair the tree after the weights of `edges`, given as (u, v, old weight), changed in the graph.
+
+        A heavier tree edge invalidates the subtree below it; a lighter edge is relaxed and
+        any improvement propagated from there.
+        """
+        affected = set()
+        lighter = []
+        for u, v, old in edges:
+            new = self._weight(u, v)
+            if new > old:
+                for a, b in ((u, v), (v, u)):
+                    if self.parent.get(b) == a:
+                        affected |= self._subtree([b])
+            elif new < old:
+                lighter.append((u, v, new))
+        if affected:
+            self._repair(affected)
+        seeds = []
+        for u, v, weight in lighter:
+            for a, b in ((u, v), (v, u)):
+                if a in self.dist and b not in self.blocked and self.dist[a] + weight < self.distance(b):
+                    self.dist[b] = self.dist[a] + weight
+                    self._set_parent(b, a)
+                    seeds.append(b)
+        self._propagate(seeds)
+
+    def _weight(self, u: str, v: str) -> float:
+        return self.graph[u][v].get('weight', 1)
+
+    def _set_parent(self, node: str, parent: Optional[str]):
+        old = self.parent.get(node)
+        if old is not None:
+            self.children[old].discard(node)
+        self.parent[node] = parent
+        if parent is not None:
+            self.children.setdefault(parent, set()).add(node)
+
+    def _subtree(self, roots: List[str]) -> Set[str]:
+        subtree = set()
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            if node in subtree:
+                continue
+            subtree.add(node)
+            stack.extend(self.children.get(node, ()))
+        return subtree
+
+    def _attach(self, node: str) -> bool:
+        # Hang `node` below its best reachable neighbour, if any
+        best, best_parent = float('inf'), None
+        for u in self.graph.neighbors(node):
+            if u in self.blocked or u not in self.dist:
+                continue
+            d = self.dist[u] + self._weight(u, node)
+            if d < best:
+                best, best_parent = d, u
+        if best_parent is None:
+            return False
+        self.dist[node] = best
+        self._set_parent(node, best_parent)
+        return True
+
+    def _repair(self, affected: Set[str]):
+        if profiler.enabled:
+            profiler.count("spt_repaired_nodes", len(affected))
+        for node in affected:
+            self.dist.pop(node, None)
+            self._set_parent(node, None)
+            self.parent.pop(node, None)
+        seeds = [node for node in affected if node not in self.blocked and self._attach(node)]
+        self._propagate(seeds)
+
+    def _propagate(self, seeds: List[str]):
+        pq = [(self.dist[node], node) for node in seeds]
+        heapq.heapify(pq)
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > self.dist.get(u, float('inf')):
+                continue
+            for v in self.graph.neighbors(u):
+                if v in self.blocked:
+                    continue
+                nd = d + self._weight(u, v)
+                if nd < self.dist.get(v, float('inf')):
+                    self.dist[v] = nd
+                    self._set_parent(v, u)
+                    heapq.heappush(pq, (nd, v))
+
+
+def astar_path(graph: Graph, source: str, target: str, heuristic: Callable[[str], float]) -> List[str]:
+    """
+    Goal-directed shortest path from source to target, or [] if target is unreachable.
+
+    `heuristic` must be consistent (e.g. the Manhattan distance on the grid with weights >= 1).
+    The search stops as soon as the target is settled; among equal estimates deeper nodes are
+    expanded first, which keeps a unit-weight grid search inside the corridor of the path.
+    """
+    if source == target:
+        return [source]
+    g = {source: 0}
+    parent = {source: None}
+    closed = set()
+    pq = [(heuristic(source), 0, source)]
+    found = False
+    while pq:
+        _, neg_g, u = heapq.heappop(pq)
+        if u in closed:
+            continue
+        if u == target:
+            found = True
+            break
+        closed.add(u)
+        gu = -neg_g
+        for v in graph.neighbors(u):
+            if v in closed:
+                continue
+            nd = gu + graph[u][v].get('weight', 1)
+            if nd < g.get(v, float('inf')):
+                g[v] = nd
+                parent[v] = u
+                heapq.heappush(pq, (nd + heuristic(v), -nd, v))
+    if profiler.enabled:
+        profiler.count("astar_invocations")
+        profiler.count("astar_expanded_nodes", len(closed))
+    if not found:
+        return []
+    path = [target]
+    while path[-1] != source:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+
+class CSRGraph:
+    """
+    The topology as a scipy.sparse CSR matrix, for batch searches in compiled code.
+
+    scipy is imported here rather than at module level so that it stays an optional dependency
+    of the "scipy" routing backend.
+    """
+
+    def __init__(self, graph: Graph):
+        from scipy.sparse import csr_matrix
+
+        self.names: List[str] = list(graph.nodes())
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        rows, cols, weights = [], [], []
+        for u, v, data in graph.edges(data=True):
+            weight = data.get('weight', 1)
+            for a, b in ((u, v), (v, u)):
+                rows.append(self.index[a])
+                cols.append(self.index[b])
+                weights.append(weight)
+        n = len(self.names)
+        self.matrix = csr_matrix((weights, (rows, cols)), shape=(n, n))
+
+    def batch_shortest_paths(self, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[str]]:
+        """
+        Shortest path of every (src, dst) pair, with one multi-source Dijkstra over the distinct sources.
+
+        The csgraph predecessors break ties between equal-cost paths in index order, so the paths
+        are instead walked back from the distances: the predecessor of a node is its neighbour on a
+        shortest path with the smallest (distance, name), the one the heap of the Python Dijkstra
+        in Requests.yen_k_shortest_paths settles first. Both backends then agree path for path.
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        sources = sorted({src for src, _ in pairs}, key=self.index.__getitem__)
+        if not sources:
+            return {}
+        row_of = {src: row for row, src in enumerate(sources)}
+        if profiler.enabled:
+            profiler.count("csgraph_batch_calls")
+            profiler.count("csgraph_sources", len(sources))
+        distances = dijkstra(self.matrix, directed=True, indices=[self.index[src] for src in sources])
+        indptr, indices, weights = self.matrix.indptr, self.matrix.indices, self.matrix.data
+        paths = {}
+        for src, dst in pairs:
+            dist = distances[row_of[src]]
+            s, node = self.index[src], self.index[dst]
+            if dist[node] == float('inf'):
+                paths[(src, dst)] = []
+                continue
+            path = [node]
+            while node != s:
+                best = None
+                for j in range(indptr[node], indptr[node + 1]):
+                    u = indices[j]
+                    # The matrix is symmetric, so row `node` lists the edges into it as well
+                    if abs(dist[u] + weights[j] - dist[node]) <= 1e-9 and (
+                            best is None or (dist[u], self.names[u]) < (dist[best], self.names[best])):
+                        best = u
+                node = best
+                path.append(node)
+            paths[(src, dst)] = [self.names[i] for i in reversed(path)]
+        return paths
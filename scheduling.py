@@ -1,77 +1,175 @@
-from typing import List, Dict, Tuple
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
+from typing import List, Dict, Optional, Tuple
+import kernels
+from conflicts import CONFLICT_MODELS, ConflictModel, build_conflict_model
 from requests import Requests
 from basicsystem import GridTopology
+from eventlog import DEBUG, INFO, EventLogger, get_logger
+from instrumentation import profiler, timed
 import numpy as np
 import random
 
 
 class Scheduling:
-    def __init__(self, topology: GridTopology):
+    def __init__(self, topology: GridTopology, logger: EventLogger = None, backend: str = "python"):
         self.topology = topology
-        self.requests = Requests(topology)  # Initialize Requests instance
+        self.requests = Requests(topology, backend=backend)  # Initialize Requests instance
+        self.logger = logger if logger is not None else get_logger()
+        self.chosen_paths: Dict[str, List[str]] = {}  # Paths picked per request by the k_paths selection
+        # Merged schedules keyed by the RRRN service order of a round, shared by equivalent coefficient settings
+        self._rrrn_cache: Dict[Tuple, Tuple[List[Tuple[str, int]], Optional[Dict[str, List[str]]]]] = {}
+        self.rrrn_cache_size = 1024
+        # What keeps two requests out of one timeslot: shared nodes, shared links or node memories (see conflicts.py)
+        self.conflict_model = "node"
+        self._conflict_models: Dict[str, ConflictModel] = {}
+        # Requests left out of every schedule because they have no path meeting the fidelity threshold
+        self.rejected_requests: Dict[str, Tuple[str, str, str]] = {}
+
+    def admit(self, requests: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+        """The requests that can be routed; the others are recorded in self.rejected_requests."""
+        if self.requests.fidelity_threshold is None:
+            return list(requests)
+        admitted = []
+        for request in requests:
+            if self.requests.is_feasible(request[1], request[2]):
+                admitted.append(request)
+            else:
+                self.rejected_requests[request[0]] = tuple(request)
+        return admitted
 
     def fifo_schedule(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]]) -> List[List[Tuple[str, int]]]:
         all_schedules = []
         for round_info in all_requests:
             schedule = []
             timeslot = 1  # Start timeslot from 1
-            for request in round_info['requests']:
+            for request in self.admit(round_info['requests']):
                 request_id, _, _ = request
                 schedule.append((request_id, timeslot))
                 timeslot += 1
             all_schedules.append(schedule)
         return all_schedules
 
-    def rrrn_schedule(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]], k: float, c: float, a: float) -> \
+    @timed("rrrn_schedule")
+    def rrrn_schedule(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]], k: float, c: float, a: float,
+                      path_selection: str = "first_last") -> \
             Tuple[List[List[Tuple[str, int]]], List[List[Tuple[str, int]]]]:
+        """
+        path_selection "first_last" merges on the first and last of the K paths, both of which must be
+        conflict-free; "k_paths" lets each request use whichever of its K paths fits a timeslot (see
+        k_path_merge_schedule), recording the chosen paths in self.chosen_paths.
+
+        Merged schedules are cached by the service order of each round, so coefficient settings that
+        lead to the same order (any finite b > 0, see rrrn_order) reuse the routing and merge work.
+        Requests without a path meeting the fidelity threshold are left out (see admit).
+        """
         all_schedules = []
         all_pre_merge_schedules = []
         b = k + c * a  # Compute the comprehensive coefficient b
 
         for round_info in all_requests:
-            schedule = []
-            timeslot = 1  # Start timeslot from 1
-            remaining_requests = round_info['requests']
-
-            # Create a dictionary to store waiting times
-            waiting_times = {request[0]: 0 for request in remaining_requests}
-
-            # Initialize high_weight_paths for the current round
-            high_weight_paths = self.requests.identify_high_weight_paths(remaining_requests,
-                                                                         self.requests.find_all_shortest_paths(
-                                                                             [(req[1], req[2]) for req in
-                                                                              remaining_requests]))
-
-            while remaining_requests:
-                max_priority = -1
-                selected_request = None
-                for request_id, src, dst in remaining_requests:
-                    waiting_time = waiting_times[request_id]
-                    transmission_distance = self.requests.calculate_manhattan_distance(
-                        self.topology.nl[int(src[1:]) - 1], self.topology.nl[int(dst[1:]) - 1])
-                    priority = waiting_time / (b * transmission_distance)
-                    if priority > max_priority:
-                        max_priority = priority
-                        selected_request = (request_id, src, dst)
-
-                # Update waiting times for all requests
-                for request in remaining_requests:
-                    waiting_times[request[0]] += 1
-
-                schedule.append((selected_request[0], timeslot))
-                timeslot += 1
-                remaining_requests.remove(selected_request)
-
+            order = self.rrrn_order(self.admit(round_info['requests']), b)
+            schedule = [(request[0], timeslot) for timeslot, request in enumerate(order, start=1)]
             all_pre_merge_schedules.append(schedule.copy())
 
-            # Merge requests based on high weight paths
-            schedule = self.new_merge_schedule(schedule, high_weight_paths)
-
-            all_schedules.append(schedule)
+            # Everything the routed paths depend on; clearing the path cache moves to a new generation
+            cache_key = (tuple(order), path_selection, self.requests.fidelity_threshold, self.requests.congestion,
+                         self.conflict_model, self.requests.K, self.requests.spur_search, self.requests.backend,
+                         self.requests.path_cache_generation)
+            cached = self._rrrn_cache.get(cache_key)
+            if cached is not None:
+                profiler.count("rrrn_cache_hits")
+                merged_schedule, chosen_paths = cached
+            else:
+                profiler.count("rrrn_cache_misses")
+                if self.requests.congestion:
+                    self.requests.reset_loads()  # Load-aware routes only compete within a round
+                # Initialize high_weight_paths for the current round
+                round_paths = self.requests.find_all_shortest_paths([(req[1], req[2]) for req in order])
+                # Merge requests based on high weight paths
+                if path_selection == "k_paths":
+                    candidate_paths = self.requests.identify_candidate_paths(order, round_paths)
+                    merged_schedule, chosen_paths = self.k_path_merge_schedule(schedule, candidate_paths)
+                else:
+                    high_weight_paths = self.requests.identify_high_weight_paths(order, round_paths)
+                    merged_schedule, chosen_paths = self.new_merge_schedule(schedule, high_weight_paths), None
+                if len(self._rrrn_cache) >= self.rrrn_cache_size:
+                    del self._rrrn_cache[next(iter(self._rrrn_cache))]  # Evict the oldest entry
+                self._rrrn_cache[cache_key] = (merged_schedule, chosen_paths)
+
+            if chosen_paths:
+                self.chosen_paths.update(chosen_paths)
+            all_schedules.append(list(merged_schedule))
         return all_schedules, all_pre_merge_schedules
 
+    def rrrn_order(self, requests: List[Tuple[str, str, str]], b: float) -> List[Tuple[str, str, str]]:
+        """
+        The order in which RRRN serves a round's requests; the request list itself is not modified.
+
+        All waiting requests have waited equally long, so for any finite b > 0 the priority
+        waiting_time / (b * distance) does not depend on b: the first request is served first (every
+        priority is 0), then the others by ascending Manhattan distance, ties in arrival order. b = 0
+        takes the same order, its limit from above. The selection loop is only run for other values
+        of b.
+        """
+        nl = self.topology.nl
+        distances = {request[0]: self.requests.calculate_manhattan_distance(nl[int(request[1][1:]) - 1],
+                                                                           nl[int(request[2][1:]) - 1])
+                     for request in requests}
+        if requests and 0 <= b < float('inf'):
+            return [requests[0]] + sorted(requests[1:], key=lambda request: distances[request[0]])
+        if kernels.use_kernels(self.requests.backend):
+            order = kernels.rrrn_select_order(np.array([distances[request[0]] for request in requests], dtype=float), b)
+            return [requests[i] for i in order]
+        return self.rrrn_selection_loop(requests, distances, b)
+
+    @staticmethod
+    def rrrn_selection_loop(requests: List[Tuple[str, str, str]], distances: Dict[str, int],
+                            b: float) -> List[Tuple[str, str, str]]:
+        """The RRRN selection loop itself, for any b != 0; kernels.rrrn_select_order reproduces it."""
+        order = []
+        remaining_requests = list(requests)
+
+        # Create a dictionary to store waiting times
+        waiting_times = {request[0]: 0 for request in remaining_requests}
+
+        while remaining_requests:
+            max_priority = float('-inf')  # Negative b makes every priority after the first step negative
+            selected_request = None
+            for request_id, src, dst in remaining_requests:
+                waiting_time = waiting_times[request_id]
+                transmission_distance = distances[request_id]
+                priority = waiting_time / (b * transmission_distance)
+                if priority > max_priority:
+                    max_priority = priority
+                    selected_request = (request_id, src, dst)
+
+            # Update waiting times for all requests
+            for request in remaining_requests:
+                waiting_times[request[0]] += 1
+
+            order.append(selected_request)
+            remaining_requests.remove(selected_request)
+        return order
+
+    def rrrn_sweep(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]],
+                   coefficients: List[Tuple[float, float, float]], path_selection: str = "first_last") -> \
+            Dict[Tuple[float, float, float], Tuple[List[List[Tuple[str, int]]], List[List[Tuple[str, int]]]]]:
+        """Run rrrn_schedule for every (k, c, a) on the same requests; equivalent settings are computed once."""
+        return {tuple(coefficient): self.rrrn_schedule(all_requests, *coefficient, path_selection=path_selection)
+                for coefficient in coefficients}
+
+    def clear_schedule_cache(self):
+        self._rrrn_cache.clear()
+
+    def conflicts(self) -> ConflictModel:
+        """The ConflictModel selected by self.conflict_model, built once per model."""
+        model = self._conflict_models.get(self.conflict_model)
+        if model is None:
+            if self.conflict_model not in CONFLICT_MODELS:
+                raise ValueError(f"Unknown conflict model {self.conflict_model!r}")
+            model = self._conflict_models[self.conflict_model] = build_conflict_model(self.conflict_model, self.requests)
+        return model
+
+    @timed("new_merge_schedule")
     def new_merge_schedule(self, schedule: List[Tuple[str, int]],
                            high_weight_paths: Dict[str, Tuple[List[str], List[str]]]) -> List[Tuple[str, int]]:
         num_requests = len(schedule)
@@ -79,12 +177,23 @@ class Scheduling:
 
         # Collect all high weight paths for each request
         selected_paths = {}
+        log_paths = self.logger.enabled_for(DEBUG)
         for request_id in high_weight_paths:
             path1, path2 = high_weight_paths[request_id]
             selected_paths[request_id] = [path1, path2]
-            # Display the high weight paths for each request
-            print(
-                f"Request {request_id} high weight paths: {', '.join([' -> '.join(path) for path in selected_paths[request_id] if path])}")
+            if log_paths:
+                self.logger.log(DEBUG, "high_weight_paths", request_id=request_id, paths=[path1, path2])
+
+        if self.conflict_model != "node":
+            return self._model_merge_schedule(merged_schedule, selected_paths)
+        if kernels.use_kernels(self.requests.backend) and \
+                all(a[1] <= b[1] for a, b in zip(merged_schedule, merged_schedule[1:])):
+            path_mask = self.requests.path_mask
+            words = kernels.node_words([path_mask(paths[0]) | path_mask(paths[1])
+                                        for paths in (selected_paths[request_id] for request_id, _ in schedule)],
+                                       self.topology.nodes_number)
+            merged = kernels.merge_timeslots(words, np.array([ts for _, ts in schedule], dtype=np.int64))
+            return self._compact_timeslots([(request_id, int(ts)) for (request_id, _), ts in zip(schedule, merged)])
 
         # Attempt to merge requests starting from the last one
         for i in range(num_requests - 1, -1, -1):
@@ -110,6 +219,99 @@ class Scheduling:
             if not merged:
                 merged_schedule[i] = (request_a_id, timeslot_a)
 
+        return self._compact_timeslots(merged_schedule)
+
+    def _model_merge_schedule(self, schedule: List[Tuple[str, int]],
+                              selected_paths: Dict[str, List[List[str]]]) -> List[Tuple[str, int]]:
+        # Same merge as new_merge_schedule, checking each timeslot's packed occupancy under the conflict model
+        model = self.conflicts()
+        usage = {request_id: model.usage(paths) for request_id, paths in selected_paths.items()}
+        merged_schedule = schedule.copy()
+        members: Dict[int, int] = {}
+        occupied_by: Dict[int, int] = {}
+        for request_id, timeslot in merged_schedule:
+            members[timeslot] = members.get(timeslot, 0) + 1
+            occupied_by[timeslot] = occupied_by.get(timeslot, 0) + usage[request_id]
+
+        # Attempt to merge requests starting from the last one
+        for i in range(len(merged_schedule) - 1, -1, -1):
+            request_a_id, timeslot_a = merged_schedule[i]
+            usage_a = usage[request_a_id]
+            for timeslot in range(1, timeslot_a):
+                if not members.get(timeslot):
+                    continue
+                if profiler.enabled:
+                    profiler.count("conflict_checks")
+                if model.fits(occupied_by[timeslot], usage_a):
+                    members[timeslot_a] -= 1
+                    occupied_by[timeslot_a] -= usage_a
+                    members[timeslot] += 1
+                    occupied_by[timeslot] += usage_a
+                    merged_schedule[i] = (request_a_id, timeslot)
+                    break
+
+        return self._compact_timeslots(merged_schedule)
+
+    @timed("k_path_merge_schedule")
+    def k_path_merge_schedule(self, schedule: List[Tuple[str, int]],
+                              candidate_paths: Dict[str, List[List[str]]]) -> \
+            Tuple[List[Tuple[str, int]], Dict[str, List[str]]]:
+        """
+        Merge like new_merge_schedule, but each request commits to one of its K candidate paths.
+
+        Every timeslot keeps the summed usage of the paths chosen in it under the conflict model (for
+        "node", the nodes they cover); a request fits a timeslot when any of its paths fits that
+        occupancy, and takes the first (shortest) such path. Requests start on their shortest path.
+
+        Returns:
+            Tuple: The merged and compacted schedule, and the chosen path of every request.
+        """
+        model = self.conflicts()
+        usages = {request_id: [model.usage([path]) for path in paths if path]
+                  for request_id, paths in candidate_paths.items()}
+        chosen = {request_id: 0 for request_id in candidate_paths}
+        merged_schedule = schedule.copy()
+
+        members: Dict[int, List[str]] = {}
+        for request_id, timeslot in merged_schedule:
+            members.setdefault(timeslot, []).append(request_id)
+
+        def occupancy(timeslot: int) -> int:
+            occupied = 0
+            for request_id in members[timeslot]:
+                if usages[request_id]:
+                    occupied += usages[request_id][chosen[request_id]]
+            return occupied
+
+        occupied_by = {timeslot: occupancy(timeslot) for timeslot in members}
+
+        # Attempt to merge requests starting from the last one
+        for i in range(len(merged_schedule) - 1, -1, -1):
+            request_a_id, timeslot_a = merged_schedule[i]
+            usages_a = usages[request_a_id]
+            for timeslot in range(1, timeslot_a):
+                if not members.get(timeslot):
+                    continue
+                if profiler.enabled:
+                    profiler.count("conflict_checks")
+                occupied = occupied_by[timeslot]
+                fit = next((index for index, usage in enumerate(usages_a) if model.fits(occupied, usage)), None)
+                if fit is None and usages_a:
+                    continue
+                members[timeslot_a].remove(request_a_id)
+                occupied_by[timeslot_a] = occupancy(timeslot_a)
+                members[timeslot].append(request_a_id)
+                if fit is not None:
+                    chosen[request_a_id] = fit
+                    occupied_by[timeslot] += usages_a[fit]
+                merged_schedule[i] = (request_a_id, timeslot)
+                break
+
+        chosen_paths = {request_id: (candidate_paths[request_id][chosen[request_id]] if usages[request_id] else [])
+                        for request_id in candidate_paths}
+        return self._compact_timeslots(merged_schedule), chosen_paths
+
+    def _compact_timeslots(self, merged_schedule: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
         # Reorganize schedule to eliminate empty timeslots
         final_schedule = []
         timeslot_mapping = {}
@@ -123,14 +325,23 @@ class Scheduling:
         final_schedule = sorted(final_schedule, key=lambda x: x[1])
         return final_schedule
 
+    @timed("fifo_merge")
     def fifo_merge(self, fifo_schedule: List[Tuple[str, int]],
-                   all_requests: List[Dict[str, List[Tuple[str, str, str]]]]) -> List[Tuple[str, int]]:
+                   all_requests: List[Dict[str, List[Tuple[str, str, str]]]],
+                   path_selection: str = "all") -> List[Tuple[str, int]]:
+        """
+        path_selection "all" requires every one of the K paths to be conflict-free; "k_paths" lets each
+        request take the first of its K paths that fits the timeslot, recording it in self.chosen_paths.
+        Requests without paths are left out and recorded in self.rejected_requests.
+        """
         merged_schedule = []
         timeslot = 1
 
         # Create a mapping of request IDs to their paths and assign priorities based on path length
         request_paths = {}
         for round_info in all_requests:
+            if self.requests.congestion:
+                self.requests.reset_loads()
             for request in round_info['requests']:
                 request_id = request[0]
                 src, dst = request[1], request[2]
@@ -139,6 +350,22 @@ class Scheduling:
                 # Sort paths by length to determine priority (shorter paths have higher priority)
                 request_paths[request_id] = sorted(paths[(src, dst)], key=lambda p: len(p))
 
+        # Requests without paths (below the fidelity threshold) cannot be merged or served
+        unroutable = {request_id for request_id, paths in request_paths.items() if not paths}
+        if unroutable:
+            for round_info in all_requests:
+                for request in round_info['requests']:
+                    if request[0] in unroutable:
+                        self.rejected_requests[request[0]] = tuple(request)
+            fifo_schedule = [entry for entry in fifo_schedule if entry[0] not in unroutable]
+
+        if path_selection == "k_paths":
+            return self._fifo_merge_k_paths(fifo_schedule, request_paths)
+        if self.conflict_model != "node":
+            return self._fifo_merge_model(fifo_schedule, request_paths)
+        if kernels.use_kernels(self.requests.backend):
+            return self._fifo_merge_kernel(fifo_schedule, request_paths)
+
         while fifo_schedule:
             current_timeslot_requests = []
             remaining_requests = []
@@ -180,7 +407,86 @@ class Scheduling:
         final_schedule = sorted(merged_schedule, key=lambda x: x[1])
         return final_schedule
 
+    def _fifo_merge_kernel(self, fifo_schedule: List[Tuple[str, int]],
+                           request_paths: Dict[str, List[List[str]]]) -> List[Tuple[str, int]]:
+        path_mask = self.requests.path_mask
+        masks = []
+        for request_id, _ in fifo_schedule:
+            mask = 0
+            for path in request_paths[request_id]:
+                mask |= path_mask(path)
+            masks.append(mask)
+        words = kernels.node_words(masks, self.topology.nodes_number)
+        first_lengths = np.array([len(request_paths[request_id][0]) for request_id, _ in fifo_schedule], dtype=np.int64)
+        timeslots = kernels.fifo_merge_timeslots(words, first_lengths)
+        return sorted([(request_id, int(ts)) for (request_id, _), ts in zip(fifo_schedule, timeslots)], key=lambda x: x[1])
+
+    def _fifo_merge_model(self, fifo_schedule: List[Tuple[str, int]],
+                          request_paths: Dict[str, List[List[str]]]) -> List[Tuple[str, int]]:
+        # Same passes as fifo_merge, with all K paths reserved in a packed occupancy under the conflict model
+        model = self.conflicts()
+        usage = {request_id: model.usage(paths) for request_id, paths in request_paths.items()}
+        merged_schedule = []
+        timeslot = 1
+
+        while fifo_schedule:
+            remaining_requests = []
+            occupied = 0
+            shortest = None  # Length of the shortest first path already in this timeslot
+
+            for entry in fifo_schedule:
+                request_id = entry[0]
+                length = len(request_paths[request_id][0])
+                # The first request of a timeslot is always taken, so every pass places at least one
+                if shortest is not None and (length > shortest * 1.2 or not model.fits(occupied, usage[request_id])):
+                    remaining_requests.append(entry)
+                    continue
+                occupied += usage[request_id]
+                shortest = length if shortest is None else min(shortest, length)
+                merged_schedule.append((request_id, timeslot))
+
+            timeslot += 1
+            fifo_schedule = remaining_requests
+
+        return sorted(merged_schedule, key=lambda x: x[1])
+
+    def _fifo_merge_k_paths(self, fifo_schedule: List[Tuple[str, int]],
+                            request_paths: Dict[str, List[List[str]]]) -> List[Tuple[str, int]]:
+        # Same passes as fifo_merge, with one packed occupancy per timeslot instead of pairwise path checks
+        model = self.conflicts()
+        usages = {request_id: [model.usage([path]) for path in paths] for request_id, paths in request_paths.items()}
+        merged_schedule = []
+        timeslot = 1
+
+        while fifo_schedule:
+            remaining_requests = []
+            occupied = 0
+            shortest = None  # Length of the shortest first path already in this timeslot
+
+            for entry in fifo_schedule:
+                request_id = entry[0]
+                length = len(request_paths[request_id][0])
+                if shortest is not None and length > shortest * 1.2:
+                    remaining_requests.append(entry)
+                    continue
+                fit = next((index for index, usage in enumerate(usages[request_id]) if model.fits(occupied, usage)),
+                           None)
+                if fit is None:
+                    remaining_requests.append(entry)
+                    continue
+                occupied += usages[request_id][fit]
+                shortest = length if shortest is None else min(shortest, length)
+                self.chosen_paths[request_id] = request_paths[request_id][fit]
+                merged_schedule.append((request_id, timeslot))
+
+            timeslot += 1
+            fifo_schedule = remaining_requests
+
+        return sorted(merged_schedule, key=lambda x: x[1])
+
     def all_paths_conflict(self, paths_a: List[List[str]], paths_b: List[List[str]]) -> bool:
+        if profiler.enabled:
+            profiler.count("conflict_checks")
         for path_a in paths_a:
             for path_b in paths_b:
                 if path_a and path_b and self.paths_conflict(path_a, path_b):
@@ -190,8 +496,16 @@ class Scheduling:
     def paths_conflict(self, path1: List[str], path2: List[str]) -> bool:
         return bool(set(path1) & set(path2))
 
-    def plot_first_round_schedule(self, first_round_schedule: List[Tuple[str, int]], title: str, total_timeslots: int):
+    @staticmethod
+    def plot_first_round_schedule(first_round_schedule: List[Tuple[str, int]], title: str, total_timeslots: int,
+                                  output_path=None, dpi: int = 600):
         # Plot the first round schedule with customized x-axis
+        # Without output_path the figure is saved as "<title>.png" and shown; with it, it is only saved
+        # matplotlib is only imported when plotting, keeping pure scheduling imports light
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import MaxNLocator
+        from rendering import finish_figure
+
         fig, ax = plt.subplots(figsize=(12, 8))  # Increase figure size
         x = [timeslot for _, timeslot in first_round_schedule]
         y = [i * 1.2 for i in range(len(first_round_schedule))]  # Increase the distance between points
@@ -209,17 +523,19 @@ class Scheduling:
         plt.ylabel('Requests')
         plt.title(title)
         plt.grid(True, linestyle='--', alpha=0.6)
-        plt.savefig(f"{title}.png", dpi=600)
-        plt.show()
+        if output_path is None:
+            plt.savefig(f"{title}.png", dpi=dpi)
+        finish_figure(output_path, dpi=dpi)
 
     def display_schedule(self, all_schedules: List[List[Tuple[str, int]]], schedule_type: str):
-        # Display the schedule
-        print(f"{schedule_type} Schedule:")
+        # Record the schedule as a structured event and display it with a single write
+        if self.logger.enabled_for(INFO):
+            self.logger.log(INFO, "schedule", schedule_type=schedule_type, schedules=all_schedules)
+        lines = [f"{schedule_type} Schedule:"]
         for round_number, schedule in enumerate(all_schedules, start=1):
-            print(f"Round {round_number}:")
-            for request_id, timeslot in schedule:
-                print(f"  {request_id} -> Timeslot {timeslot}")
-        print()
+            lines.append(f"Round {round_number}:")
+            lines.extend(f"  {request_id} -> Timeslot {timeslot}" for request_id, timeslot in schedule)
+        print("\n".join(lines) + "\n")
 
     def calculate_manhattan_distance(self, node1, node2):
         index1 = int(node1.name[1:]) - 1
@@ -245,6 +561,7 @@ class Scheduling:
 
         return failure_nodes
 
+    @timed("check_requests_failures")
     def check_requests_failures(self, schedule: List[Tuple[str, int]],
                                 high_weight_paths: Dict[str, Tuple[List[str], List[str]]],
                                 failure_nodes: Dict[int, List[int]]) -> List[str]:
@@ -260,6 +577,74 @@ class Scheduling:
                 failed_requests.append(request_id)
         return failed_requests
 
+    @timed("recover_failed_requests")
+    def recover_failed_requests(self, schedule: List[Tuple[str, int]],
+                                high_weight_paths: Dict[str, Tuple[List[str], List[str]]],
+                                failure_nodes: Dict[int, List[int]],
+                                requests: List[Tuple[str, str, str]]) -> \
+            Tuple[List[Tuple[str, int]], Dict[str, Tuple[List[str], List[str]]], List[str]]:
+        """
+        Re-route the requests that fail in a timeslot and re-insert them into the earliest later timeslot.
+
+        Only requests whose paths all hit a failed node are touched. Each gets a new path avoiding
+        that timeslot's failed nodes, and is moved to the first later timeslot where the path fits
+        next to the requests already there under self.conflict_model and avoids that timeslot's
+        failed nodes; if none fits, a new timeslot is appended. The rest of the schedule is left as it is.
+
+        Args:
+            schedule (List[Tuple[str, int]]): The (merged) schedule to recover.
+            high_weight_paths (Dict[str, Tuple[List[str], List[str]]]): The candidate paths of each request.
+            failure_nodes (Dict[int, List[int]]): Failed node indices per timeslot, as from generate_failure_nodes.
+            requests (List[Tuple[str, str, str]]): The (request ID, source, destination) of the scheduled requests.
+
+        Returns:
+            Tuple: The recovered schedule, the candidate paths with re-routed requests updated,
+                and the IDs of the requests that could not be recovered.
+        """
+        endpoints = {request_id: (src, dst) for request_id, src, dst in requests}
+        paths = dict(high_weight_paths)
+        timeslot_of = dict(schedule)
+        model = self.conflicts()
+        occupants: Dict[int, List[str]] = {}
+        occupied_by: Dict[int, int] = {}
+        for request_id, timeslot in schedule:
+            occupants.setdefault(timeslot, []).append(request_id)
+            occupied_by[timeslot] = occupied_by.get(timeslot, 0) + model.usage(paths[request_id])
+        failed_names = {timeslot: {f"V{node}" for node in nodes} for timeslot, nodes in failure_nodes.items()}
+        unrecovered = []
+
+        for timeslot in sorted(failure_nodes):
+            failed = failed_names[timeslot]
+            for request_id in list(occupants.get(timeslot, [])):
+                if not all(any(node in failed for node in path) for path in paths[request_id]):
+                    continue
+                src, dst = endpoints[request_id]
+                new_path = self.requests.reroute(src, dst, failed)
+                if not new_path:
+                    unrecovered.append(request_id)
+                    continue
+                new_usage = model.usage([new_path])
+                target = int(timeslot) + 1  # generate_failure_nodes keys are numpy integers
+                while target in occupants:
+                    if profiler.enabled:
+                        profiler.count("conflict_checks")
+                    if not failed_names.get(target, set()).intersection(new_path) and \
+                            model.fits(occupied_by[target], new_usage):
+                        break
+                    target += 1
+                occupants[timeslot].remove(request_id)
+                occupied_by[timeslot] -= model.usage(paths[request_id])
+                occupants.setdefault(target, []).append(request_id)
+                occupied_by[target] = occupied_by.get(target, 0) + new_usage
+                timeslot_of[request_id] = target
+                # Both candidate paths are the new one, so a later failure on it still fails the request
+                paths[request_id] = (new_path, new_path)
+
+        recovered_schedule = sorted(((request_id, timeslot_of[request_id]) for request_id, _ in schedule),
+                                    key=lambda x: x[1])
+        return recovered_schedule, paths, unrecovered
+
+    @timed("check_failures_across_schedules")
     def check_failures_across_schedules(self, schedules: Dict[str, List[Tuple[str, int]]],
                                         high_weight_paths: Dict[str, Tuple[List[str], List[str]]],
                                         failure_nodes: Dict[int, List[int]]) -> Dict[str, Dict[int, List[str]]]:
@@ -335,6 +720,7 @@ class Scheduling:
 
         return timeslot_request_info
 
+    @timed("check_decoherence")
     def check_decoherence(self, timeslot_request_info: Dict[int, List[Tuple[str, int]]], nodes_number: int,
                           decoherence_rate: float) -> int:
         """
@@ -352,6 +738,7 @@ class Scheduling:
         size = int(np.sqrt(nodes_number))
         longest_shortest_path = 2 * (size - 1)
         decohered_requests_count = 0
+        log_events = self.logger.enabled_for(DEBUG)
 
         for timeslot, requests in timeslot_request_info.items():
             for request_id, manhattan_distance in requests:
@@ -363,7 +750,8 @@ class Scheduling:
                 # Determine if the request decoheres
                 if random.random() < decoherence_probability:
                     decohered_requests_count += 1
-                    print(
-                        f"Request {request_id} in timeslot {timeslot} decohered with probability {decoherence_probability:.4f}")
+                    if log_events:
+                        self.logger.log(DEBUG, "decoherence", request_id=request_id, timeslot=timeslot,
+                                        probability=decoherence_probability)
 
         return decohered_requests_count
@@ -0,0 +1,372 @@
+# service.py
+"""
+Asyncio scheduling service: clients submit requests, the service micro-batches them and answers
+with the timeslot every request was given by RRRN Merge.
+
+    python service.py serve --system-size 64 --port 8080 --window-ms 20
+    python service.py serve --system-size 64 --unix /tmp/scheduler.sock
+    python service.py load --port 8080 --rate 500 --duration 10 --connections 8
+
+HTTP/1.1 with keep-alive, over TCP or a Unix socket:
+    POST /schedule   {"requests": [{"id": "r1", "src": "V1", "dst": "V12"}, ...]}
+                     -> {"batch": 3, "assignments": {"r1": 2, ...}}
+    GET  /metrics    -> latency p50/p99, throughput, batch sizes
+
+Submissions that arrive within `window` seconds of the first one waiting (or until `max_batch`
+requests are waiting) form one batch, which is scheduled as one round; a submission is never
+split across batches, so all of its timeslots refer to the same round. All batches run on a
+single long-lived Scheduling, so the graph and the K paths of every pair seen so far stay warm;
+scheduling runs in a worker thread so the event loop keeps accepting submissions meanwhile.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from basicsystem import GridTopology
+from scheduling import Scheduling
+
+MAX_BODY = 16 * 1024 * 1024
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyStats:
+    """Latencies of the most recent completions and overall throughput since start."""
+
+    def __init__(self, window: int = 100000):
+        self.latencies: Deque[float] = collections.deque(maxlen=window)
+        self.batch_sizes: Deque[int] = collections.deque(maxlen=window)
+        self.schedule_times: Deque[float] = collections.deque(maxlen=window)
+        self.completed = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    def record_batch(self, size: int, schedule_time: float, latencies: List[float]):
+        self.batches += 1
+        self.completed += size
+        self.batch_sizes.append(size)
+        self.schedule_times.append(schedule_time)
+        self.latencies.extend(latencies)
+
+    @staticmethod
+    def percentile(values, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def report(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {"completed": self.completed, "batches": self.batches, "uptime": elapsed,
+                "throughput": self.completed / elapsed if elapsed else 0.0,
+                "latency_p50": self.percentile(self.latencies, 0.5),
+                "latency_p99": self.percentile(self.latencies, 0.99),
+                "latency_mean": statistics.fmean(self.latencies) if self.latencies else None,
+                "batch_size_mean": statistics.fmean(self.batch_sizes) if self.batch_sizes else None,
+                "schedule_time_p99": self.percentile(self.schedule_times, 0.99)}
+
+
+class SchedulingService:
+    def __init__(self, topology: GridTopology, window: float = 0.02, max_batch: int = 256,
+                 coefficients: Tuple[float, float, float] = (1, 1, 1), backend: str = "python"):
+        self.scheduling = Scheduling(topology, backend=backend)
+        self.nodes = {node.name for node in topology.nl}
+        self.window = window  # Seconds a submission may wait for others to join its batch
+        self.max_batch = max_batch
+        self.coefficients = coefficients
+        self.stats = LatencyStats()
+        self._pending: Deque[Tuple[List[Tuple[str, str]], asyncio.Future, float]] = collections.deque()
+        self._pending_requests = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)  # Scheduling is not thread-safe
+        self._batcher: Optional[asyncio.Task] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._batch_number = 0
+
+    def warm(self, pairs: Optional[List[Tuple[str, str]]] = None):
+        """Compute the K paths of `pairs` (default: every ordered pair of nodes) before serving."""
+        if pairs is None:
+            names = sorted(self.nodes)
+            pairs = [(src, dst) for src in names for dst in names if src != dst]
+        self.scheduling.requests.find_all_shortest_paths(pairs)
+
+    async def submit(self, pairs: List[Tuple[str, str]]) -> Tuple[int, List[int]]:
+        """Queue (src, dst) pairs for the next batch; returns the batch number and their timeslots."""
+        for src, dst in pairs:
+            if not isinstance(src, str) or not isinstance(dst, str):
+                raise ServiceError(400, f"Request endpoints must be node names, got {src!r} -> {dst!r}")
+            if src not in self.nodes or dst not in self.nodes:
+                raise ServiceError(400, f"Unknown node in request {src} -> {dst}")
+            if src == dst:
+                raise ServiceError(400, f"Request endpoints must differ: {src}")
+        if not pairs:
+            return self._batch_number, []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((list(pairs), future, time.monotonic()))
+        self._pending_requests += len(pairs)
+        self._wakeup.set()
+        return await future
+
+    def _schedule_batch(self, batch_number: int, pairs: List[Tuple[str, str]]) -> List[int]:
+        requests = [(f"Batch {batch_number} Request {i + 1}", src, dst) for i, (src, dst) in enumerate(pairs)]
+        schedules, _ = self.scheduling.rrrn_schedule([{"round_number": batch_number, "requests": requests}],
+                                                     *self.coefficients)
+        # Batches never repeat their request IDs, so their merged schedules are not worth caching
+        self.scheduling.clear_schedule_cache()
+        timeslots = dict(schedules[0])
+        return [timeslots[request_id] for request_id, _, _ in requests]
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # The window starts with the oldest waiting submission, not with the previous batch
+            deadline = self._pending[0][2] + self.window
+            while self._pending_requests < self.max_batch and time.monotonic() < deadline:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch:
+                batch.append(self._pending.popleft())
+                size += len(batch[-1][0])
+            self._pending_requests -= size
+            self._batch_number += 1
+            batch_number = self._batch_number
+            started = time.monotonic()
+            try:
+                timeslots = await loop.run_in_executor(self._executor, self._schedule_batch, batch_number,
+                                                       [pair for pairs, _, _ in batch for pair in pairs])
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            finished = time.monotonic()
+            offset = 0
+            for pairs, future, _ in batch:
+                if not future.done():
+                    future.set_result((batch_number, timeslots[offset:offset + len(pairs)]))
+                offset += len(pairs)
+            self.stats.record_batch(size, finished - started,
+                                    [finished - submitted for pairs, _, submitted in batch for _ in pairs])
+
+    async def _handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if method == "GET" and path == "/metrics":
+            return 200, dict(self.stats.report(), pending=self._pending_requests)
+        if method == "POST" and path == "/schedule":
+            try:
+                items = json.loads(body or b"{}")["requests"]
+                ids = [str(item.get("id", i)) for i, item in enumerate(items)]
+                pairs = [(item["src"], item["dst"]) for item in items]
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                raise ServiceError(400, f"Malformed submission: {error!r}")
+            if len(set(ids)) != len(ids):
+                raise ServiceError(400, "Request IDs must be unique within a submission")
+            batch_number, timeslots = await self.submit(pairs)
+            return 200, {"batch": batch_number, "assignments": dict(zip(ids, timeslots))}
+        raise ServiceError(404, f"No route for {method} {path}")
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        raise ServiceError(413, "Submission too large")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._handle(method.upper(), path, body)
+                except ServiceError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except ValueError:
+                    status, payload = 400, {"error": "Malformed HTTP request"}
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8080,
+                    unix_path: Optional[str] = None):
+        self._wakeup = asyncio.Event()
+        self._batcher = asyncio.create_task(self._run_batches())
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._serve_connection, path=unix_path))
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._serve_connection, host, port))
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def serve_forever(self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8080,
+                            unix_path: Optional[str] = None):
+        await self.start(host, port, unix_path)
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            await self.stop()
+
+
+async def _open(host: str, port: Optional[int], unix_path: Optional[str]):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                   payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: scheduler\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def generate_load(nodes_number: int, rate: float, duration: float, connections: int = 8,
+                        requests_per_submission: int = 1, host: str = "127.0.0.1", port: Optional[int] = 8080,
+                        unix_path: Optional[str] = None, seed: int = 0) -> Dict:
+    """
+    Open-loop load: submissions start at `rate` per second for `duration` seconds over a pool of
+    keep-alive connections, each with random (src, dst) pairs. Returns client-side latencies and
+    the service's own metrics.
+    """
+    rng = random.Random(seed)
+    names = [f"V{i}" for i in range(1, nodes_number + 1)]
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(connections):
+        pool.put_nowait(await _open(host, port, unix_path))
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(number: int):
+        nonlocal errors
+        payload = {"requests": [{"id": f"{number}-{i}", "src": src, "dst": dst}
+                                for i, (src, dst) in enumerate(rng.sample(names, 2)
+                                                               for _ in range(requests_per_submission))]}
+        reader, writer = await pool.get()
+        started = time.monotonic()
+        try:
+            status, _ = await _request(reader, writer, "POST", "/schedule", payload)
+            if status == 200:
+                latencies.append(time.monotonic() - started)
+            else:
+                errors += 1
+        finally:
+            pool.put_nowait((reader, writer))
+
+    tasks = []
+    started = time.monotonic()
+    number = 0
+    while time.monotonic() - started < duration:
+        tasks.append(asyncio.create_task(one(number)))
+        number += 1
+        await asyncio.sleep(max(0.0, started + number / rate - time.monotonic()))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    reader, writer = await pool.get()
+    _, metrics = await _request(reader, writer, "GET", "/metrics")
+    pool.put_nowait((reader, writer))
+    while not pool.empty():
+        pool.get_nowait()[1].close()
+    return {"submissions": number, "errors": errors,
+            "throughput": len(latencies) * requests_per_submission / elapsed,
+            "latency_p50": LatencyStats.percentile(latencies, 0.5),
+            "latency_p99": LatencyStats.percentile(latencies, 0.99),
+            "service": metrics}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Micro-batching RRRN Merge scheduling service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="run the service")
+    serve.add_argument("--system-size", type=int, default=64)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--unix", default=None, help="listen on a Unix socket instead of TCP")
+    serve.add_argument("--window-ms", type=float, default=20.0)
+    serve.add_argument("--max-batch", type=int, default=256)
+    serve.add_argument("--coefficients", type=float, nargs=3, default=[1, 1, 1], metavar=("K", "C", "A"))
+    serve.add_argument("--backend", default="python")
+    serve.add_argument("--warm", action="store_true", help="compute the paths of every node pair before serving")
+    load = subparsers.add_parser("load", help="generate load against a running service")
+    load.add_argument("--system-size", type=int, default=64)
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=8080)
+    load.add_argument("--unix", default=None)
+    load.add_argument("--rate", type=float, default=200.0, help="submissions per second")
+    load.add_argument("--duration", type=float, default=10.0)
+    load.add_argument("--connections", type=int, default=8)
+    load.add_argument("--batch", type=int, default=1, help="requests per submission")
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        service = SchedulingService(GridTopology(args.system_size), window=args.window_ms / 1000,
+                                    max_batch=args.max_batch, coefficients=tuple(args.coefficients),
+                                    backend=args.backend)
+        if args.warm:
+            service.warm()
+        try:
+            asyncio.run(service.serve_forever(args.host, None if args.unix else args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = asyncio.run(generate_load(args.system_size, args.rate, args.duration, args.connections, args.batch,
+                                           args.host, None if args.unix else args.port, args.unix, args.seed))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
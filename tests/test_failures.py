@@ -0,0 +1,44 @@
+import random
+
+import numpy as np
+
+from basicsystem import GridTopology
+from failures import FixedCountFailures, ImportanceSampler, ShockModel, request_failure_probabilities
+from scheduling import Scheduling
+
+
+def test_empty_redundant_path_never_fails():
+    scheduling = Scheduling(GridTopology(16))
+    path_mask = scheduling.requests.path_mask
+    paths = {"routed": (["V1", "V2", "V3"], []), "unroutable": ()}
+    model = ShockModel.independent(16, 0.5)
+    assert request_failure_probabilities(path_mask, paths, model) == {"routed": 0.0, "unroutable": 1.0}
+    failure_nodes = {1: list(range(1, 17))}
+    assert scheduling.check_requests_failures([("routed", 1), ("unroutable", 1)], paths, failure_nodes) == \
+        ["unroutable"]
+    estimate = ImportanceSampler(model).estimate(path_mask, paths, 1000)
+    assert estimate == {"routed": (0.0, 0.0), "unroutable": (1.0, 0.0)}
+
+
+def test_exact_probabilities_match_check_requests_failures():
+    # Every timeslot fails with 3 of the 16 nodes, as generate_failure_nodes draws them
+    random.seed(11)
+    scheduling = Scheduling(GridTopology(16))
+    requests = scheduling.requests.generate_requests_by_rounds(12, 1)[0]["requests"]
+    paths = scheduling.requests.find_all_shortest_paths([(src, dst) for _, src, dst in requests])
+    high_weight_paths = scheduling.requests.identify_high_weight_paths(requests, paths)
+    high_weight_paths[requests[0][0]] = (high_weight_paths[requests[0][0]][0], [])
+    exact = request_failure_probabilities(scheduling.requests.path_mask, high_weight_paths,
+                                          FixedCountFailures(16, 3, 1.0))
+
+    rng = np.random.default_rng(11)
+    trials = 4000
+    schedule = [(request_id, 1) for request_id, _, _ in requests]
+    counts = {request_id: 0 for request_id, _, _ in requests}
+    for _ in range(trials):
+        failure_nodes = {1: list(rng.choice(np.arange(1, 17), 3, replace=False))}
+        for request_id in scheduling.check_requests_failures(schedule, high_weight_paths, failure_nodes):
+            counts[request_id] += 1
+    assert exact[requests[0][0]] == 0.0 and counts[requests[0][0]] == 0
+    for request_id, count in counts.items():
+        assert abs(count / trials - exact[request_id]) < 0.03
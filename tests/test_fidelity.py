@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from basicsystem import GridTopology
+from fidelity import FidelityTable
+from requests import Requests
+
+
+def simple_paths(graph, src, dst):
+    stack = [(src, [src])]
+    while stack:
+        node, path = stack.pop()
+        if node == dst:
+            yield path
+            continue
+        for neighbour in graph.neighbors(node):
+            if neighbour not in path:
+                stack.append((neighbour, path + [neighbour]))
+
+
+@pytest.fixture
+def mixed_links():
+    random.seed(2)
+    requests = Requests(GridTopology(16))
+    requests._graph = requests.build_graph()
+    for u, v in list(requests._graph.edges()):
+        requests._graph[u][v]["fidelity"] = random.choice([0.99, 0.97, 0.94])
+    return requests
+
+
+@pytest.mark.parametrize("threshold", [0.9, 0.85, 0.8])
+def test_pair_bound_admits_every_feasible_path(mixed_links, threshold):
+    table = FidelityTable(mixed_links._graph)
+    nodes = mixed_links._graph.nodes()
+    tighter = 0
+    for src in nodes:
+        for dst in nodes:
+            if src == dst:
+                continue
+            bound = table.pair_max_hops(src, dst, threshold)
+            feasible = [len(path) - 1 for path in simple_paths(mixed_links._graph, src, dst)
+                        if table.path_fidelity(path) >= threshold]
+            if bound is None:
+                assert not feasible
+                continue
+            assert feasible and max(feasible) <= bound <= table.max_hops(threshold)
+            tighter += bound < table.max_hops(threshold)
+    assert tighter
+
+
+def test_fidelity_paths_match_the_global_bound(mixed_links):
+    pairs = [(f"V{i}", f"V{j}") for i in range(1, 17) for j in range(1, 17) if i != j]
+    paths = mixed_links.find_all_shortest_paths(pairs, fidelity_threshold=0.85)
+    table = mixed_links.fidelity_table()
+    bound = table.max_hops(0.85)
+    for src, dst in pairs:
+        expected = [path for path in mixed_links.yen_k_shortest_paths(mixed_links._graph, src, dst, mixed_links.K,
+                                                                      max_hops=bound)
+                    if table.path_fidelity(path) >= 0.85] if table.best_fidelity(src, dst) >= 0.85 else []
+        assert paths[(src, dst)] == expected
@@ -0,0 +1,83 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")  # Without numba the "numba" backend is the python code, so there is nothing to compare
+
+from basicsystem import GridTopology
+import kernels
+from scheduling import Scheduling
+
+POINTS = [(4, 10), (8, 100), (16, 100)]
+B_VALUES = [0.5, 3.0, -0.5, -2.0, float('inf'), float('-inf')]
+
+
+@pytest.fixture(params=POINTS, ids=lambda point: f"{point[0]}x{point[0]},{point[1]}")
+def backends(request):
+    grid, num_requests = request.param
+    random.seed(grid * 1000 + num_requests)
+    reference = Scheduling(GridTopology(grid * grid))
+    accelerated = Scheduling(GridTopology(grid * grid), backend="numba")
+    all_requests = reference.requests.generate_requests_by_rounds(num_requests, 1)
+    return reference, accelerated, all_requests
+
+
+def distances(scheduling, requests):
+    nl = scheduling.topology.nl
+    return {request[0]: scheduling.requests.calculate_manhattan_distance(nl[int(request[1][1:]) - 1],
+                                                                        nl[int(request[2][1:]) - 1])
+            for request in requests}
+
+
+def test_kernels_are_compiled():
+    assert kernels.enabled and kernels.use_kernels("numba")
+    assert hasattr(kernels.merge_timeslots, "py_func")
+
+
+@pytest.mark.parametrize("spur_search", ["astar", "dijkstra"])
+def test_yen_spur_kernels(backends, spur_search):
+    reference, accelerated, all_requests = backends
+    pairs = [(src, dst) for _, src, dst in all_requests[0]["requests"]]
+    for scheduling in (reference, accelerated):
+        scheduling.requests.spur_search = spur_search
+    assert accelerated.requests.find_all_shortest_paths(pairs) == reference.requests.find_all_shortest_paths(pairs)
+
+
+@pytest.mark.parametrize("b", B_VALUES)
+def test_rrrn_select_order_kernel(backends, b):
+    reference, _, all_requests = backends
+    requests = all_requests[0]["requests"]
+    distance = distances(reference, requests)
+    order = kernels.rrrn_select_order(np.array([distance[request[0]] for request in requests], dtype=float), b)
+    assert [requests[i] for i in order] == Scheduling.rrrn_selection_loop(requests, distance, b)
+
+
+@pytest.mark.parametrize("b", B_VALUES + [0.0])
+def test_rrrn_order_backends(backends, b):
+    reference, accelerated, all_requests = backends
+    requests = all_requests[0]["requests"]
+    assert accelerated.rrrn_order(requests, b) == reference.rrrn_order(requests, b)
+
+
+def test_rrrn_order_at_zero_b_is_the_positive_b_order(backends):
+    reference, _, all_requests = backends
+    requests = all_requests[0]["requests"]
+    assert reference.rrrn_order(requests, 0.0) == reference.rrrn_selection_loop(requests, distances(reference, requests), 1.0)
+
+
+def test_merge_timeslots_kernel(backends):
+    reference, accelerated, all_requests = backends
+    requests = all_requests[0]["requests"]
+    paths = reference.requests.find_all_shortest_paths([(src, dst) for _, src, dst in requests])
+    high_weight_paths = reference.requests.identify_high_weight_paths(requests, paths)
+    pre_merge = reference.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)[1][0]
+    assert accelerated.new_merge_schedule(pre_merge, high_weight_paths) == \
+        reference.new_merge_schedule(pre_merge, high_weight_paths)
+
+
+def test_fifo_merge_timeslots_kernel(backends):
+    reference, accelerated, all_requests = backends
+    fifo = reference.fifo_schedule(all_requests)[0]
+    assert accelerated.fifo_merge(list(fifo), all_requests) == reference.fifo_merge(list(fifo), all_requests)
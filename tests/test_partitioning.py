@@ -0,0 +1,27 @@
+import copy
+import random
+
+import pytest
+
+from basicsystem import GridTopology
+from conflicts import CONFLICT_MODELS
+from partitioning import PartitionedScheduler
+from scheduling import Scheduling
+
+
+@pytest.fixture(scope="module")
+def workload():
+    random.seed(7)
+    scheduling = Scheduling(GridTopology(64))
+    return scheduling, scheduling.requests.generate_requests_by_rounds(40, 2)
+
+
+@pytest.mark.parametrize("conflict_model", CONFLICT_MODELS)
+def test_workers_merge_under_the_parent_conflict_model(workload, conflict_model):
+    scheduling, all_requests = workload
+    scheduling.conflict_model = conflict_model
+    with PartitionedScheduler(scheduling, workers=0) as local:
+        expected, _ = local.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)
+    with PartitionedScheduler(scheduling, workers=2) as pooled:
+        merged, _ = pooled.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)
+    assert merged == expected
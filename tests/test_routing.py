@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from basicsystem import GridTopology
+from requests import Requests
+
+
+# K = 10 paths of the original Yen implementation on the 3x3 grid, as node numbers
+BASELINE_PATHS = {
+    ("V1", "V9"): [[1, 2, 3, 6, 9], [1, 4, 5, 6, 9], [1, 2, 5, 6, 9], [1, 4, 7, 8, 9], [1, 4, 5, 8, 9],
+                   [1, 2, 5, 8, 9], [1, 2, 3, 2, 5, 6, 9], [1, 2, 3, 6, 5, 8, 9], [1, 4, 5, 6, 5, 8, 9],
+                   [1, 2, 1, 4, 5, 6, 9]],
+    ("V1", "V6"): [[1, 2, 3, 6], [1, 4, 5, 6], [1, 2, 5, 6], [1, 2, 3, 2, 5, 6], [1, 4, 1, 2, 3, 6],
+                   [1, 4, 5, 2, 3, 6], [1, 2, 1, 4, 5, 6], [1, 2, 5, 2, 3, 6], [1, 2, 3, 2, 3, 6],
+                   [1, 4, 7, 8, 5, 6]],
+    ("V4", "V3"): [[4, 1, 2, 3], [4, 5, 2, 3], [4, 5, 6, 3], [4, 1, 4, 5, 2, 3], [4, 1, 2, 5, 6, 3],
+                   [4, 7, 8, 5, 2, 3], [4, 5, 2, 5, 6, 3], [4, 5, 4, 1, 2, 3], [4, 5, 6, 5, 2, 3],
+                   [4, 1, 4, 1, 2, 3]],
+}
+
+# The same pairs routed load-aware with congestion 1, in this order
+LOAD_AWARE_PATHS = {
+    ("V1", "V9"): [[1, 2, 3, 6, 9], [1, 2, 3, 2, 5, 6, 9], [1, 2, 3, 6, 5, 8, 9], [1, 4, 5, 6, 5, 8, 9],
+                   [1, 2, 1, 4, 5, 6, 9], [1, 4, 5, 6, 9], [1, 2, 5, 6, 9], [1, 4, 7, 8, 9], [1, 4, 5, 8, 9],
+                   [1, 2, 5, 8, 9]],
+    ("V1", "V6"): [[1, 4, 5, 6], [1, 2, 5, 2, 3, 6], [1, 2, 3, 2, 3, 6], [1, 2, 3, 2, 5, 6], [1, 4, 1, 2, 3, 6],
+                   [1, 2, 1, 4, 5, 6], [1, 4, 5, 2, 3, 6], [1, 2, 3, 6], [1, 2, 5, 6], [1, 4, 7, 8, 5, 6]],
+    ("V4", "V3"): [[4, 5, 2, 3], [4, 1, 4, 1, 2, 3], [4, 1, 2, 5, 6, 3], [4, 1, 4, 5, 2, 3], [4, 5, 4, 1, 2, 3],
+                   [4, 5, 6, 5, 2, 3], [4, 5, 2, 5, 6, 3], [4, 7, 8, 5, 2, 3], [4, 1, 2, 3], [4, 5, 6, 3]],
+}
+
+
+def numbers(paths):
+    return [[int(node[1:]) for node in path] for path in paths]
+
+
+@pytest.mark.parametrize("spur_search", ["dijkstra", "astar"])
+@pytest.mark.parametrize("memoized", [False, True])
+def test_yen_matches_baseline_paths(spur_search, memoized):
+    requests = Requests(GridTopology(9), spur_search=spur_search)
+    if memoized:
+        # The requests of one call share their spur searches, two of them from the same source
+        paths = requests.find_all_shortest_paths(list(BASELINE_PATHS))
+    else:
+        graph = requests.build_graph()
+        paths = {pair: requests.yen_k_shortest_paths(graph, *pair, requests.K) for pair in BASELINE_PATHS}
+    for pair, expected in BASELINE_PATHS.items():
+        assert numbers(paths[pair]) == expected
+
+
+def test_load_aware_paths():
+    requests = Requests(GridTopology(9))
+    requests.congestion = 1.0
+    paths = requests.find_all_shortest_paths(list(LOAD_AWARE_PATHS))
+    for pair, expected in LOAD_AWARE_PATHS.items():
+        assert numbers(paths[pair]) == expected
+        # Only the order changes: the first path follows the loads, the rest are the Yen paths
+        assert sorted(expected) == sorted(BASELINE_PATHS[pair])
+
+
+def test_astar_tie_breaking():
+    # A* expands the deeper of two nodes with equal estimates first, so among equal-length paths it can
+    # settle on other ones than Dijkstra; the lengths of the K paths never differ
+    pairs = [("V13", "V5"), ("V16", "V9")]
+    astar = Requests(GridTopology(64)).find_all_shortest_paths(pairs)
+    dijkstra = Requests(GridTopology(64), spur_search="dijkstra").find_all_shortest_paths(pairs)
+    assert numbers([astar[("V13", "V5")][-1], dijkstra[("V13", "V5")][-1]]) == [[13, 12, 11, 3, 4, 5],
+                                                                                 [13, 12, 20, 21, 13, 5]]
+    assert numbers([astar[("V16", "V9")][-1], dijkstra[("V16", "V9")][-1]]) == [[16, 24, 16, 15, 14, 13, 12, 11, 10, 9],
+                                                                                 [16, 8, 16, 15, 14, 13, 12, 11, 10, 9]]
+    for pair in pairs:
+        assert [len(path) for path in astar[pair]] == [len(path) for path in dijkstra[pair]]
+
+
+def random_pairs(nodes_number, count, seed):
+    random.seed(seed)
+    nodes = [f"V{i}" for i in range(1, nodes_number + 1)]
+    return [tuple(random.sample(nodes, 2)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("spur_search", ["dijkstra", "astar"])
+def test_scipy_backend_matches_python_paths(spur_search):
+    pytest.importorskip("scipy")
+    pairs = random_pairs(64, 60, 3)
+    python = Requests(GridTopology(64), spur_search=spur_search).find_all_shortest_paths(pairs)
+    scipy = Requests(GridTopology(64), spur_search=spur_search, backend="scipy").find_all_shortest_paths(pairs)
+    for pair in pairs:
+        assert scipy[pair] == python[pair]
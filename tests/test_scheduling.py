@@ -0,0 +1,94 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from basicsystem import GridTopology
+from scheduling import Scheduling
+
+
+def test_rrrn_cache_follows_routing_settings():
+    random.seed(3)
+    scheduling = Scheduling(GridTopology(64))
+    all_requests = scheduling.requests.generate_requests_by_rounds(40, 1)
+    scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)
+
+    scheduling.requests.K = 3
+    scheduling.requests.spur_search = "dijkstra"
+    scheduling.requests.clear_path_cache()
+    merged, _ = scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)
+
+    fresh = Scheduling(GridTopology(64))
+    fresh.requests.K = 3
+    fresh.requests.spur_search = "dijkstra"
+    expected, _ = fresh.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)
+    assert merged == expected
+
+
+def test_recovered_timeslots_are_ints():
+    random.seed(5)
+    np.random.seed(5)
+    scheduling = Scheduling(GridTopology(36))
+    all_requests = scheduling.requests.generate_requests_by_rounds(30, 1)
+    requests = all_requests[0]["requests"]
+    paths = scheduling.requests.find_all_shortest_paths([(src, dst) for _, src, dst in requests])
+    high_weight_paths = scheduling.requests.identify_high_weight_paths(requests, paths)
+    schedule = scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1)[0][0]
+    failure_nodes = scheduling.generate_failure_nodes(36, max(ts for _, ts in schedule), 0.3)
+    recovered, _, _ = scheduling.recover_failed_requests(schedule, high_weight_paths, failure_nodes, requests)
+    assert recovered != schedule
+    assert all(type(timeslot) is int for _, timeslot in recovered)
+
+
+def test_recovered_requests_can_fail_again():
+    scheduling = Scheduling(GridTopology(16))
+    requests = [("a", "V1", "V4")]
+    high_weight_paths = {"a": (["V1", "V2", "V3", "V4"], ["V1", "V5", "V6", "V7", "V8", "V4"])}
+    recovered, paths, unrecovered = scheduling.recover_failed_requests([("a", 1)], high_weight_paths,
+                                                                       {1: [2, 6]}, requests)
+    assert recovered == [("a", 2)] and not unrecovered
+    new_path = paths["a"][0]
+    assert not {"V2", "V6"}.intersection(new_path)
+
+    failure_nodes = {2: [int(new_path[1][1:])]}
+    assert scheduling.check_requests_failures(recovered, paths, failure_nodes) == ["a"]
+    recovered, paths, _ = scheduling.recover_failed_requests(recovered, paths, failure_nodes, requests)
+    assert recovered == [("a", 3)] and new_path[1] not in paths["a"][0]
+
+
+@pytest.mark.parametrize("conflict_model, timeslot", [("node", 3), ("edge", 2), ("swap", 2)])
+def test_recovery_reinserts_under_the_conflict_model(conflict_model, timeslot):
+    scheduling = Scheduling(GridTopology(16))
+    scheduling.conflict_model = conflict_model
+    requests = [("a", "V1", "V4"), ("b", "V14", "V6")]
+    high_weight_paths = {"a": (["V1", "V2", "V3", "V4"], ["V1", "V5", "V6", "V7", "V8", "V4"]),
+                         "b": (["V14", "V10", "V6"], [])}
+    # a is re-routed over V1 V5 V9 V10 V11 V7 V3 V4, which crosses b at V10 but shares no link with it
+    recovered, _, _ = scheduling.recover_failed_requests([("a", 1), ("b", 2)], high_weight_paths,
+                                                         {1: [2, 6]}, requests)
+    assert dict(recovered)["a"] == timeslot
+
+
+@pytest.mark.parametrize("path_selection", ["first_last", "k_paths"])
+@pytest.mark.parametrize("conflict_model", ["node", "swap"])
+def test_requests_below_the_fidelity_threshold_are_rejected(path_selection, conflict_model):
+    scheduling = Scheduling(GridTopology(16, link_fidelity=0.99))
+    scheduling.conflict_model = conflict_model
+    scheduling.requests.fidelity_threshold = 0.97
+    all_requests = [{"round_number": 1, "requests": [("a", "V1", "V16"), ("b", "V2", "V3")]}]
+
+    merged, pre_merge = scheduling.rrrn_schedule(copy.deepcopy(all_requests), 1, 1, 1, path_selection=path_selection)
+    assert merged == [[("b", 1)]] and pre_merge == [[("b", 1)]]
+    fifo = [("a", 1), ("b", 2)]  # As built without admission control
+    fifo_merge_selection = "all" if path_selection == "first_last" else "k_paths"
+    assert scheduling.fifo_merge(fifo, all_requests, path_selection=fifo_merge_selection) == [("b", 1)]
+    assert scheduling.fifo_schedule(all_requests) == [[("b", 1)]]
+    assert scheduling.rejected_requests == {"a": ("a", "V1", "V16")}
+
+
+def test_fifo_merge_kernel_rejects_requests_below_the_fidelity_threshold():
+    scheduling = Scheduling(GridTopology(16, link_fidelity=0.99), backend="numba")
+    scheduling.requests.fidelity_threshold = 0.97
+    all_requests = [{"round_number": 1, "requests": [("a", "V1", "V16"), ("b", "V2", "V3")]}]
+    assert scheduling.fifo_merge([("a", 1), ("b", 2)], all_requests) == [("b", 1)]
@@ -0,0 +1,14 @@
+import asyncio
+
+import pytest
+
+from basicsystem import GridTopology
+from service import SchedulingService, ServiceError
+
+
+@pytest.mark.parametrize("src, dst", [(["V1"], "V2"), ("V1", {"name": "V2"}), (1, "V2")])
+def test_submit_rejects_non_string_endpoints(src, dst):
+    service = SchedulingService(GridTopology(16))
+    with pytest.raises(ServiceError) as error:
+        asyncio.run(service.submit([(src, dst)]))
+    assert error.value.status == 400
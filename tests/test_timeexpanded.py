@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from basicsystem import GridTopology
+from scheduling import Scheduling
+from timeexpanded import TimeExpandedScheduler
+
+
+@pytest.mark.parametrize("lifetime", [1, 2, 3])
+def test_routes_respect_full_memories(lifetime):
+    random.seed(4)
+    scheduling = Scheduling(GridTopology(16))
+    scheduler = TimeExpandedScheduler(scheduling, lifetime=lifetime)
+    # The centre is full in the first two timeslots
+    for timeslot in (1, 2):
+        scheduler.used[timeslot] = {node: scheduler.capacity[node] for node in ("V6", "V7", "V10", "V11")}
+    requests = [(str(i), *random.sample([f"V{j}" for j in range(1, 17)], 2)) for i in range(20)]
+
+    schedule = scheduler.schedule(requests)
+    assert len(schedule) + len(scheduler.unscheduled) == len(requests)
+    for layer in scheduler.used.values():
+        for node, count in layer.items():
+            assert count <= scheduler.capacity[node]
+    for route in scheduler.routes.values():
+        assert not {node for node, timeslot in route if timeslot <= 2} & {"V6", "V7", "V10", "V11"}
+    assert scheduler.total_delay(schedule) == scheduling.calculate_total_delay(schedule)
+
+
+def test_reserve_checks_every_visit():
+    scheduler = TimeExpandedScheduler(Scheduling(GridTopology(16)), lifetime=2)
+    scheduler.used[1] = {"V2": scheduler.capacity["V2"] - 1}
+    with pytest.raises(ValueError):
+        scheduler._reserve([("V1", 1), ("V2", 1), ("V3", 1)])
+    assert scheduler.used[1] == {"V2": scheduler.capacity["V2"] - 1}
+    # Storing at V2 needs only the one free memory there, then V2 swaps in the next timeslot
+    scheduler._reserve([("V1", 1), ("V2", 1), ("V2", 2), ("V3", 2)])
+    assert scheduler.used[1] == {"V1": 1, "V2": scheduler.capacity["V2"]}
+    assert scheduler.used[2] == {"V1": 1, "V2": 2, "V3": 1}
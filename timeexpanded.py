@@ -0,0 +1,178 @@
+# timeexpanded.py
+"""
+Scheduling on a time-expanded network: one layer of the grid per timeslot, with the memories
+of GridTopology._add_memories as per-layer node capacities.
+
+A request is routed through space-time from (src, start) to (dst, completion). Within a layer
+it extends its entanglement along links, swapping at the nodes it passes; between layers it may
+store the partial entanglement in memory at its current end node and continue in the next
+layer, as long as the stored qubit at the source is not older than `lifetime` timeslots.
+With lifetime=1 every request completes in a single timeslot, as in the merge schedules.
+
+Memory use of a request in a layer: 1 at the source (held until completion), 2 at every node
+that swaps, 1 at the node where the entanglement ends in that layer (the destination or the
+node storing it). Node sharing is therefore limited by memory rather than forbidden outright.
+
+Only the layers and nodes that hold memories are stored, so long horizons stay cheap, and the
+single-layer probe reuses one ShortestPathTree per source, repaired incrementally from layer to
+layer as the set of saturated nodes changes.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import profiler, timed
+from routing import ShortestPathTree
+from scheduling import Scheduling
+
+# A route through space-time: [(node, timeslot), ...] from the source to the destination
+Route = List[Tuple[str, int]]
+
+
+class TimeExpandedScheduler:
+    def __init__(self, scheduling: Scheduling, lifetime: int = 1, horizon: Optional[int] = None):
+        self.scheduling = scheduling
+        self.requests = scheduling.requests
+        self.lifetime = lifetime
+        self.horizon = horizon  # Last usable timeslot; None leaves the horizon open
+        self.capacity: Dict[str, int] = {node.name: len(node.memories) for node in scheduling.topology.nl}
+        self._single_memory = {node for node, capacity in self.capacity.items() if capacity < 2}  # Never swap
+        self._graph = self.requests.build_graph()
+        self._trees: Dict[str, ShortestPathTree] = {}
+        self.used: Dict[int, Dict[str, int]] = {}  # timeslot -> node -> memories in use
+        self.routes: Dict[str, Route] = {}
+        self.unscheduled: List[str] = []
+
+    def reset(self):
+        self.used.clear()
+        self.routes.clear()
+        self.unscheduled.clear()
+
+    def residual(self, node: str, timeslot: int) -> int:
+        return self.capacity[node] - self.used.get(timeslot, {}).get(node, 0)
+
+    def _probe_layer(self, src: str, dst: str, timeslot: int) -> List[str]:
+        # Swapping nodes need two free memories, the endpoints one
+        used = self.used.get(timeslot, {})
+        blocked = {node for node, count in used.items() if self.capacity[node] - count < 2} | self._single_memory
+        blocked -= {node for node in (src, dst) if self.residual(node, timeslot) >= 1}
+        tree = self._trees.get(src)
+        if tree is None:
+            tree = self._trees[src] = ShortestPathTree(self._graph, src, blocked)
+        else:
+            tree.set_blocked(blocked)
+        return tree.path_to(dst)
+
+    def _search_window(self, src: str, dst: str, start: int) -> Route:
+        """Earliest-completion, then fewest-hop route starting at `start` within the lifetime window."""
+        last = start + self.lifetime - 1
+        if self.horizon is not None:
+            last = min(last, self.horizon)
+        origin = (src, start)
+        best = {origin: (start, 0)}
+        parent: Dict[Tuple[str, int], Optional[Tuple[str, int]]] = {origin: None}
+        pq = [(start, 0, src)]
+        while pq:
+            timeslot, hops, u = heapq.heappop(pq)
+            state = (u, timeslot)
+            if best[state] < (timeslot, hops):
+                continue
+            if u == dst:
+                route = [state]
+                while parent[route[-1]] is not None:
+                    route.append(parent[route[-1]])
+                route.reverse()
+                return route
+            successors = []
+            if u == src or self.residual(u, timeslot) >= 2:
+                successors.extend((v, timeslot, hops + 1) for v in self._graph.neighbors(u)
+                                  if v != src and self.residual(v, timeslot) >= 1)
+            if u != src and timeslot < last and self.residual(u, timeslot + 1) >= 1 \
+                    and self.residual(src, timeslot + 1) >= 1:
+                successors.append((u, timeslot + 1, hops))
+            for v, v_timeslot, v_hops in successors:
+                key = (v, v_timeslot)
+                if (v_timeslot, v_hops) < best.get(key, (float('inf'), 0)):
+                    best[key] = (v_timeslot, v_hops)
+                    parent[key] = state
+                    heapq.heappush(pq, (v_timeslot, v_hops, v))
+        return []
+
+    def _reserve(self, route: Route):
+        # Demand per (node, layer) visit, summed over the whole route before anything is reserved
+        src, start = route[0]
+        completion = route[-1][1]
+        demand: Dict[Tuple[str, int], int] = {}
+        for timeslot in range(start + 1, completion + 1):
+            demand[(src, timeslot)] = demand.get((src, timeslot), 0) + 1
+        for index, (node, timeslot) in enumerate(route):
+            following = route[index + 1] if index + 1 < len(route) else None
+            swaps = index > 0 and following is not None and following[1] == timeslot
+            demand[(node, timeslot)] = demand.get((node, timeslot), 0) + (2 if swaps else 1)
+        for (node, timeslot), units in demand.items():
+            if units > self.residual(node, timeslot):
+                raise ValueError(f"Route needs {units} memories at {node} in timeslot {timeslot}, "
+                                 f"{self.residual(node, timeslot)} are free")
+        for (node, timeslot), units in demand.items():
+            layer = self.used.setdefault(timeslot, {})
+            layer[node] = layer.get(node, 0) + units
+
+    def place(self, src: str, dst: str, release: int = 1) -> Route:
+        """Reserve and return the earliest-completing route of one request, or [] if none fits the horizon."""
+        best_route: Route = []
+        start = release
+        while self.horizon is None or start <= self.horizon:
+            if best_route and best_route[-1][1] <= start:
+                break
+            if self.residual(src, start) >= 1:
+                path = self._probe_layer(src, dst, start)
+                if path:
+                    best_route = [(node, start) for node in path]
+                    break
+                if self.lifetime > 1:
+                    route = self._search_window(src, dst, start)
+                    if route and (not best_route or route[-1][1] < best_route[-1][1]):
+                        best_route = route
+            if self.horizon is None and start > max(self.used, default=0) and not best_route:
+                break  # An empty layer that cannot connect src and dst never will
+            start += 1
+        if best_route:
+            self._reserve(best_route)
+        return best_route
+
+    @timed("time_expanded_schedule")
+    def schedule(self, requests: List[Tuple[str, str, str]],
+                 release: Optional[Dict[str, int]] = None) -> List[Tuple[str, int]]:
+        """
+        Place the requests one by one in the given priority order.
+
+        Returns:
+            List[Tuple[str, int]]: (request_id, completion timeslot), sorted by timeslot. Routes are
+            kept in self.routes; requests that do not fit the horizon are listed in self.unscheduled.
+        """
+        schedule = []
+        for request_id, src, dst in requests:
+            route = self.place(src, dst, (release or {}).get(request_id, 1))
+            if not route:
+                self.unscheduled.append(request_id)
+                continue
+            self.routes[request_id] = route
+            schedule.append((request_id, route[-1][1]))
+        if profiler.enabled:
+            profiler.count("time_expanded_layers", len(self.used))
+        return sorted(schedule, key=lambda x: x[1])
+
+    def total_delay(self, schedule: List[Tuple[str, int]]) -> int:
+        return self.scheduling.calculate_total_delay(schedule)
+
+    def rrrn_schedule(self, all_requests: List[Dict[str, List[Tuple[str, str, str]]]], k: float, c: float, a: float) \
+            -> Tuple[List[List[Tuple[str, int]]], List[List[Tuple[str, int]]]]:
+        """Same inputs and outputs as Scheduling.rrrn_schedule; every round starts with all memories free."""
+        b = k + c * a
+        all_schedules = []
+        all_pre_merge_schedules = []
+        for round_info in all_requests:
+            order = self.scheduling.rrrn_order(round_info['requests'], b)
+            all_pre_merge_schedules.append([(request[0], timeslot) for timeslot, request in enumerate(order, start=1)])
+            self.used.clear()
+            all_schedules.append(self.schedule(order))
+        return all_schedules, all_pre_merge_schedules
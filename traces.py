@@ -0,0 +1,204 @@
+# traces.py
+"""
+Binary request traces, written once and replayed through np.memmap.
+
+    python traces.py record workload.trace --system-size 64 --requests 60 --rounds 1000 --seed 0
+    python traces.py info workload.trace
+    python experiment.py --system-sizes 64 --requests 60 --trace workload.trace
+
+Layout (little endian):
+    header   96 bytes: magic, version, nodes_number, num_records, num_rounds, index offset,
+             SHA-256 fingerprint of the topology, zero padding
+    records  num_records x (int32 round, int32 src, int32 dst), nodes as 1-based indices (V{i})
+    index    num_rounds x (int64 round, int64 first record), rounds stored contiguously
+
+Replaying a trace yields the same structure as Requests.generate_requests_by_rounds, but each
+round's requests are a read-only view over the mapped file, so every scheduler sees exactly
+the recorded workload and a trace never has to fit in memory.
+"""
+import argparse
+import hashlib
+import os
+import random
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from basicsystem import GridTopology
+
+MAGIC = b"QNTRACE\0"
+VERSION = 1
+# magic, version, nodes_number, records, rounds, index offset, fingerprint, padding
+HEADER = struct.Struct("<8sIIQQQ32s24x")
+HEADER_SIZE = HEADER.size
+RECORD_DTYPE = np.dtype([("round", "<i4"), ("src", "<i4"), ("dst", "<i4")])
+INDEX_DTYPE = np.dtype([("round", "<i8"), ("start", "<i8")])
+
+
+def topology_fingerprint(topology: GridTopology) -> bytes:
+    """Hash of the nodes, links, link fidelities and memory counts a trace was recorded on."""
+    if not topology.nl:
+        topology.build()
+    digest = hashlib.sha256(f"grid:{topology.nodes_number}".encode())
+    for node in topology.nl:
+        digest.update(f"|{node.name}:{len(node.memories)}".encode())
+    for link in topology.ll:
+        digest.update(f"|{link.name}:{getattr(link, 'fidelity', None)!r}".encode())
+    return digest.digest()
+
+
+def _node_index(name: str) -> int:
+    return int(name[1:])
+
+
+class TraceWriter:
+    """Streams rounds into a trace file; the header and round index are written on close."""
+
+    def __init__(self, path: str, topology: GridTopology):
+        self.path = path
+        self.nodes_number = topology.nodes_number
+        self.fingerprint = topology_fingerprint(topology)
+        self._file = open(path, 'wb')
+        self._file.write(b"\0" * HEADER_SIZE)
+        self._records = 0
+        self._index: List[Tuple[int, int]] = []
+
+    def write_round(self, round_number: int, requests: Sequence[Tuple[str, str, str]]):
+        if self._index and round_number <= self._index[-1][0]:
+            raise ValueError(f"Rounds must be written in increasing order, got {round_number} after {self._index[-1][0]}")
+        records = np.empty(len(requests), dtype=RECORD_DTYPE)
+        records["round"] = round_number
+        records["src"] = [_node_index(request[1]) for request in requests]
+        records["dst"] = [_node_index(request[2]) for request in requests]
+        self._index.append((round_number, self._records))
+        self._file.write(records.tobytes())
+        self._records += len(requests)
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.nodes_number, self._records, len(self._index), index_offset,
+                                     self.fingerprint))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_trace(path: str, all_requests: List[Dict], topology: GridTopology):
+    """Write the output of Requests.generate_requests_by_rounds as a trace."""
+    with TraceWriter(path, topology) as writer:
+        for round_info in all_requests:
+            writer.write_round(round_info["round_number"], round_info["requests"])
+
+
+class RoundView(Sequence):
+    """Read-only (request_id, src, dst) tuples of one round, decoded on access from the mapped records."""
+
+    def __init__(self, records: np.ndarray, round_number: int, first: int = 1):
+        self._records = records
+        self.round_number = round_number
+        self._first = first  # Request number of the first record of this view
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, item: Union[int, slice]):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self._records))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return RoundView(self._records[start:stop], self.round_number, self._first + start)
+        if item < 0:
+            item += len(self._records)
+        record = self._records[item]
+        return (f"Round {self.round_number} Request {self._first + item}", f"V{record['src']}", f"V{record['dst']}")
+
+    def __iter__(self) -> Iterator[Tuple[str, str, str]]:
+        for i in range(len(self._records)):
+            yield self[i]
+
+    def __deepcopy__(self, memo):
+        return self  # Immutable view over a read-only mapping
+
+    def __repr__(self) -> str:
+        return f"RoundView(round={self.round_number}, requests={len(self)})"
+
+
+class Trace:
+    def __init__(self, path: str, topology: Optional[GridTopology] = None):
+        """Map a trace; with `topology`, refuse traces recorded on a different topology."""
+        self.path = path
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"{path} is not a request trace")
+        magic, version, self.nodes_number, self.num_records, num_rounds, index_offset, self.fingerprint = \
+            HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a request trace")
+        if version != VERSION:
+            raise ValueError(f"Unsupported trace version in {path}: {version}")
+        if topology is not None and topology_fingerprint(topology) != self.fingerprint:
+            raise ValueError(f"{path} was recorded on a different topology than GridTopology({topology.nodes_number})")
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(self.num_records,)) \
+            if self.num_records else np.empty(0, dtype=RECORD_DTYPE)
+        self.index = np.fromfile(path, dtype=INDEX_DTYPE, count=num_rounds, offset=index_offset) \
+            if num_rounds else np.empty(0, dtype=INDEX_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def round(self, position: int) -> Dict:
+        round_number, start = (int(value) for value in self.index[position])
+        stop = int(self.index[position + 1]["start"]) if position + 1 < len(self.index) else self.num_records
+        return {"round_number": round_number, "requests": RoundView(self.records[start:stop], round_number)}
+
+    def rounds(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict]:
+        for position in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield self.round(position)
+
+    def all_requests(self, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """Rounds in the shape of Requests.generate_requests_by_rounds, as views over the mapping."""
+        return list(self.rounds(start, stop))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Record or inspect binary request traces")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="record random rounds as generate_requests_by_rounds does")
+    record.add_argument("path")
+    record.add_argument("--system-size", type=int, default=64)
+    record.add_argument("--requests", type=int, default=60)
+    record.add_argument("--rounds", type=int, default=1)
+    record.add_argument("--seed", type=int, default=0)
+    info = subparsers.add_parser("info", help="print the header of a trace")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        from requests import Requests
+
+        random.seed(args.seed)
+        requests = Requests(GridTopology(args.system_size))
+        with TraceWriter(args.path, requests.topology) as writer:
+            for round_number in range(1, args.rounds + 1):
+                # One round at a time, so recording does not hold the whole workload in memory
+                round_info = requests.generate_requests_by_rounds(args.requests, 1)[0]
+                writer.write_round(round_number, round_info["requests"])
+        print(f"Wrote {args.rounds * args.requests} requests to {args.path} ({os.path.getsize(args.path)} bytes)")
+    else:
+        trace = Trace(args.path)
+        print(f"{args.path}: GridTopology({trace.nodes_number}), {len(trace)} rounds, {trace.num_records} requests, "
+              f"fingerprint {trace.fingerprint.hex()[:16]}")
+
+
+if __name__ == "__main__":
+    main()